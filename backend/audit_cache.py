@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+# --- Content-Addressed Audit Cache ---
+# Two tiers: a small in-process LRU (hot documents) and a JSON-on-disk store shared by all workers.
+# Entries live under a directory named after the audit fingerprint (prompt + model + windowing),
+# so changing the prompt or the model silently retires every old verdict. Directories of other
+# fingerprints are left alone while they are in use (a rolling deploy runs both): sweep() ages their
+# entries out like any other, and drops the directory once nothing in it has been touched for a TTL.
+
+CACHE_ENABLED = os.getenv("AUDIT_CACHE_ENABLED", "1") != "0"
+CACHE_DIR = os.getenv("AUDIT_CACHE_DIR", str(Path(__file__).parent / ".cache" / "audits"))
+CACHE_MEMORY_ENTRIES = int(os.getenv("AUDIT_CACHE_MEMORY_ENTRIES", "256"))
+CACHE_DISK_MB = int(os.getenv("AUDIT_CACHE_DISK_MB", "512"))
+CACHE_TTL_SECONDS = int(os.getenv("AUDIT_CACHE_TTL_HOURS", "168")) * 3600
+
+# Sweep the disk tier for expired / over-budget entries every N writes
+SWEEP_EVERY = 50
+
+# Bump when the shape of cached payloads changes
+CACHE_FORMAT = "2"
+
+def hash_bytes(*blobs: bytes) -> str:
+    """
+    sha256 over one or more uploads (order matters: page 1 of a snapped contract first).
+    """
+    return hash_digests(*(hashlib.sha256(blob).digest() for blob in blobs))
+
+def hash_digests(*digests: bytes) -> str:
+    """
+    hash_bytes() from the uploads' own sha256 digests (computed while they were spooled).
+    """
+    digest = hashlib.sha256()
+    for blob_digest in digests:
+        digest.update(blob_digest)
+    return digest.hexdigest()
+
+def hash_text(text: str) -> str:
+    """
+    sha256 of the extracted text with whitespace collapsed, so re-exports of the same contract collide.
+    """
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class AuditCache:
+    def __init__(self, version: str, cache_dir: str = CACHE_DIR, memory_entries: int = CACHE_MEMORY_ENTRIES,
+                 disk_mb: int = CACHE_DISK_MB, ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.version = hashlib.sha256(f"{version}:{CACHE_FORMAT}".encode("utf-8")).hexdigest()[:16]
+        self.root = Path(cache_dir)
+        self.dir = self.root / self.version
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_mb * 1024 * 1024
+        self.ttl_seconds = ttl_seconds
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    def _drop_idle_versions(self, now: float, newest: Dict[str, float]):
+        # Other fingerprints' directories, once no worker has written to them for a TTL.
+        # `newest` is each directory's latest entry before the sweep; an empty one goes by its own mtime.
+        for child in self.root.iterdir():
+            if not child.is_dir() or child.name == self.version:
+                continue
+            try:
+                last_write = newest.get(child.name) or child.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if now - last_write > self.ttl_seconds:
+                shutil.rmtree(child, ignore_errors=True)
+
+    def _path(self, namespace: str, key: str) -> Path:
+        return self.dir / namespace / key[:2] / f"{key}.json"
+
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        memory_key = f"{namespace}:{key}"
+        now = time.time()
+
+        # Tier 1: memory
+        with self._lock:
+            entry = self._memory.get(memory_key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(memory_key)
+                    return value
+                del self._memory[memory_key]
+
+        # Tier 2: disk
+        path = self._path(namespace, key)
+        try:
+            # One stat: a concurrent sweep() may delete the file at any point, which is just a miss
+            mtime = path.stat().st_mtime
+            if now - mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            with open(path, "r") as f:
+                value = json.load(f)
+        except (ValueError, OSError):
+            return None
+
+        self._remember(memory_key, value, mtime + self.ttl_seconds)
+        return value
+
+    def set(self, namespace: str, key: str, value: Dict):
+        self._remember(f"{namespace}:{key}", value, time.time() + self.ttl_seconds)
+
+        # Atomic write: other workers either see the old file or the complete new one
+        path = self._path(namespace, key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Cache write failed for {namespace}/{key[:12]}: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            should_sweep = self._writes % SWEEP_EVERY == 0
+        if should_sweep:
+            self.sweep()
+
+    def _remember(self, memory_key: str, value: Dict, expires_at: float):
+        with self._lock:
+            self._memory[memory_key] = (expires_at, value)
+            self._memory.move_to_end(memory_key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def sweep(self):
+        """
+        Removes expired entries, then the oldest ones until the disk tier fits its budget. Entries of other
+        fingerprints count against the same budget (being older, they go first) and idle ones are dropped.
+        """
+        now = time.time()
+        files = []
+        newest: Dict[str, float] = {}
+        for path in self.root.glob("*/*/*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            version = path.relative_to(self.root).parts[0]
+            newest[version] = max(newest.get(version, 0.0), stat.st_mtime)
+            if now - stat.st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._drop_idle_versions(now, newest)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.dir.mkdir(parents=True, exist_ok=True)
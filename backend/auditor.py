@@ -1,25 +1,39 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
-from typing import List
-import opik
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import functools
+import json
 import os
+import random
 import time
 import re
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+try:
+    from backend.clause_index import INDEX_ENABLED, get_clause_index
+    from backend.metrics import AUDIT_TOKENS, LLM_CALLS, stage, record_llm_repair, record_llm_retry, record_llm_usage
+    from backend.llm_clients import get_chain, register_chain
+    from backend.prescreen import (GAP_MARKER, PRESCREEN_ENABLED, PRESCREEN_MIN_SCORE, prescreen_clauses,
+                                   prescreen_fingerprint, score_clause)
+    from backend.tracing import traced
+    from backend.rate_limiter import (COMPLETION_TOKEN_ESTIMATE, RATE_LIMIT_MAX_WAIT, RateLimitTimeout,
+                                      estimate_tokens, get_rate_limiter, retry_after_seconds)
+except ModuleNotFoundError:
+    from clause_index import INDEX_ENABLED, get_clause_index
+    from metrics import AUDIT_TOKENS, LLM_CALLS, stage, record_llm_repair, record_llm_retry, record_llm_usage
+    from llm_clients import get_chain, register_chain
+    from prescreen import (GAP_MARKER, PRESCREEN_ENABLED, PRESCREEN_MIN_SCORE, prescreen_clauses,
+                           prescreen_fingerprint, score_clause)
+    from tracing import traced
+    from rate_limiter import (COMPLETION_TOKEN_ESTIMATE, RATE_LIMIT_MAX_WAIT, RateLimitTimeout,
+                              estimate_tokens, get_rate_limiter, retry_after_seconds)
+
 load_dotenv()
 
-# Initialize Opik
-if os.getenv("OPIK_API_KEY"):
-    os.environ["OPIK_PROJECT_NAME"] = "fine-print-xray"
-    try:
-        opik.configure(use_local=False)
-    except Exception as e:
-        print(f"Failed to configure Opik Cloud: {e}")
-else:
-    print("OPIK_API_KEY not found. Defaulting to local/disabled mode.")
+# Opik is set up in the background and LangChain is imported on first use (tracing.py, llm_clients.py):
+# importing this module stays cheap for the server's cold start
 
 # --- Pydantic Models for Structured Output ---
 class DetectionObject(BaseModel):
@@ -67,98 +81,740 @@ Return a structured audit report matching the schema provided.
 MANDATORY: The 'original_text' field must be an EXACT, literal copy of the finding from the document. No summarization allowed in this field—we need the "fingerprint" of the trap.
 """
 
+MODEL_NAME = "grok-4-1-fast-non-reasoning"
+
+AUDIT_USER_PROMPT = "AUDIT THE FOLLOWING DOCUMENT:\n----------\n{contract_text}\n----------"
+
+# --- Structured Output ---
+# "json_schema": the AuditResult schema is sent as the provider's native response_format (strict JSON schema),
+# so the answer is constrained to it and the prompt carries no format instructions (~1k tokens per call saved).
+# "prompt": the schema is spelled out in the prompt (PydanticOutputParser's format instructions), for providers
+# without structured outputs.
+# Either way, an answer that still doesn't parse is repaired, locally first and then by one small call that
+# sees only the bad answer, instead of going round the retry loop and resending the whole window.
+AUDIT_OUTPUT_MODE = os.getenv("AUDIT_OUTPUT_MODE", "json_schema")
+REPAIR_MAX_ERROR_CHARS = 1000  # of the validation error quoted back to the model
+
+REPAIR_SYSTEM_PROMPT = "You repair malformed JSON answers. Keep every finding and its wording; only fix the structure."
+REPAIR_USER_PROMPT = ("This answer does not match the required schema.\nERROR: {error}\n\n"
+                      "Return the same audit as valid JSON matching the schema.\n\nANSWER:\n----------\n{content}\n----------")
+
+# Built once, on first use: parsers and their format instructions are stateless
+@functools.lru_cache(maxsize=1)
+def get_audit_parser():
+    from langchain_core.output_parsers import PydanticOutputParser
+    return PydanticOutputParser(pydantic_object=AuditResult)
+
+def _closed_schema(schema):
+    # Strict structured outputs want every object closed (additionalProperties: false), $defs included
+    if isinstance(schema, dict):
+        if schema.get("type") == "object":
+            schema["additionalProperties"] = False
+        for value in schema.values():
+            _closed_schema(value)
+    elif isinstance(schema, list):
+        for value in schema:
+            _closed_schema(value)
+    return schema
+
+def response_format(model) -> Dict:
+    """
+    A pydantic model as an OpenAI-style `response_format` (strict JSON schema).
+    """
+    return {"type": "json_schema",
+            "json_schema": {"name": model.__name__, "schema": _closed_schema(model.model_json_schema()), "strict": True}}
+
+def _audit_chain(make_llm, system_prompt: str, user_prompt: str):
+    """
+    prompt | llm for answers shaped like AuditResult, in the configured output mode.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    # Use Grok 4.1 Fast (xAI) via OpenAI SDK, on the shared connection pool (llm_clients.py)
+    # SDK retries off: our loop retries, and 429s must reach the shared rate limiter
+    if AUDIT_OUTPUT_MODE == "json_schema":
+        llm = make_llm(MODEL_NAME, temperature=0, max_retries=0,
+                       model_kwargs={"response_format": response_format(AuditResult)})
+        return ChatPromptTemplate.from_messages([("system", system_prompt), ("user", user_prompt)]) | llm
+    llm = make_llm(MODEL_NAME, temperature=0, max_retries=0)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("user", user_prompt + "\n\n{format_instructions}")
+    ]).partial(format_instructions=get_audit_parser().get_format_instructions())
+    return prompt | llm
+
+def _build_auditor_chain(make_llm):
+    # The answer is parsed by the caller so the raw AIMessage (and its token usage) is still visible
+    return _audit_chain(make_llm, SYSTEM_PROMPT, AUDIT_USER_PROMPT)
+
+def _build_repair_chain(make_llm):
+    return _audit_chain(make_llm, REPAIR_SYSTEM_PROMPT, REPAIR_USER_PROMPT)
+
+register_chain("auditor", _build_auditor_chain)
+register_chain("audit_repair", _build_repair_chain)
+
 def get_auditor_chain():
-    # Use Grok 4.1 Fast (xAI) via OpenAI SDK
-    llm = ChatOpenAI(
-        model="grok-4-1-fast-non-reasoning",
-        openai_api_key=os.getenv("XAI_API_KEY"),
-        openai_api_base="https://api.x.ai/v1",
-        temperature=0
+    return get_chain("auditor")
+
+def calculate_predatory_score(traps: List[DetectionObject]) -> int:
+    """
+    Deterministic scoring: CRITICAL adds 15, CAUTION adds 5, INFO adds nothing. Capped at 100.
+    """
+    calculated_score = 0
+    for trap in traps:
+        risk = trap.risk_level.upper()
+        if "CRITICAL" in risk:
+            calculated_score += 15
+        elif "CAUTION" in risk:
+            calculated_score += 5
+        else:
+            calculated_score += 0 # INFO no longer adds to predatory score
+
+    # Cap score at 100
+    return min(calculated_score, 100)
+
+def system_error_result() -> AuditResult:
+    return AuditResult(
+        detected_traps=[
+            DetectionObject(
+                original_text="System Error",
+                risk_level="INFO",
+                category="System",
+                plain_english_explanation="The AI service is currently overloaded. Please wait 10 seconds and try again.",
+                estimated_cost_impact="None",
+                remediation="Retry shortly."
+            )
+        ], 
+        overall_predatory_score=0
     )
-    parser = PydanticOutputParser(pydantic_object=AuditResult)
 
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", SYSTEM_PROMPT),
-        ("user", "AUDIT THE FOLLOWING DOCUMENT:\n----------\n{contract_text}\n----------\n\n{format_instructions}")
-    ])
+def is_system_error(result: AuditResult) -> bool:
+    return bool(result.detected_traps) and result.detected_traps[0].category == "System"
+
+MAX_RETRIES = 3
+
+def _output_overhead() -> str:
+    # What the output mode adds to each call: the schema, in response_format or in the prompt
+    if AUDIT_OUTPUT_MODE == "json_schema":
+        return json.dumps(response_format(AuditResult))
+    return get_audit_parser().get_format_instructions()
+
+@functools.lru_cache(maxsize=1)
+def audit_prompt_tokens() -> int:
+    # Prompt overhead per audit call (system prompt + schema), for rate-limit reservations
+    return estimate_tokens(SYSTEM_PROMPT + AUDIT_USER_PROMPT + _output_overhead())
+
+def _retry_wait(attempt: int) -> float:
+    # Non-rate-limit failures (bad JSON, 5xx): short jittered backoff. 429s are paced by the rate limiter.
+    return min(8.0, 2.0 ** attempt) * random.uniform(0.5, 1.0)
+
+def _audit_tokens(text: str) -> int:
+    return audit_prompt_tokens() + estimate_tokens(text) + COMPLETION_TOKEN_ESTIMATE
+
+def _total_tokens(message) -> int:
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens", 0)
+
+class MalformedOutput(ValueError):
+    """
+    The model's answer is not a valid AuditResult. `content` is the answer, `error` why it was rejected.
+    """
+
+    def __init__(self, content: str, error: Exception):
+        super().__init__(f"Malformed audit output: {error}")
+        self.content = content
+        self.error = str(error)[:REPAIR_MAX_ERROR_CHARS]
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+def parse_audit_output(content) -> AuditResult:
+    """
+    The model's answer as an AuditResult, after the free fixes (code fences, prose around the JSON,
+    trailing commas). Raises MalformedOutput if those aren't enough.
+    """
+    content = content if isinstance(content, str) else ""
+    try:
+        return AuditResult.model_validate_json(content)
+    except ValueError as e:
+        error = e
+    text = _CODE_FENCE.sub("", content.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        try:
+            return AuditResult.model_validate_json(_TRAILING_COMMA.sub(r"\1", text[start:end + 1]))
+        except ValueError as e:
+            error = e
+    raise MalformedOutput(content, error)
 
-    chain = prompt | llm | parser
-    return chain
+def _parse_audit(message) -> AuditResult:
+    record_llm_usage(message)
+    try:
+        result = parse_audit_output(message.content)
+    except MalformedOutput:
+        LLM_CALLS.inc(1, "malformed")
+        raise
+    LLM_CALLS.inc(1, "ok")
+    return result
+
+def _repair_tokens(error: MalformedOutput) -> int:
+    return estimate_tokens(REPAIR_SYSTEM_PROMPT + REPAIR_USER_PROMPT + error.error + error.content + _output_overhead()) \
+        + COMPLETION_TOKEN_ESTIMATE
+
+def _repaired(message) -> AuditResult:
+    record_llm_usage(message)
+    record_llm_repair()
+    result = parse_audit_output(message.content)
+    LLM_CALLS.inc(1, "repaired")
+    return result
+
+def _repair_request(error: MalformedOutput) -> Tuple[Dict, int]:
+    """
+    Inputs and token reservation for the one small repair call, which sees only the bad answer.
+    Re-raises `error` if there is nothing to repair (e.g. a refusal).
+    """
+    if not error.content.strip():
+        raise error
+    print(f"🩹 Repairing malformed audit output: {error.error.splitlines()[0]}")
+    return {"content": error.content, "error": error.error}, _repair_tokens(error)
+
+def _on_llm_error(error: Exception, attempt: int, deadline: float):
+    """
+    Decides what happens after a failed call: (next attempt, seconds to sleep), or None to give up.
+    A 429 doesn't use up an attempt; the shared limiter holds every caller back until Retry-After.
+    """
+    print(f"⚠️ Attempt {attempt+1} failed: {error}")
+    if isinstance(error, RateLimitTimeout):
+        LLM_CALLS.inc(1, "rate_limited")
+        return None
+
+    retry_after = retry_after_seconds(error)
+    if retry_after is not None:
+        LLM_CALLS.inc(1, "rate_limited")
+        get_rate_limiter().backoff(retry_after)
+        if time.time() + retry_after > deadline:
+            return None
+        print(f"🚦 Rate limited by provider, queueing for {retry_after:.1f}s...")
+        record_llm_retry()
+        return attempt, 0
+
+    LLM_CALLS.inc(1, "error")
+    if attempt + 1 >= MAX_RETRIES:
+        return None
+    record_llm_retry()
+    return attempt + 1, _retry_wait(attempt)
 
-@opik.track(name="contract_audit")
+class _AuditRun:
+    """
+    The bookkeeping of one audit shared by analyze_contract_text and its async twin: the token reservation,
+    what was spent, the retry decision and the metrics. The two only differ in how they call, wait and sleep.
+    """
+
+    def __init__(self, text: str):
+        self.inputs = {"contract_text": text}
+        self.tokens = _audit_tokens(text)
+        self.deadline = time.time() + RATE_LIMIT_MAX_WAIT
+        self.spent = 0  # tokens reported for this audit, retries and repairs included
+        self.attempt = 0
+
+    def announce(self):
+        print(f"🤖 Analyzing with Grok 4.1 Fast (Attempt {self.attempt+1})...")
+
+    def settle(self, reserved: int, message):
+        get_rate_limiter().settle(reserved, _total_tokens(message))
+        self.spent += _total_tokens(message)
+
+    def finish(self, result: AuditResult) -> AuditResult:
+        # --- DETERMINISTIC SCORING ALGORITHM ---
+        result.overall_predatory_score = calculate_predatory_score(result.detected_traps)
+        AUDIT_TOKENS.observe(self.spent, AUDIT_OUTPUT_MODE)
+        return result
+
+    def after_error(self, error: Exception) -> Optional[float]:
+        """
+        Seconds to sleep before the next attempt, or None to give up (the caller returns system_error_result()).
+        """
+        decision = _on_llm_error(error, self.attempt, self.deadline)
+        if decision is None:
+            AUDIT_TOKENS.observe(self.spent, AUDIT_OUTPUT_MODE)
+            return None
+        self.attempt, wait_time = decision
+        if wait_time:
+            print(f"⏳ Waiting {wait_time:.1f}s before retry...")
+        return wait_time
+
+@traced("contract_audit")
 def analyze_contract_text(text: str) -> AuditResult:
     """
     Initiates a 'Zero-Trust' forensic audit on the provided contract text.
     Uses Grok 4.1 Fast to identify predatory patterns and calculate a risk score.
     """
     chain = get_auditor_chain()
-    parser = PydanticOutputParser(pydantic_object=AuditResult)
-    
+    limiter = get_rate_limiter()
+    run = _AuditRun(text)
+
     # Retry Logic
-    MAX_RETRIES = 3
-    
-    for attempt in range(MAX_RETRIES):
+    while True:
         try:
-            print(f"🤖 Analyzing with Grok 4.1 Fast (Attempt {attempt+1})...")
-            
-            # We invoke the chain
-            result = chain.invoke({
-                "contract_text": text,
-                "format_instructions": parser.get_format_instructions()
-            })
-            
-            # --- DETERMINISTIC SCORING ALGORITHM ---
-            calculated_score = 0
-            for trap in result.detected_traps:
-                risk = trap.risk_level.upper()
-                if "CRITICAL" in risk:
-                    calculated_score += 15
-                elif "CAUTION" in risk:
-                    calculated_score += 5
-                else:
-                    calculated_score += 0 # INFO no longer adds to predatory score
-            
-            # Cap score at 100
-            result.overall_predatory_score = min(calculated_score, 100)
-            
-            return result
+            run.announce()
+            # Wait for our share of the provider quota (shared by all workers)
+            with stage("rate_limit_wait"):
+                limiter.acquire(run.tokens)
+            with stage("llm_call"):
+                message = chain.invoke(run.inputs)
+            run.settle(run.tokens, message)
+            try:
+                result = _parse_audit(message)
+            except MalformedOutput as malformed:
+                inputs, tokens = _repair_request(malformed)
+                with stage("rate_limit_wait"):
+                    limiter.acquire(tokens)
+                with stage("llm_repair"):
+                    message = get_chain("audit_repair").invoke(inputs)
+                run.settle(tokens, message)
+                result = _repaired(message)
+            return run.finish(result)
 
         except Exception as e:
-            print(f"⚠️ Attempt {attempt+1} failed: {e}")
-            if attempt < MAX_RETRIES - 1:
-                wait_time = 2 * (attempt + 1)
-                print(f"⏳ Waiting {wait_time}s before retry...")
-                time.sleep(wait_time)
+            wait_time = run.after_error(e)
+            if wait_time is None:
+                return system_error_result()
+            time.sleep(wait_time)
+
+@traced("contract_audit")
+async def analyze_contract_text_async(text: str) -> AuditResult:
+    """
+    Event-loop friendly twin of analyze_contract_text: async LLM call, non-blocking waits.
+    """
+    chain = get_auditor_chain()
+    limiter = get_rate_limiter()
+    run = _AuditRun(text)
+
+    while True:
+        try:
+            run.announce()
+            with stage("rate_limit_wait"):
+                await limiter.acquire_async(run.tokens)
+            with stage("llm_call"):
+                message = await chain.ainvoke(run.inputs)
+            await asyncio.to_thread(run.settle, run.tokens, message)
+            try:
+                result = _parse_audit(message)
+            except MalformedOutput as malformed:
+                inputs, tokens = _repair_request(malformed)
+                with stage("rate_limit_wait"):
+                    await limiter.acquire_async(tokens)
+                with stage("llm_repair"):
+                    message = await get_chain("audit_repair").ainvoke(inputs)
+                await asyncio.to_thread(run.settle, tokens, message)
+                result = _repaired(message)
+            return run.finish(result)
+
+        except Exception as e:
+            wait_time = await asyncio.to_thread(run.after_error, e)
+            if wait_time is None:
+                return system_error_result()
+            await asyncio.sleep(wait_time)
+
+# --- Map-Reduce Auditing (Full Document) ---
+# Long contracts are split into overlapping, clause-aligned windows that are audited concurrently.
+CHUNK_SIZE = int(os.getenv("AUDIT_CHUNK_SIZE", "12000"))        # chars per window (~3k tokens)
+CHUNK_OVERLAP = int(os.getenv("AUDIT_CHUNK_OVERLAP", "600"))    # chars carried into the next window
+MAX_CONCURRENCY = int(os.getenv("AUDIT_MAX_CONCURRENCY", "8"))  # parallel LLM calls per document
+
+# A clause starts at a blank line or at a numbered / titled heading ("Section 3 :", "4.2", "(a)", "ARTICLE V")
+CLAUSE_BOUNDARY = re.compile(
+    r"\n\s*\n"
+    r"|\n(?=\s*(?:section|article|clause|§|art\.)\s*[\dIVXivx]+)"
+    r"|\n(?=\s*\d+(?:\.\d+)*[.)]?\s+\S)"
+    r"|\n(?=\s*\([a-zA-Z0-9]{1,3}\)\s)",
+    re.IGNORECASE
+)
+
+def split_into_clauses(text: str) -> List[str]:
+    """
+    Splits contract text at paragraph breaks and clause headings. Concatenating the result gives back the input.
+    """
+    clauses = []
+    last = 0
+    for match in CLAUSE_BOUNDARY.finditer(text):
+        if match.end() > last:
+            clauses.append(text[last:match.end()])
+            last = match.end()
+    if last < len(text):
+        clauses.append(text[last:])
+    return [c for c in clauses if c]
+
+def _hard_split(clause: str, max_chars: int) -> List[str]:
+    # A single clause longer than a window: cut at the last whitespace before the limit
+    pieces = []
+    while len(clause) > max_chars:
+        cut = clause.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(clause[:cut])
+        clause = clause[cut:]
+    pieces.append(clause)
+    return pieces
+
+def pack_clauses(clauses: List[str], max_chars: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[List[str]]:
+    """
+    Packs whole clauses into windows of at most `max_chars` and returns the clauses of each window.
+    Each window starts with the trailing clauses (up to `overlap` chars) of the previous one,
+    so a trap straddling a boundary is always seen whole at least once.
+    """
+    if sum(len(clause) for clause in clauses) <= max_chars:
+        return [list(clauses)]
+
+    pieces = []
+    for clause in clauses:
+        pieces.extend(_hard_split(clause, max_chars))
+
+    windows = []
+    current: List[str] = []
+    current_len = 0
+    for clause in pieces:
+        if current and current_len + len(clause) > max_chars:
+            windows.append(current)
+            # Carry the tail of the previous window forward
+            carried: List[str] = []
+            carried_len = 0
+            for prev in reversed(current):
+                if carried_len + len(prev) > overlap or carried_len + len(prev) + len(clause) > max_chars:
+                    break
+                carried.insert(0, prev)
+                carried_len += len(prev)
+            current, current_len = carried, carried_len
+        current.append(clause)
+        current_len += len(clause)
+
+    if current:
+        windows.append(current)
+    return windows
+
+def split_into_chunks(text: str, max_chars: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    pack_clauses() over split_into_clauses(text), as window texts.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    return ["".join(window) for window in pack_clauses(split_into_clauses(text), max_chars, overlap)]
+
+RISK_RANK = {"CRITICAL": 2, "CAUTION": 1}
+
+def _risk_rank(trap: DetectionObject) -> int:
+    risk = trap.risk_level.upper()
+    for level, rank in RISK_RANK.items():
+        if level in risk:
+            return rank
+    return 0
+
+def normalize_quote(text: str) -> str:
+    return " ".join(text.split()).strip("\"'").casefold()
+
+def merge_audit_results(results: List[AuditResult]) -> AuditResult:
+    """
+    Reduces per-window results into a single AuditResult.
+    The same quote found in two overlapping windows (or a truncated copy of it) is kept once, at its highest risk.
+    """
+    merged: List[DetectionObject] = []
+    keys: List[str] = []
+    for result in results:
+        if is_system_error(result):
+            continue
+        for trap in result.detected_traps:
+            key = normalize_quote(trap.original_text)
+            duplicate_of = None
+            for i, existing in enumerate(keys):
+                shorter = min(key, existing, key=len)
+                if key == existing or (len(shorter) >= 40 and (key in existing or existing in key)):
+                    duplicate_of = i
+                    break
+
+            if duplicate_of is None:
+                merged.append(trap)
+                keys.append(key)
+                continue
+
+            kept = merged[duplicate_of]
+            # Prefer the more severe verdict, then the longer (more complete) quote
+            if (_risk_rank(trap), len(key)) > (_risk_rank(kept), len(keys[duplicate_of])):
+                merged[duplicate_of] = trap
+                keys[duplicate_of] = key
+
+    return AuditResult(
+        detected_traps=merged,
+        overall_predatory_score=calculate_predatory_score(merged)
+    )
+
+def audit_fingerprint() -> str:
+    """
+    Identifies everything that shapes an audit verdict (prompt, output mode, model, windowing, pre-screen).
+    Cached results produced under a different fingerprint are stale.
+    """
+    parts = [SYSTEM_PROMPT, AUDIT_USER_PROMPT, AUDIT_OUTPUT_MODE, MODEL_NAME, str(CHUNK_SIZE), str(CHUNK_OVERLAP), prescreen_fingerprint()]
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+def _quote_in_clause(trap: DetectionObject, clause_key: str) -> bool:
+    quote_key = normalize_quote(trap.original_text)
+    if not quote_key:
+        return False
+    return quote_key in clause_key or (len(clause_key) >= 40 and clause_key in quote_key)
+
+def _reuse_verdict(clause: str, templates: List[Dict]) -> List[DetectionObject]:
+    # The stored quote is from another document: keep it only if it is literally here too,
+    # otherwise quote the whole clause so highlighting still lands on real text.
+    clause_key = normalize_quote(clause)
+    traps = []
+    for template in templates:
+        trap = DetectionObject(**template)
+        if normalize_quote(trap.original_text) not in clause_key:
+            trap.original_text = " ".join(clause.split())
+        traps.append(trap)
+    return traps
+
+def _learn_from_window(window_clauses: List[str], result: AuditResult):
+    """
+    Files the clauses of a successfully audited window in the clause index, with the traps quoted from them.
+    A clause with no quoted trap is filed as benign only if the pre-screen also finds nothing in it: when the
+    model paraphrased or trimmed its quote, a trap-looking clause would otherwise be vouched clean for good.
+    """
+    index = get_clause_index()
+    for clause in window_clauses:
+        if clause == GAP_MARKER:
+            continue
+        clause_key = normalize_quote(clause)
+        traps = [t.model_dump() for t in result.detected_traps if _quote_in_clause(t, clause_key)]
+        if not traps and score_clause(clause)[0] >= PRESCREEN_MIN_SCORE:
+            continue
+        index.add(clause, traps)
+
+def _plan_audit(text: str, clauses: Optional[List[str]] = None):
+    """
+    Resolves boilerplate from the clause index, pre-screens the rest and windows what is left for the model.
+    `clauses` is the document already segmented (e.g. PDFWordIndex.clause_texts()); by default `text`
+    is split with split_into_clauses. Returns (verdicts already known, clauses of each window to audit).
+    """
+    known_traps: List[DetectionObject] = []
+    if clauses is None:
+        clauses = split_into_clauses(text)
+    unknown_clauses = clauses
+    if INDEX_ENABLED:
+        index = get_clause_index()
+        unknown_clauses = []
+        for clause in clauses:
+            verdict = index.lookup(clause)
+            if verdict is None:
+                unknown_clauses.append(clause)
             else:
-                return AuditResult(
-                    detected_traps=[
-                        DetectionObject(
-                            original_text="System Error",
-                            risk_level="INFO",
-                            category="System",
-                            plain_english_explanation="The AI service is currently overloaded. Please wait 10 seconds and try again.",
-                            estimated_cost_impact="None",
-                            remediation="Retry shortly."
-                        )
-                    ], 
-                    overall_predatory_score=0
-                )
+                known_traps.extend(_reuse_verdict(clause, verdict))
+    unknown_chars = sum(len(clause) for clause in unknown_clauses)
+    if unknown_chars < len(text):
+        print(f"📇 Clause index covered {len(text) - unknown_chars}/{len(text)} chars.")
+
+    if PRESCREEN_ENABLED and unknown_clauses:
+        # Only clauses with a trap signature (plus their neighbours) go to the model
+        screened, kept = prescreen_clauses(unknown_clauses)
+        screened_chars = sum(len(clause) for clause in screened)
+        if screened_chars < unknown_chars:
+            print(f"🔎 Pre-screen kept {kept}/{len(unknown_clauses)} clauses ({screened_chars}/{unknown_chars} chars).")
+        unknown_clauses = screened
+
+    known_result = AuditResult(detected_traps=known_traps, overall_predatory_score=0)
+    if not "".join(unknown_clauses).strip():
+        return known_result, []
+    return known_result, pack_clauses(unknown_clauses)
+
+def _finish_audit(known_result: AuditResult, windows: List[List[str]], results: List[AuditResult]) -> AuditResult:
+    failed = sum(1 for r in results if is_system_error(r))
+    if results and failed == len(results):
+        return system_error_result()
+    if failed:
+        print(f"⚠️ {failed}/{len(results)} windows failed; returning findings from the rest.")
+
+    if INDEX_ENABLED:
+        for window_clauses, result in zip(windows, results):
+            if not is_system_error(result):
+                _learn_from_window(window_clauses, result)
+
+    return merge_audit_results([known_result] + results)
+
+def analyze_full_contract(text: str, max_concurrency: int = MAX_CONCURRENCY,
+                          clauses: Optional[List[str]] = None) -> AuditResult:
+    """
+    Audits the whole document, not just its first pages.
+    Boilerplate clauses already in the clause index reuse their verdict; the rest is windowed
+    and audited in parallel so latency stays close to a single LLM round trip.
+    """
+    known_result, windows = _plan_audit(text, clauses)
+    chunks = ["".join(window) for window in windows]
+    if len(chunks) <= 1:
+        results = [analyze_contract_text(chunk) for chunk in chunks]
+    else:
+        print(f"📚 Auditing {len(chunks)} windows (up to {max_concurrency} in parallel)...")
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(chunks)))) as pool:
+            results = list(pool.map(analyze_contract_text, chunks))
+
+    return _finish_audit(known_result, windows, results)
+
+async def iter_full_contract_audit(text: str, max_concurrency: int = MAX_CONCURRENCY,
+                                   clauses: Optional[List[str]] = None):
+    """
+    Async generator behind analyze_full_contract_async, for callers that want findings early.
+    Yields ("partial", AuditResult) for the clause-index verdicts and then for each window as it
+    finishes (completion order), and finally ("final", AuditResult) with the merged result.
+    """
+    known_result, windows = await asyncio.to_thread(_plan_audit, text, clauses)
+    chunks = ["".join(window) for window in windows]
+    if known_result.detected_traps:
+        yield "partial", known_result
+    if len(chunks) > 1:
+        print(f"📚 Auditing {len(chunks)} windows (up to {max_concurrency} in parallel)...")
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def audit_window(index: int, chunk: str):
+        async with semaphore:
+            return index, await analyze_contract_text_async(chunk)
+
+    results: List[AuditResult] = [None] * len(chunks)
+    for finished in asyncio.as_completed([audit_window(i, chunk) for i, chunk in enumerate(chunks)]):
+        index, result = await finished
+        results[index] = result
+        if not is_system_error(result):
+            yield "partial", result
+
+    # Merge in document order so the final result doesn't depend on which window answered first
+    yield "final", await asyncio.to_thread(_finish_audit, known_result, windows, results)
+
+async def analyze_full_contract_async(text: str, max_concurrency: int = MAX_CONCURRENCY,
+                                      clauses: Optional[List[str]] = None) -> AuditResult:
+    """
+    Async version of analyze_full_contract. Index lookups (pure CPU) run off the event loop;
+    windows are fanned out as coroutines under a semaphore.
+    """
+    async for kind, result in iter_full_contract_audit(text, max_concurrency, clauses):
+        if kind == "final":
+            return result
     
+# --- Batch Auditing (Portfolio of Documents) ---
+# A portfolio of vendor contracts repeats the same boilerplate over and over. The clauses of every document
+# are pooled and grouped into families of exact repeats (whitespace and case aside), and each family is decided
+# once: from the clause index, by the pre-screen, or by auditing it. Near-duplicates are deliberately not merged
+# here: a trap can sit in the one sentence where two otherwise identical clauses differ, and every distinct text
+# has to reach the model (or the index's own vetted match). All windows of the batch share one concurrency
+# budget. Cost grows with the unique content, not the document count.
+
+def _exact_families(clauses: List[str]) -> List[int]:
+    # Family id per clause: the position of the first clause with the same text
+    first: Dict[str, int] = {}
+    return [first.setdefault(" ".join(clause.split()).casefold(), position) for position, clause in enumerate(clauses)]
+
+async def analyze_contract_batch_async(documents: List[List[str]],
+                                       max_concurrency: int = MAX_CONCURRENCY) -> Tuple[List[AuditResult], Dict]:
+    """
+    Audits several documents given as their clauses. Returns one AuditResult per document
+    (in order) and the deduplication stats.
+    """
+    owners = [(doc, i) for doc, clauses in enumerate(documents) for i in range(len(clauses))]
+    pooled = [documents[doc][i] for doc, i in owners]
+    families = _exact_families(pooled)
+    representatives = sorted(set(families))
+
+    # 1. Families the clause index already knows
+    verdicts: Dict[int, List[Dict]] = {}
+    if INDEX_ENABLED:
+        index = get_clause_index()
+        for family in representatives:
+            verdict = index.lookup(pooled[family])
+            if verdict is not None:
+                verdicts[family] = verdict
+
+    # 2. Pre-screen each document's unknown clauses in its own order (neighbours are context);
+    #    a family goes to the model if any document kept one of its members
+    to_audit = set()
+    start = 0
+    for clauses in documents:
+        doc_families = families[start:start + len(clauses)]
+        unknown = [(clause, family) for clause, family in zip(clauses, doc_families) if family not in verdicts]
+        start += len(clauses)
+        if not unknown:
+            continue
+        if PRESCREEN_ENABLED:
+            kept_texts = set(c for c in prescreen_clauses([clause for clause, _ in unknown])[0] if c != GAP_MARKER)
+            to_audit.update(family for clause, family in unknown if clause in kept_texts)
+        else:
+            to_audit.update(family for _, family in unknown)
+    for family in representatives:
+        if family not in verdicts and family not in to_audit:
+            verdicts[family] = []  # screened out: no trap signature
+
+    # 3. One pass of windows over the families left, all documents sharing the semaphore
+    audit_order = sorted(to_audit)
+    # Clauses longer than a window are cut here, so every piece still knows its family
+    family_of: Dict[str, int] = {}
+    for family in audit_order:
+        for piece in _hard_split(pooled[family], CHUNK_SIZE):
+            family_of.setdefault(piece, family)
+    windows = pack_clauses(list(family_of)) if family_of else []
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def audit_window(window: List[str]):
+        async with semaphore:
+            return await analyze_contract_text_async("".join(window))
+
+    if windows:
+        print(f"📚 Batch: {len(pooled)} clauses in {len(documents)} documents -> {len(representatives)} unique, "
+              f"auditing {len(audit_order)} in {len(windows)} windows...")
+    results = await asyncio.gather(*(audit_window(window) for window in windows))
+    failed = set()
+    for window, result in zip(windows, results):
+        if is_system_error(result):
+            failed.update(family_of[clause] for clause in window if clause in family_of)
+            continue
+        if INDEX_ENABLED:
+            await asyncio.to_thread(_learn_from_window, window, result)
+        for clause in window:
+            family = family_of.get(clause)
+            if family is None:
+                continue
+            clause_key = normalize_quote(clause)
+            verdicts.setdefault(family, []).extend(
+                t.model_dump() for t in result.detected_traps if _quote_in_clause(t, clause_key))
+
+    # 4. Every document gets its families' verdicts, quoted from its own text
+    audit_results = []
+    start = 0
+    for clauses in documents:
+        doc_families = families[start:start + len(clauses)]
+        start += len(clauses)
+        if windows and len(failed) == len(to_audit) and any(f in failed for f in doc_families):
+            audit_results.append(system_error_result())
+            continue
+        traps = []
+        for clause, family in zip(clauses, doc_families):
+            traps.extend(_reuse_verdict(clause, verdicts.get(family, [])))
+        audit_results.append(merge_audit_results([AuditResult(detected_traps=traps, overall_predatory_score=0)]))
+    if failed and len(failed) < len(to_audit):
+        print(f"⚠️ {len(failed)}/{len(to_audit)} batch clauses failed to audit; returning findings from the rest.")
+
+    stats = {
+        "clauses": len(pooled),
+        "unique_clauses": len(representatives),
+        "audited_clauses": len(audit_order),
+        "windows": len(windows),
+        "characters": sum(len(clause) for clause in pooled),
+        "audited_characters": sum(len(pooled[family]) for family in audit_order),
+    }
+    return audit_results, stats
+
 class NegotiationResult(BaseModel):
     subject_line: str = Field(description="A formal, punchy subject line that demands attention")
     email_body: str = Field(description="The body of the negotiation email. Authoritative and legally grounded.")
 
-def generate_negotiation_email(trap_text: str, category: str, explanation: str) -> NegotiationResult:
-    """
-    Generates an adversarial response to a specific predatory clause.
-    Empowers the user with the right legal language to opt-out or dispute.
-    """
-    llm = ChatOpenAI(
-        model="grok-4-1-fast-non-reasoning",
-        openai_api_key=os.getenv("XAI_API_KEY"),
-        openai_api_base="https://api.x.ai/v1",
-        temperature=0.1
-    )
+def _build_negotiation_chain(make_llm):
+    from langchain_core.output_parsers import PydanticOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+    llm = make_llm(MODEL_NAME, temperature=0.1)
     parser = PydanticOutputParser(pydantic_object=NegotiationResult)
 
     negotiation_prompt = ChatPromptTemplate.from_messages([
@@ -199,8 +855,36 @@ def generate_negotiation_email(trap_text: str, category: str, explanation: str)
         """)
     ])
     
-    chain = negotiation_prompt | llm | parser
+    return negotiation_prompt | llm | parser
+
+register_chain("negotiation", _build_negotiation_chain)
+
+def get_negotiation_chain():
+    return get_chain("negotiation")
+
+def _fallback_negotiation(trap_text: str, category: str) -> NegotiationResult:
+    return NegotiationResult(
+        subject_line=f"Inquiry regarding {category} clause",
+        email_body=f"To Whom It May Concern,\n\nI am writing to request clarification regarding the following clause in my contract:\n\n\"{trap_text}\"\n\nPlease provide a written explanation of this term or options for opting out.\n\nSincerely,\n[Your Name]"
+    )
+
+def _negotiation_tokens(trap_text: str, explanation: str) -> int:
+    return estimate_tokens(trap_text + explanation) + COMPLETION_TOKEN_ESTIMATE
+
+def _note_rate_limit(error: Exception):
+    # The email falls back to a template, but the 429 still slows every other caller down
+    retry_after = retry_after_seconds(error)
+    if retry_after is not None:
+        get_rate_limiter().backoff(retry_after)
+
+def generate_negotiation_email(trap_text: str, category: str, explanation: str) -> NegotiationResult:
+    """
+    Generates an adversarial response to a specific predatory clause.
+    Empowers the user with the right legal language to opt-out or dispute.
+    """
+    chain = get_negotiation_chain()
     try:
+        get_rate_limiter().acquire(_negotiation_tokens(trap_text, explanation))
         return chain.invoke({
             "trap_text": trap_text,
             "category": category,
@@ -208,7 +892,19 @@ def generate_negotiation_email(trap_text: str, category: str, explanation: str)
         })
     except Exception as e:
         print(f"Error generating negotiation email: {e}")
-        return NegotiationResult(
-            subject_line=f"Inquiry regarding {category} clause",
-            email_body=f"To Whom It May Concern,\n\nI am writing to request clarification regarding the following clause in my contract:\n\n\"{trap_text}\"\n\nPlease provide a written explanation of this term or options for opting out.\n\nSincerely,\n[Your Name]"
-        )
+        _note_rate_limit(e)
+        return _fallback_negotiation(trap_text, category)
+
+async def generate_negotiation_email_async(trap_text: str, category: str, explanation: str) -> NegotiationResult:
+    chain = get_negotiation_chain()
+    try:
+        await get_rate_limiter().acquire_async(_negotiation_tokens(trap_text, explanation))
+        return await chain.ainvoke({
+            "trap_text": trap_text,
+            "category": category,
+            "explanation": explanation
+        })
+    except Exception as e:
+        print(f"Error generating negotiation email: {e}")
+        _note_rate_limit(e)
+        return _fallback_negotiation(trap_text, category)
@@ -0,0 +1,94 @@
+import argparse
+import difflib
+import io
+import sys
+import time
+
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+
+from generate_sample import photographed_pages, synthetic_contract
+from image_preprocess import ocr_input, preprocess
+
+# OCR time and accuracy per page, with and without image_preprocess.py.
+# Pages of a synthetic contract are "photographed" (tilt, shadow, noise, JPEG) by generate_sample.py,
+# so the true text of every page is known. Each page goes through Tesseract's searchable-PDF output as in
+# ocr_engine.py, raw and preprocessed, with a fixed language so only the preprocessing differs.
+# Accuracy is the share of reference characters recovered in order (difflib matching blocks).
+#
+#   python benchmark_ocr.py [--pages 4] [--dpi 300] [--lang eng]
+
+def normalize(text: str) -> str:
+    return " ".join(text.split())
+
+def char_accuracy(reference: str, text: str) -> float:
+    reference, text = normalize(reference), normalize(text)
+    if not reference:
+        return 1.0
+    matcher = difflib.SequenceMatcher(None, reference, text, autojunk=False)
+    return sum(block.size for block in matcher.get_matching_blocks()) / len(reference)
+
+def ocr(image: Image.Image, lang: str):
+    """
+    Tesseract to a one-page searchable PDF. Returns (seconds, text layer, PDF size).
+    """
+    started = time.perf_counter()
+    pdf = pytesseract.image_to_pdf_or_hocr(image, extension="pdf", lang=lang)
+    seconds = time.perf_counter() - started
+    with fitz.open("pdf", pdf) as doc:
+        text = "".join(page.get_text() for page in doc)
+    return seconds, text, len(pdf)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR with and without image preprocessing.")
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--dpi", type=int, default=300, help="resolution the pages are photographed at")
+    parser.add_argument("--lang", default="eng")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        sys.exit(f"Tesseract is not available: {e}")
+
+    pdf_bytes = synthetic_contract(args.pages, seed=args.seed)
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        references = [page.get_text() for page in doc]
+    snapshots = photographed_pages(pdf_bytes, dpi=args.dpi, seed=args.seed)
+    print(f"📸 {len(snapshots)} photographed pages at {args.dpi} dpi, OCR lang {args.lang}\n")
+
+    print(f"{'PAGE':<5} | {'PIXELS':>7} | {'RAW OCR':>8} | {'RAW ACC':>7} | {'PREP':>6} | {'OCR':>7} | {'ACC':>6} | {'PDF KB raw -> prep'}")
+    print("-" * 92)
+    totals = {"raw_s": 0.0, "prep_s": 0.0, "ocr_s": 0.0, "raw_acc": 0.0, "acc": 0.0}
+    for number, (snapshot, reference) in enumerate(zip(snapshots, references), start=1):
+        with Image.open(io.BytesIO(snapshot)) as image:
+            pixels = image.width * image.height
+            raw_s, raw_text, raw_size = ocr(image, args.lang)
+
+        with Image.open(io.BytesIO(snapshot)) as image:
+            started = time.perf_counter()
+            page = ocr_input(preprocess(image))
+            prep_s = time.perf_counter() - started
+        ocr_s, text, size = ocr(page, args.lang)
+
+        raw_acc, acc = char_accuracy(reference, raw_text), char_accuracy(reference, text)
+        totals["raw_s"] += raw_s
+        totals["prep_s"] += prep_s
+        totals["ocr_s"] += ocr_s
+        totals["raw_acc"] += raw_acc
+        totals["acc"] += acc
+        print(f"{number:<5} | {pixels / 1e6:>6.1f}M | {raw_s:>7.2f}s | {raw_acc:>6.1%} | {prep_s:>5.2f}s | {ocr_s:>6.2f}s | "
+              f"{acc:>5.1%} | {raw_size // 1024} -> {size // 1024}")
+    print("-" * 92)
+
+    pages = len(snapshots)
+    before = totals["raw_s"] / pages
+    after = (totals["prep_s"] + totals["ocr_s"]) / pages
+    print(f"⏱️ Per page: {before:.2f}s raw -> {after:.2f}s preprocessed "
+          f"({totals['prep_s'] / pages:.2f}s preprocessing + {totals['ocr_s'] / pages:.2f}s OCR, {after / before - 1:+.0%})")
+    print(f"🎯 Character accuracy: {totals['raw_acc'] / pages:.1%} raw -> {totals['acc'] / pages:.1%} preprocessed")
+
+if __name__ == "__main__":
+    main()
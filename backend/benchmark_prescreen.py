@@ -0,0 +1,103 @@
+import csv
+import os
+import random
+import sys
+import time
+
+from prescreen import GAP_MARKER, PRESCREEN_CONTEXT, PRESCREEN_MIN_SCORE, prescreen, score_clause
+from rate_limiter import estimate_tokens
+
+# Measures what the pre-screen costs in recall and saves in prompt size.
+# 1. Clause level: how many golden traps score at or above each threshold.
+# 2. Document level: the goldens scattered through a long, mostly benign synthetic contract. How much
+#    text survives the pre-screen, and is every golden clause still in it?
+# The patterns were written with the goldens in view, so the golden recall is an optimistic bound;
+# the benign false-positive rate is the number that shows how much the screen actually cuts.
+#
+#   python benchmark_prescreen.py [number of benign clauses, default 400]
+
+GOLDEN_SET_FILE = os.path.join(os.path.dirname(__file__), "gotchai_goldens.csv")
+THRESHOLDS = (1, 2, 3, 4)
+
+# Ordinary contract boilerplate, none of it a trap
+BENIGN_CLAUSES = [
+    "This Agreement is made between the Company and the Customer identified on the order form.",
+    "This Agreement shall be governed by and construed in accordance with the laws of the State of Delaware.",
+    "Headings are included for convenience only and shall not affect the interpretation of this Agreement.",
+    "If any provision of this Agreement is held invalid, the remaining provisions shall continue in full force and effect.",
+    "The Customer shall provide accurate billing and contact information and keep it up to date.",
+    "Notices under this Agreement shall be sent to the addresses set out in the order form.",
+    "The Tenant shall keep the premises clean, sanitary and in good condition.",
+    "The Landlord shall deliver the premises to the Tenant on the commencement date.",
+    "Each party represents that it has the authority to enter into this Agreement.",
+    "This Agreement constitutes the entire agreement between the parties regarding its subject matter.",
+    "The Company will provide the Service substantially in accordance with the published documentation.",
+    "Support requests may be submitted through the help center during business hours.",
+    "The Customer is responsible for maintaining the confidentiality of its account password.",
+    "Neither party may assign this Agreement without the prior written consent of the other party, which shall not be unreasonably withheld.",
+    "The parties are independent contractors and nothing in this Agreement creates a partnership or agency.",
+    "This Agreement may be executed in counterparts, each of which is deemed an original.",
+    "The Service is available in English, Greek and German.",
+    "Payment is due within thirty days of the invoice date by bank transfer.",
+    "The Customer may download a copy of its invoices from the account dashboard.",
+    "Η παρούσα σύμβαση διέπεται από το ελληνικό δίκαιο.",
+    "Ο Μισθωτής υποχρεούται να διατηρεί το μίσθιο σε καλή κατάσταση.",
+    "Dieser Vertrag unterliegt dem Recht der Bundesrepublik Deutschland.",
+    "El presente contrato se rige por la legislación española.",
+    "Le présent contrat est régi par le droit français.",
+    # Benign, but with trap vocabulary in it
+    "Either party may terminate this Agreement for a material breach that remains uncured thirty days after written notice.",
+    "The monthly fee for the selected plan is shown on the order form.",
+    "Each party shall comply with applicable data protection laws.",
+    "The Customer may cancel an order before it ships without charge.",
+]
+
+def load_goldens():
+    with open(GOLDEN_SET_FILE, "r") as f:
+        return [row["input"] for row in csv.DictReader(f)]
+
+def clause_recall(goldens):
+    print("\n📋 Clause-level recall on the golden set")
+    scores = [score_clause(text)[0] for text in goldens]
+    benign_scores = [score_clause(text)[0] for text in BENIGN_CLAUSES]
+    print(f"{'THRESHOLD':<10} | {'GOLDEN RECALL':<15} | {'BENIGN FLAGGED':<15}")
+    for threshold in THRESHOLDS:
+        hits = sum(score >= threshold for score in scores)
+        flagged = sum(score >= threshold for score in benign_scores)
+        marker = "  <- default" if threshold == PRESCREEN_MIN_SCORE else ""
+        print(f"{threshold:<10} | {hits:>3}/{len(goldens):<3} {100 * hits / len(goldens):5.1f}% | "
+              f"{flagged:>3}/{len(BENIGN_CLAUSES):<3} {100 * flagged / len(BENIGN_CLAUSES):5.1f}%{marker}")
+
+    missed = [(score, text) for score, text in zip(scores, goldens) if score < PRESCREEN_MIN_SCORE]
+    for score, text in missed:
+        print(f"   ❌ missed (score {score}): {text[:80]}")
+
+def synthetic_contract(goldens, benign_count: int, seed: int = 0):
+    # Numbered clauses separated by blank lines, goldens at random positions
+    rng = random.Random(seed)
+    body = [rng.choice(BENIGN_CLAUSES) for _ in range(benign_count)]
+    for text in goldens:
+        body.insert(rng.randrange(len(body) + 1), text)
+    return [f"{n}. {text}\n\n" for n, text in enumerate(body, start=1)]
+
+def document_benchmark(goldens, benign_count: int):
+    clauses = synthetic_contract(goldens, benign_count)
+    full_text = "".join(clauses)
+    print(f"\n📄 Synthetic contract: {len(clauses)} clauses, {len(full_text)} chars, {len(goldens)} planted traps")
+    print(f"{'THRESHOLD':<10} | {'KEPT':<8} | {'CHARS SENT':<12} | {'~TOKENS SENT':<13} | {'RECALL':<8} | {'SCAN'}")
+    for threshold in THRESHOLDS:
+        started = time.perf_counter()
+        screened, kept = prescreen(clauses, min_score=threshold, context=PRESCREEN_CONTEXT, min_chars=0, max_keep=1.0)
+        elapsed = time.perf_counter() - started
+        recall = sum(text in screened for text in goldens)
+        marker = "  <- default" if threshold == PRESCREEN_MIN_SCORE else ""
+        print(f"{threshold:<10} | {kept:>3}/{len(clauses):<4} | {100 * len(screened) / len(full_text):5.1f}%      | "
+              f"{estimate_tokens(screened):>6}/{estimate_tokens(full_text):<6} | {recall:>2}/{len(goldens):<3}   | "
+              f"{elapsed * 1000:.1f} ms ({len(full_text) / elapsed / 1e6:.1f} MB/s){marker}")
+    print(f"   (gap markers {GAP_MARKER.strip()} included in the size; context = {PRESCREEN_CONTEXT} clause(s) each side)")
+
+if __name__ == "__main__":
+    benign_count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    goldens = load_goldens()
+    clause_recall(goldens)
+    document_benchmark(goldens, benign_count)
@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from generate_sample import synthetic_contract
+from loadtest import git_commit
+from stub_llm import serve
+
+# Cold-start benchmark: what a scale-to-zero instance pays between spin-up and its first answer.
+#   import   - `import main` in a fresh interpreter (median of --runs), plus the slowest modules (-X importtime)
+#   boot     - uvicorn launched until GET / answers (the port is bound and the app is serving)
+#   first    - uvicorn launched until the first /analyze (stub LLM) has returned
+# boot and first are measured with LAZY_STARTUP on and off. Every run is appended to STARTUP_RESULTS.
+#
+#   python benchmark_startup.py [--runs 5] [--top 10] [--compare 10]
+
+BASE_DIR = Path(__file__).parent
+STARTUP_RESULTS = os.getenv("STARTUP_RESULTS", str(BASE_DIR / ".cache" / "startup_results.jsonl"))
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+SERVER_START_TIMEOUT = 60
+
+def import_seconds() -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+                         env=dict(os.environ, OPIK_API_KEY=""))
+    return float(out.stdout.strip().splitlines()[-1])
+
+def slowest_imports(top: int):
+    """
+    Top-level packages by cumulative import time while importing main: [(module, ms)].
+    """
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BASE_DIR,
+                         capture_output=True, text=True, env=dict(os.environ, OPIK_API_KEY=""))
+    totals = {}
+    for line in out.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, module = match.groups()
+        if len(indent) == 3:  # imported by main itself
+            totals[module] = int(cumulative) / 1000
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+def boot(lazy: bool, stub_url: str, port: int, pdf_bytes: bytes, workdir: str):
+    """
+    Launches uvicorn and returns (seconds until GET / answers, seconds until the first audit returned).
+    """
+    env = dict(os.environ,
+               LAZY_STARTUP="1" if lazy else "0",
+               LLM_BASE_URL=stub_url,
+               XAI_API_KEY="stub",
+               OPIK_API_KEY="",
+               AUDIT_CACHE_ENABLED="0",
+               CLAUSE_INDEX_ENABLED="0",
+               REVISIONS_ENABLED="0",
+               RATE_LIMIT_DB=os.path.join(workdir, "ratelimit.db"),
+               JOB_DB=os.path.join(workdir, "jobs.db"),
+               STATS_DB=os.path.join(workdir, "stats.db"),
+               DOCUMENT_DIR=os.path.join(workdir, "documents"))
+    log = open(os.path.join(workdir, "server.log"), "a")
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited during startup; see {log.name}")
+            if time.perf_counter() - started > SERVER_START_TIMEOUT:
+                raise RuntimeError("Server did not come up in time")
+            try:
+                if httpx.get(url + "/", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.02)
+        up = time.perf_counter() - started
+        response = httpx.post(url + "/analyze", files=[("file", ("contract.pdf", pdf_bytes, "application/pdf"))],
+                              timeout=SERVER_START_TIMEOUT)
+        response.raise_for_status()
+        return up, time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        log.close()
+
+def compare(limit: int):
+    if not os.path.exists(STARTUP_RESULTS):
+        print(f"No runs stored in {STARTUP_RESULTS} yet.")
+        return
+    with open(STARTUP_RESULTS) as f:
+        runs = [json.loads(line) for line in f if line.strip()][-limit:]
+    print(f"{'WHEN':<17} {'COMMIT':<14} {'IMPORT':>7} {'LAZY UP':>8} {'LAZY 1ST':>9} {'EAGER UP':>9} {'EAGER 1ST':>10}")
+    for run in runs:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["timestamp"]))
+        lazy, eager = run["lazy"], run["eager"]
+        print(f"{when:<17} {run['commit']:<14} {run['import_s']:>6.2f}s {lazy['up_s']:>7.2f}s {lazy['first_s']:>8.2f}s "
+              f"{eager['up_s']:>8.2f}s {eager['first_s']:>9.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API's cold start.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--compare", type=int, default=0, help="print the last N stored runs and exit")
+    args = parser.parse_args()
+    if args.compare:
+        compare(args.compare)
+        return
+
+    print(f"📦 import main, {args.runs} fresh interpreters...")
+    imports = [import_seconds() for _ in range(args.runs)]
+    print(f"   median {statistics.median(imports):.2f}s (min {min(imports):.2f}s, max {max(imports):.2f}s)")
+    print("   slowest imports:")
+    for module, ms in slowest_imports(args.top):
+        print(f"   {ms:>8.0f}ms  {module}")
+
+    pdf_bytes = synthetic_contract(3)
+    stub, _ = serve(0, latency_ms=0, jitter_ms=0)
+    stub_url = f"http://127.0.0.1:{stub.server_port}/v1"
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix="gotchai-startup-") as workdir:
+            for mode, lazy in (("lazy", True), ("eager", False)):
+                samples = [boot(lazy, stub_url, args.port, pdf_bytes, workdir) for _ in range(args.runs)]
+                results[mode] = {"up_s": round(statistics.median(up for up, _ in samples), 3),
+                                 "first_s": round(statistics.median(first for _, first in samples), 3)}
+                print(f"🚀 LAZY_STARTUP={int(lazy)}: serving after {results[mode]['up_s']:.2f}s, "
+                      f"first audit back after {results[mode]['first_s']:.2f}s (median of {args.runs})")
+    finally:
+        stub.shutdown()
+
+    run = {"timestamp": time.time(), "commit": git_commit(), "runs": args.runs,
+           "import_s": round(statistics.median(imports), 3), **results}
+    os.makedirs(os.path.dirname(STARTUP_RESULTS) or ".", exist_ok=True)
+    with open(STARTUP_RESULTS, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"\n💾 Run appended to {STARTUP_RESULTS}")
+
+if __name__ == "__main__":
+    main()
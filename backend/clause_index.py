@@ -0,0 +1,265 @@
+import csv
+import os
+import random
+import re
+import threading
+import zlib
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# --- Clause Near-Duplicate Index (MinHash + LSH) ---
+# Most clauses we audit are boilerplate that differs only in party names and the odd date or amount.
+# Every audited clause is fingerprinted with MinHash; a new clause whose estimated Jaccard
+# similarity to a known one clears the threshold reuses that verdict instead of going to the LLM.
+#
+# Memory: a clause that is a near-duplicate of a known one is never stored again, so the index
+# grows with the number of distinct clause *families*. A benign family costs about 0.9 KB all told
+# (its signature array, the entry tuple and eight band-dict entries with their int keys); each trap
+# template kept with a verdict adds 0.5 KB or more of dict and strings (measured with tracemalloc).
+# The index lives in memory, per process, and starts again from the goldens on restart, so it is
+# capped at CLAUSE_INDEX_MAX_FAMILIES (50-70 MB at the default). Past the cap a learned family is
+# evicted clock-style: a lookup only sets the family's "matched" flag (reads stay lock-free), and the
+# first family the clock hand finds unmatched since its last pass goes. Goldens are never evicted.
+#
+# Concurrency: lookups take no lock. Inserts and evictions are serialized; a family's signature and
+# verdict are published together as one tuple, before (or after, when evicting) the band entries that
+# make it reachable, so a reader never sees half an entry.
+
+INDEX_ENABLED = os.getenv("CLAUSE_INDEX_ENABLED", "1") != "0"
+SIMILARITY_THRESHOLD = float(os.getenv("CLAUSE_SIMILARITY_THRESHOLD", "0.85"))
+MIN_CLAUSE_CHARS = int(os.getenv("CLAUSE_INDEX_MIN_CHARS", "60"))
+MAX_FAMILIES = int(os.getenv("CLAUSE_INDEX_MAX_FAMILIES", "50000"))
+GOLDEN_SET_FILE = os.path.join(os.path.dirname(__file__), "gotchai_goldens.csv")
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS   # 8 bands x 4 rows: pairs above ~0.6 Jaccard almost always collide
+SHINGLE_SIZE = 3
+# A clause needs this many distinct shingles with a real word in them before a near-duplicate match counts:
+# below that, a couple of shared words make two unrelated short clauses look identical
+MIN_WORD_SHINGLES = 8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(1337)  # Fixed seed: signatures are comparable across processes and restarts
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+_TOKEN = re.compile(r"\w+|[.!?;:]", re.UNICODE)
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+NAME = "@"
+
+def _magnitude(match: re.Match) -> str:
+    # "$5" and "$500", "3 days" and "30 days" must not look alike: numbers keep their order of magnitude
+    digits = sum(c.isdigit() for c in match.group().split(".")[0])
+    return f" _{digits} "
+
+def _is_placeholder(token: str) -> bool:
+    return token == NAME or token.startswith("_")
+
+def normalize_clause(text: str) -> List[str]:
+    """
+    Tokens that survive boilerplate re-use: case-folded words, numbers reduced to their number of digits
+    ('_3' for 500), and every run of mid-sentence Titlecase words (company and product names) collapsed to '@'.
+    ALL-CAPS text is kept word for word: waivers and arbitration clauses are conventionally set in capitals.
+    """
+    tokens = []
+    sentence_start = True
+    for token in _TOKEN.findall(_NUMBER.sub(_magnitude, text)):
+        if token in ".!?;:":
+            sentence_start = True
+            continue
+        if token[0].isupper() and not token.isupper() and not sentence_start:
+            if not tokens or tokens[-1] != NAME:
+                tokens.append(NAME)
+        else:
+            tokens.append(token.casefold())
+        sentence_start = False
+    return tokens
+
+def shingles(tokens: List[str]) -> set:
+    if len(tokens) < SHINGLE_SIZE:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+def minhash(text: str) -> Optional[Tuple[int, ...]]:
+    """
+    The clause's MinHash signature, or None if it has too little wording of its own to be matched safely.
+    """
+    tokens = normalize_clause(text)
+    distinct = shingles(tokens)
+    word_shingles = sum(1 for shingle in distinct if not all(_is_placeholder(t) for t in shingle.split()))
+    if word_shingles < MIN_WORD_SHINGLES:
+        return None
+    hashed = [zlib.crc32(s.encode("utf-8")) for s in distinct]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashed)
+        for a, b in _PERMUTATIONS
+    )
+
+def estimated_similarity(sig_a, sig_b) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+def _band_keys(signature) -> List[int]:
+    # One 64-bit key per band; the band number is mixed in so all bands share a single dict
+    return [hash((band,) + tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+class ClauseIndex:
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, max_families: int = MAX_FAMILIES):
+        self.threshold = threshold
+        self.max_families = max_families
+        self._entries: List[Optional[Tuple[array, List[Dict]]]] = []  # slot -> (signature, trap templates)
+        self._buckets: Dict[int, object] = {}    # band key -> slot, or list of slots on collision
+        self._referenced = bytearray()           # slot -> matched since the clock hand last passed
+        self._pinned = bytearray()               # slot -> golden, never evicted
+        self._hand = 0
+        self._size = 0
+        self._write_lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _best_match(self, signature) -> Tuple[Optional[int], float]:
+        best_id, best_score = None, 0.0
+        seen = set()
+        for key in _band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            for clause_id in (bucket if isinstance(bucket, list) else (bucket,)):
+                if clause_id in seen:
+                    continue
+                seen.add(clause_id)
+                entry = self._entries[clause_id]
+                if entry is None:
+                    continue
+                score = estimated_similarity(signature, entry[0])
+                if score > best_score:
+                    best_id, best_score = clause_id, score
+        return best_id, best_score
+
+    def lookup(self, clause: str) -> Optional[List[Dict]]:
+        """
+        Returns the stored verdict (a list of trap templates, possibly empty) for a near-duplicate clause,
+        or None if the clause has to be audited.
+        """
+        if len(clause.strip()) < MIN_CLAUSE_CHARS:
+            return None
+        signature = minhash(clause)
+        if signature is None:
+            return None
+        clause_id, score = self._best_match(signature)
+        if clause_id is None or score < self.threshold:
+            return None
+        entry = self._entries[clause_id]
+        if entry is None:
+            return None
+        self._referenced[clause_id] = 1
+        return entry[1]
+
+    def _unlink_slot(self, slot: int):
+        # Makes an entry unreachable: its band entries go first, then the entry itself
+        signature, _ = self._entries[slot]
+        for key in _band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket == slot:
+                del self._buckets[key]
+            elif isinstance(bucket, list):
+                # Replaced, not edited in place: a reader may be iterating the old list
+                rest = [clause_id for clause_id in bucket if clause_id != slot]
+                self._buckets[key] = rest if len(rest) > 1 else rest[0]
+        self._entries[slot] = None
+        self._size -= 1
+
+    def _evict(self) -> Optional[int]:
+        # Clock sweep over the slots: a referenced family gets a second chance, the first one not
+        # referenced since the last pass is evicted. None if every family is a golden.
+        for _ in range(2 * len(self._entries)):
+            slot = self._hand
+            self._hand = (self._hand + 1) % len(self._entries)
+            if self._pinned[slot] or self._entries[slot] is None:
+                continue
+            if self._referenced[slot]:
+                self._referenced[slot] = 0
+                continue
+            self._unlink_slot(slot)
+            return slot
+        return None
+
+    def add(self, clause: str, traps: List[Dict], pinned: bool = False) -> bool:
+        """
+        Records the verdict for an audited clause. Returns False if a near-duplicate is already indexed
+        (or the index is full of goldens). `pinned` entries are never evicted.
+        """
+        if len(clause.strip()) < MIN_CLAUSE_CHARS:
+            return False
+        signature = minhash(clause)
+        if signature is None:
+            return False
+
+        with self._write_lock:
+            clause_id, score = self._best_match(signature)
+            if clause_id is not None and score >= self.threshold:
+                return False
+
+            if len(self._entries) < self.max_families or pinned:
+                clause_id = len(self._entries)
+                self._entries.append(None)
+                self._referenced.append(0)
+                self._pinned.append(0)
+            else:
+                clause_id = self._evict()
+                if clause_id is None:
+                    return False
+            self._referenced[clause_id] = 0
+            self._pinned[clause_id] = int(pinned)
+            self._entries[clause_id] = (array("I", signature), traps)
+            self._size += 1
+            for key in _band_keys(signature):
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    self._buckets[key] = clause_id
+                elif isinstance(bucket, list):
+                    bucket.append(clause_id)
+                else:
+                    self._buckets[key] = [bucket, clause_id]
+        return True
+
+    def seed_from_goldens(self, path: str = GOLDEN_SET_FILE) -> int:
+        """
+        Loads the Golden Traps set: each row is a known predatory clause with its expected verdict.
+        """
+        if not os.path.exists(path):
+            return 0
+        added = 0
+        with open(path, "r") as f:
+            for row in csv.DictReader(f):
+                trap = {
+                    "original_text": row["input"],
+                    "risk_level": row["risk_level"].upper(),
+                    "category": row["reference"],
+                    "plain_english_explanation": row["expected_output"],
+                    "estimated_cost_impact": "High",
+                    "remediation": "Ask for this clause to be removed or rewritten before signing."
+                }
+                if self.add(row["input"], [trap], pinned=True):
+                    added += 1
+        return added
+
+
+_index: Optional[ClauseIndex] = None
+_index_lock = threading.Lock()
+
+def get_clause_index() -> ClauseIndex:
+    """
+    Process-wide index, seeded from the goldens on first use.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = ClauseIndex()
+                seeded = index.seed_from_goldens()
+                print(f"📇 Clause index ready ({seeded} golden clauses).")
+                _index = index
+    return _index
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# --- Content-Addressed Document Store ---
+# Audited PDFs (uploads and OCR output) are written once under their sha256 and served by
+# GET /documents/{id}, so /analyze can answer with a reference instead of echoing the file as base64.
+
+DOCUMENT_DIR = os.getenv("DOCUMENT_DIR", str(Path(__file__).parent / ".cache" / "documents"))
+DOCUMENT_STORE_MB = int(os.getenv("DOCUMENT_STORE_MB", "1024"))
+DOCUMENT_TTL_SECONDS = int(os.getenv("DOCUMENT_TTL_HOURS", "24")) * 3600
+
+SWEEP_EVERY = 50
+_DOCUMENT_ID = re.compile(r"^[0-9a-f]{64}$")
+
+def document_id_for(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+def document_id_for_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentStore:
+    def __init__(self, root: str = DOCUMENT_DIR, max_mb: int = DOCUMENT_STORE_MB, ttl_seconds: int = DOCUMENT_TTL_SECONDS):
+        self.root = Path(root)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.ttl_seconds = ttl_seconds
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, document_id: str) -> Optional[Path]:
+        """
+        Path of a stored, unexpired document, or None. Rejects anything that isn't a sha256 hex id.
+        """
+        if not _DOCUMENT_ID.match(document_id):
+            return None
+        path = self.root / document_id[:2] / f"{document_id}.pdf"
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl_seconds:
+                return None
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, pdf_bytes: bytes, document_id: Optional[str] = None) -> str:
+        document_id = document_id or document_id_for(pdf_bytes)
+        return self._store(document_id, lambda f: f.write(pdf_bytes))
+
+    def put_file(self, source_path: str, document_id: str) -> str:
+        """
+        put() for a PDF already on disk (a spooled upload, OCR output): copied in chunks, never read whole.
+        """
+        def copy(f):
+            with open(source_path, "rb") as source:
+                shutil.copyfileobj(source, f)
+        return self._store(document_id, copy)
+
+    def _store(self, document_id: str, write) -> str:
+        path = self.root / document_id[:2] / f"{document_id}.pdf"
+        if path.exists():
+            # Same content already stored: just refresh its TTL
+            os.utime(path)
+            return document_id
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            # A failed copy (disk full, source gone) must not leave a stray .tmp behind
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        with self._lock:
+            self._writes += 1
+            should_sweep = self._writes % SWEEP_EVERY == 0
+        if should_sweep:
+            self.sweep()
+        return document_id
+
+    def sweep(self):
+        """
+        Drops expired documents, then the least recently stored ones until the store fits its budget.
+        """
+        now = time.time()
+        files = []
+        for path in self.root.rglob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.ttl_seconds:
+                path.unlink(missing_ok=True)
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+# Offline, concurrent evaluation of the golden set.
+# Cases run in parallel (up to --concurrency) and the model's answers can be recorded to a cassette
+# once and replayed afterwards: a replayed run needs no network or API key and finishes in seconds.
+# Reports accuracy with per-case latency and token usage; --baseline compares against an earlier report
+# (e.g. AUDIT_OUTPUT_MODE=prompt against the default json_schema, to see what native structured output saves).
+#
+#   python eval_runner.py --mode record                 # live calls, answers saved to the cassette
+#   python eval_runner.py                               # replay (default)
+#   python eval_runner.py --report after.json --baseline before.json
+
+load_dotenv()
+
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))
+MODES = ("replay", "record", "live")
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate the auditor against the golden set.")
+    parser.add_argument("--mode", choices=MODES, default="replay",
+                        help="replay: answers from the cassette only; record: live calls saved to it; live: no cassette")
+    parser.add_argument("--cassette", default=None, help="cassette file (default: EVAL_CASSETTE)")
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY, help="cases in flight at once")
+    parser.add_argument("--limit", type=int, default=0, help="only the first N goldens")
+    parser.add_argument("--goldens", default=None, help="golden CSV (default: gotchai_goldens.csv)")
+    parser.add_argument("--report", default=None, help="write the per-case results and summary to this JSON file")
+    parser.add_argument("--baseline", default=None, help="earlier --report to compare against")
+    return parser.parse_args()
+
+async def run_cases(rows, concurrency: int, cassette=None):
+    from auditor import MODEL_NAME, analyze_contract_text_async, get_auditor_chain, is_system_error
+    from evaluate import grade
+    from llm_cassette import prompt_key
+    from metrics import start_trace
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_case(index: int, row):
+        text = row["input"]
+        case = {"index": index, "input": text, "expected_risk": row["risk_level"].upper()}
+
+        key = None
+        if cassette is not None:
+            # The rendered prompt is what the cassette is keyed on
+            key = prompt_key(MODEL_NAME, get_auditor_chain().first.invoke({"contract_text": text}))
+            if cassette.mode == "replay" and key not in cassette:
+                case.update(status="skipped", reason="Not in cassette")
+                return case
+
+        async with semaphore:
+            trace = start_trace()
+            started = time.perf_counter()
+            result = await analyze_contract_text_async(text)
+            latency = time.perf_counter() - started
+
+        passed, actual_risk, reason = grade(row, result)
+        case.update(
+            status="error" if is_system_error(result) else ("pass" if passed else "fail"),
+            actual_risk=actual_risk,
+            reason=reason,
+            latency_ms=round(latency * 1000, 1),
+            prompt_tokens=trace.prompt_tokens,
+            completion_tokens=trace.completion_tokens,
+            retries=trace.llm_retries,
+            repairs=trace.llm_repairs,
+        )
+        entry = cassette.get(key) if cassette is not None else None
+        if entry is not None:
+            # How long the real model took when the answer was recorded
+            case["model_ms"] = entry.get("latency_ms")
+        return case
+
+    cases = []
+    for finished in asyncio.as_completed([run_case(i, row) for i, row in enumerate(rows)]):
+        cases.append(await finished)
+    return sorted(cases, key=lambda c: c["index"])
+
+def summarize(cases, wall_seconds: float):
+    from auditor import AUDIT_OUTPUT_MODE
+    graded = [c for c in cases if c["status"] in ("pass", "fail", "error")]
+    passed = sum(c["status"] == "pass" for c in graded)
+    latencies = [c["latency_ms"] for c in graded]
+    return {
+        "cases": len(cases),
+        "graded": len(graded),
+        "passed": passed,
+        "errors": sum(c["status"] == "error" for c in graded),
+        "skipped": len(cases) - len(graded),
+        "accuracy": round(100 * passed / len(graded), 1) if graded else 0.0,
+        "latency_p50_ms": percentile(latencies, 0.50),
+        "latency_p95_ms": percentile(latencies, 0.95),
+        "latency_max_ms": max(latencies, default=0.0),
+        "prompt_tokens": sum(c["prompt_tokens"] for c in graded),
+        "completion_tokens": sum(c["completion_tokens"] for c in graded),
+        "repairs": sum(c["repairs"] for c in graded),
+        "output_mode": AUDIT_OUTPUT_MODE,
+        "wall_seconds": round(wall_seconds, 2),
+    }
+
+def print_report(cases, summary):
+    print(f"{'INPUT':<42} | {'EXPECTED':<9} | {'ACTUAL':<9} | {'LATENCY':>9} | {'TOKENS':>11} | RESULT")
+    print("-" * 110)
+    icons = {"pass": "✅ PASS", "fail": "❌ FAIL", "error": "⚠️ ERROR", "skipped": "⏭️ SKIP"}
+    for case in cases:
+        line = f"{case['input'][:40]:<40}.. | {case['expected_risk']:<9} | {case.get('actual_risk', '-'):<9} | "
+        if case["status"] == "skipped":
+            line += f"{'-':>9} | {'-':>11} | "
+        else:
+            line += f"{case['latency_ms']:>7.0f}ms | {case['prompt_tokens']:>5}+{case['completion_tokens']:<5} | "
+        line += icons[case["status"]]
+        if case["status"] != "pass":
+            line += f" ({case['reason']})"
+        print(line)
+    print("-" * 110)
+
+    graded = summary["graded"]
+    print(f"🏆 Accuracy: {summary['accuracy']:.1f}% ({summary['passed']}/{graded} graded, "
+          f"{summary['errors']} errors, {summary['skipped']} skipped)")
+    print(f"⏱️ Latency p50 {summary['latency_p50_ms']:.0f} ms | p95 {summary['latency_p95_ms']:.0f} ms | "
+          f"max {summary['latency_max_ms']:.0f} ms | wall {summary['wall_seconds']:.2f}s")
+    per_case = (summary["prompt_tokens"] + summary["completion_tokens"]) / graded if graded else 0
+    print(f"🪙 Tokens: {summary['prompt_tokens']} prompt + {summary['completion_tokens']} completion "
+          f"({per_case:.0f} per case, output mode {summary['output_mode']}, {summary['repairs']} repaired answers)")
+
+def compare(cases, summary, baseline_path: str):
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    before = baseline["summary"]
+    print(f"\n📊 Against {baseline_path} (output mode {before.get('output_mode', 'prompt')} -> {summary['output_mode']}):")
+    for name, label in (("accuracy", "accuracy %"), ("latency_p50_ms", "latency p50 ms"),
+                        ("latency_p95_ms", "latency p95 ms"), ("prompt_tokens", "prompt tokens"),
+                        ("completion_tokens", "completion tokens")):
+        print(f"   {label:<18} {before.get(name, 0):>10} -> {summary[name]:<10} ({summary[name] - before.get(name, 0):+.1f})")
+
+    previous = {c["input"]: c["status"] for c in baseline["cases"]}
+    for case in cases:
+        old = previous.get(case["input"])
+        if old in ("pass", "fail", "error") and case["status"] in ("pass", "fail", "error") and old != case["status"]:
+            print(f"   {'🟢' if case['status'] == 'pass' else '🔴'} {old} -> {case['status']}: {case['input'][:60]}")
+
+def main():
+    args = parse_args()
+    if args.mode == "replay":
+        # Nothing is sent anywhere: don't queue on the shared provider budget
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+    from evaluate import GOLDEN_SET_FILE, load_goldens
+    from llm_cassette import EVAL_CASSETTE, Cassette
+    from llm_clients import set_llm_wrapper
+
+    cassette = None
+    if args.mode != "live":
+        cassette = Cassette(args.cassette or EVAL_CASSETTE, args.mode)
+        set_llm_wrapper(cassette.wrap)
+        print(f"📼 {args.mode.capitalize()} cassette {cassette.path} ({len(cassette.entries)} responses)")
+
+    rows = load_goldens(args.goldens or GOLDEN_SET_FILE)
+    if args.limit:
+        rows = rows[:args.limit]
+    print(f"🚀 Evaluating {len(rows)} cases, {args.concurrency} at a time ({args.mode})...")
+
+    started = time.perf_counter()
+    cases = asyncio.run(run_cases(rows, args.concurrency, cassette))
+    summary = summarize(cases, time.perf_counter() - started)
+    if cassette is not None:
+        cassette.save()
+        if args.mode == "record":
+            print(f"📼 Recorded {cassette.recorded} responses to {cassette.path}")
+
+    print_report(cases, summary)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"mode": args.mode, "summary": summary, "cases": cases}, f, indent=1, ensure_ascii=False)
+        print(f"💾 Report saved to {args.report}")
+    if args.baseline:
+        compare(cases, summary, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -1,112 +1,90 @@
 import csv
-import json
 import os
 import asyncio
 from auditor import analyze_contract_text
+from stats_store import get_stats_store
 from dotenv import load_dotenv
 
 load_dotenv()
 
 GOLDEN_SET_FILE = os.path.join(os.path.dirname(__file__), "gotchai_goldens.csv")
-STATS_FILE = os.path.join(os.path.dirname(__file__), "database.json")
+
+def load_goldens(path: str = GOLDEN_SET_FILE):
+    with open(path, "r") as f:
+        return list(csv.DictReader(f))
+
+def grade(row, audit_result):
+    """
+    Scores one golden case: the most severe trap must carry the expected risk level.
+    Returns (passed, actual_risk, reason).
+    """
+    expected_risk = row["risk_level"].upper()
+    expected_category = row["reference"]
+
+    # --- RIGOROUS EVALUATION ---
+    if not audit_result.detected_traps:
+        return False, "NONE", "No Traps Found"
+
+    sorted_traps = sorted(audit_result.detected_traps, key=lambda t: 0 if "CRITICAL" in t.risk_level else 1)
+    best_trap = sorted_traps[0]
+
+    actual_risk = best_trap.risk_level.upper()
+    actual_cat = best_trap.category
+
+    cat_match = expected_category.lower() in actual_cat.lower() or actual_cat.lower() in expected_category.lower()
+
+    if actual_risk == expected_risk and cat_match:
+        return True, actual_risk, "Perfect"
+    if actual_risk == expected_risk:
+        return True, actual_risk, "Risk Match"
+    return False, actual_risk, f"Risk Mismatch ({actual_risk})"
 
 async def run_evaluation():
     print(f"🚀 Starting Evaluation on {GOLDEN_SET_FILE}...")
     
     results = []
     correct_count = 0
-    total_count = 0
-
-    with open(GOLDEN_SET_FILE, "r") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-        total_count = len(rows)
-
-        print(f"{'INPUT':<50} | {'EXPECTED':<15} | {'ACTUAL':<15} | {'RESULT'}")
-        print("-" * 100)
-
-        for row in rows:
-            input_text = row["input"]
-            expected_risk = row["risk_level"].upper()
-            expected_category = row["reference"]
-
-            # Retry loop for Rate Limits
-            while True:
-                audit_result = analyze_contract_text(input_text)
-                
-                # Check for System/Rate Limit Error (returned by auditor.py on exception)
-                if audit_result.detected_traps and audit_result.detected_traps[0].category == "System":
-                    print(f"\n⚠️ RATE LIMIT HIT: {audit_result.detected_traps[0].plain_english_explanation}")
-                    print("⏳ Cooling off for 60 seconds before retrying... (Press Ctrl+C to abort)")
-                    await asyncio.sleep(60)
-                    continue # Retry the same input
-                
-                break # Success, proceed
-            
-            # --- RIGOROUS EVALUATION ---
-            match_found = False
-            actual_risk = "NONE"
-            actual_cat = "NONE"
-            reason = "Partial Match"
-
-            if audit_result.detected_traps:
-                sorted_traps = sorted(audit_result.detected_traps, key=lambda t: 0 if "CRITICAL" in t.risk_level else 1)
-                best_trap = sorted_traps[0]
-                
-                actual_risk = best_trap.risk_level.upper()
-                actual_cat = best_trap.category
-                
-                cat_match = expected_category.lower() in actual_cat.lower() or actual_cat.lower() in expected_category.lower()
-                
-                if actual_risk == expected_risk and cat_match:
-                    match_found = True
-                    reason = "Perfect"
-                elif actual_risk == expected_risk: 
-                     match_found = True 
-                     reason = "Risk Match"
-                else:
-                    reason = f"Risk Mismatch ({actual_risk})"
-            else:
-                reason = "No Traps Found"
 
+    rows = load_goldens()
+    total_count = len(rows)
 
-            if match_found:
-                correct_count += 1
-                print(f"{input_text[:40]:<40}... | {expected_risk:<10} | {actual_risk:<10} | ✅ PASS")
-            else:
-                print(f"{input_text[:40]:<40}... | {expected_risk:<10} | {actual_risk:<10} | ❌ FAIL ({reason})")
-            
-            results.append({
-                "input": input_text,
-                "expected_risk": expected_risk,
-                "actual_risk": actual_risk,
-                "pass": match_found,
-                "reason": reason
-            })
-            
-            # Rate limiting to prevent 429s (requested by user)
-            print("   ...cooling down (2s)...")
-            await asyncio.sleep(2.0)
+    print(f"{'INPUT':<50} | {'EXPECTED':<15} | {'ACTUAL':<15} | {'RESULT'}")
+    print("-" * 100)
+
+    for row in rows:
+        input_text = row["input"]
+        expected_risk = row["risk_level"].upper()
+
+        # Pacing and 429 handling live in the shared rate limiter (rate_limiter.py)
+        audit_result = analyze_contract_text(input_text)
+        if audit_result.detected_traps and audit_result.detected_traps[0].category == "System":
+            print(f"\n⚠️ AUDIT FAILED: {audit_result.detected_traps[0].plain_english_explanation}")
+
+        match_found, actual_risk, reason = grade(row, audit_result)
+
+        if match_found:
+            correct_count += 1
+            print(f"{input_text[:40]:<40}... | {expected_risk:<10} | {actual_risk:<10} | ✅ PASS")
+        else:
+            print(f"{input_text[:40]:<40}... | {expected_risk:<10} | {actual_risk:<10} | ❌ FAIL ({reason})")
+        
+        results.append({
+            "input": input_text,
+            "expected_risk": expected_risk,
+            "actual_risk": actual_risk,
+            "pass": match_found,
+            "reason": reason
+        })
 
     accuracy = (correct_count / total_count) * 100 if total_count > 0 else 0
     print("-" * 100)
     print(f"\n🏆 Evaluation Complete. Accuracy: {accuracy:.1f}%")
 
     # Update Database with Accuracy Score
-    stats = {}
-    if os.path.exists(STATS_FILE):
-        try:
-            with open(STATS_FILE, "r") as f:
-                stats = json.load(f)
-        except:
-            pass
-    
-    stats["accuracy_score"] = round(accuracy, 1)
-    
-    with open(STATS_FILE, "w") as f:
-        json.dump(stats, f)
+    store = get_stats_store()
+    store.set_accuracy(accuracy)
     
-    print(f"💾 Score saved to {STATS_FILE}")
+    print(f"💾 Score saved to {store.path}")
 
     # --- GENERATE PDF REPORT ---
     try:
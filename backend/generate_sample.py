@@ -1,5 +1,11 @@
 from fpdf import FPDF
+import io
 import os
+import random
+
+# Sample contracts.
+#   python generate_sample.py        -> the demo lease at frontend/public/sample_contract.pdf
+# synthetic_contract() / photographed_pages() build load-test inputs of any length and trap density.
 
 class PDF(FPDF):
     def header(self):
@@ -17,37 +23,103 @@ class PDF(FPDF):
         self.multi_cell(0, 10, body)
         self.ln()
 
-pdf = PDF()
-pdf.add_page()
+SAMPLE_SECTIONS = [
+    # Standard looking top part
+    ('Parties', 'This Lease Agreement ("Lease") is made by and between LANDLORD ("Landlord") and TENANT ("Tenant").'),
+    ('Term', 'The term of this Lease shall begin on [START DATE] and end on [END DATE].'),
+    # TRAP 1: Unilateral Change (Predatory)
+    ('Rent and Adjustments', 'Tenant agrees to pay rent in the amount of $2,000 per month. Landlord reserves the right to increase the Rent at any time during the Term with 24 hours notice to Tenant, based on market conditions or Landlord\'s discretion.'),
+    # TRAP 2: Hidden Fees (Predatory)
+    ('Maintenance and Fees', 'Tenant shall be responsible for all maintenance of the property. In addition, an administrative convenience fee of $150 shall be added to each monthly payment for processing. A "Move-Out Assessment Fee" of $500 is mandatory upon termination.'),
+    # TRAP 3: Liability Shift (Critical)
+    ('Indemnification', 'Tenant agrees to indemnify and hold Landlord harmless from any claims, damages, or injuries occurring on the property, including those caused by Landlord\'s own negligence or failure to maintain the premises.'),
+    # TRAP 4: Jury Waiver (Critical)
+    ('Dispute Resolution', 'TENANT WAIVES KEY RIGHTS TO TRIAL BY JURY and agrees that any disputes shall be resolved by binding arbitration selected solely by the Landlord. Tenant waives any right to join a class action lawsuit.'),
+    # Standard looking bottom part
+    ('Governing Law', 'This Lease shall be governed by the laws of the State.'),
+]
+
+# Fillers for synthetic contracts
+BENIGN_SECTIONS = [
+    ('Use of Premises', 'Tenant shall use the premises solely as a private residence and shall comply with all applicable laws and building rules.'),
+    ('Utilities', 'Tenant shall arrange and pay for electricity, gas, internet and telephone services used at the premises.'),
+    ('Notices', 'All notices under this Lease shall be in writing and delivered to the addresses stated above.'),
+    ('Entire Agreement', 'This Lease constitutes the entire agreement between the parties and supersedes all prior understandings.'),
+    ('Severability', 'If any provision of this Lease is held invalid, the remaining provisions shall continue in full force and effect.'),
+    ('Keys', 'Landlord shall provide Tenant with two sets of keys on the commencement date. Tenant shall return all keys at the end of the Term.'),
+    ('Pets', 'No pets shall be kept on the premises without the prior written consent of Landlord, which shall not be unreasonably withheld.'),
+    ('Parking', 'Tenant is assigned one parking space in the building garage for the duration of the Term.'),
+    ('Insurance', 'Tenant is encouraged to obtain renter\'s insurance covering personal property kept at the premises.'),
+    ('Headings', 'Section headings are for convenience only and do not affect the interpretation of this Lease.'),
+]
+TRAP_SECTIONS = SAMPLE_SECTIONS[2:6] + [
+    ('Automatic Renewal', 'This Lease renews automatically for successive twelve month terms unless Tenant cancels by notarized letter sent at least 90 days before the end of the Term.'),
+    ('Late Payment', 'A late fee of $95 per day shall apply to any payment received after the first day of the month, with no cap.'),
+    ('Data Sharing', 'Landlord may share Tenant\'s personal information with third parties, including marketing partners and data brokers, without further notice.'),
+    ('Entry', 'Landlord may enter the premises at any time without notice for any reason Landlord deems appropriate.'),
+]
+
+def render_contract(sections, output_path=None) -> bytes:
+    """
+    Lays the (title, body) sections out as a numbered lease. Returns the PDF bytes (and writes them if a path is given).
+    """
+    pdf = PDF()
+    pdf.add_page()
+    for num, (label, body) in enumerate(sections, start=1):
+        pdf.chapter_title(num, label)
+        pdf.chapter_body(body)
+    data = bytes(pdf.output())
+    if output_path:
+        with open(output_path, 'wb') as f:
+            f.write(data)
+    return data
 
-# Standard looking top part
-pdf.chapter_title(1, 'Parties')
-pdf.chapter_body('This Lease Agreement ("Lease") is made by and between LANDLORD ("Landlord") and TENANT ("Tenant").')
+def synthetic_sections(pages: int = 3, trap_density: float = 0.2, seed: int = 0):
+    """
+    Benign boilerplate with traps mixed in at `trap_density` (fraction of sections), about `pages` pages long.
+    """
+    rng = random.Random(seed)
+    # About six short sections fill a page of this layout
+    count = max(1, pages * 6)
+    return [rng.choice(TRAP_SECTIONS) if rng.random() < trap_density else rng.choice(BENIGN_SECTIONS)
+            for _ in range(count)]
 
-pdf.chapter_title(2, 'Term')
-pdf.chapter_body('The term of this Lease shall begin on [START DATE] and end on [END DATE].')
+def synthetic_contract(pages: int = 3, trap_density: float = 0.2, seed: int = 0) -> bytes:
+    return render_contract(synthetic_sections(pages, trap_density, seed))
 
-# TRAP 1: Unilateral Change (Predatory)
-pdf.chapter_title(3, 'Rent and Adjustments')
-pdf.chapter_body('Tenant agrees to pay rent in the amount of $2,000 per month. Landlord reserves the right to increase the Rent at any time during the Term with 24 hours notice to Tenant, based on market conditions or Landlord\'s discretion.')
+def photographed_pages(pdf_bytes: bytes, dpi: int = 150, seed: int = 0):
+    """
+    Renders each page as a phone snapshot for the OCR path: slight tilt, uneven lighting, sensor noise, JPEG.
+    """
+    import fitz
+    from PIL import Image, ImageDraw, ImageFilter
 
-# TRAP 2: Hidden Fees (Predatory)
-pdf.chapter_title(4, 'Maintenance and Fees')
-pdf.chapter_body('Tenant shall be responsible for all maintenance of the property. In addition, an administrative convenience fee of $150 shall be added to each monthly payment for processing. A "Move-Out Assessment Fee" of $500 is mandatory upon termination.')
+    rng = random.Random(seed)
+    snapshots = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi)
+            image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
 
-# TRAP 3: Liability Shift (Critical)
-pdf.chapter_title(5, 'Indemnification')
-pdf.chapter_body('Tenant agrees to indemnify and hold Landlord harmless from any claims, damages, or injuries occurring on the property, including those caused by Landlord\'s own negligence or failure to maintain the premises.')
+            # Paper isn't white under room light: a gradient shadow from one side
+            shade = Image.new("L", image.size, 0)
+            draw = ImageDraw.Draw(shade)
+            for x in range(0, image.width, 8):
+                draw.rectangle([x, 0, x + 8, image.height], fill=int(60 * x / image.width))
+            image = Image.composite(Image.new("RGB", image.size, (90, 80, 70)), image, shade)
 
-# TRAP 4: Jury Waiver (Critical)
-pdf.chapter_title(6, 'Dispute Resolution')
-pdf.chapter_body('TENANT WAIVES KEY RIGHTS TO TRIAL BY JURY and agrees that any disputes shall be resolved by binding arbitration selected solely by the Landlord. Tenant waives any right to join a class action lawsuit.')
+            image = image.rotate(rng.uniform(-3, 3), resample=Image.BICUBIC, expand=True, fillcolor=(40, 40, 40))
+            image = image.filter(ImageFilter.GaussianBlur(0.6))
+            noise = Image.effect_noise(image.size, 12).convert("RGB")
+            image = Image.blend(image, noise, 0.08)
 
-# Standard looking bottom part
-pdf.chapter_title(7, 'Governing Law')
-pdf.chapter_body('This Lease shall be governed by the laws of the State.')
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=85)
+            snapshots.append(buffer.getvalue())
+    return snapshots
 
-output_path = "../frontend/public/sample_contract.pdf"
-os.makedirs(os.path.dirname(output_path), exist_ok=True)
-pdf.output(output_path, 'F')
-print(f"Generated sample contract at {output_path}")
+if __name__ == "__main__":
+    output_path = "../frontend/public/sample_contract.pdf"
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    render_contract(SAMPLE_SECTIONS, output_path)
+    print(f"Generated sample contract at {output_path}")
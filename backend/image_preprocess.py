@@ -0,0 +1,130 @@
+import os
+from typing import Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+
+# --- Image Preprocessing (ahead of Tesseract) ---
+# Phone snaps arrive as 12+ MP colour JPEGs: sideways (EXIF), tilted, with the table around the paper in frame.
+# Tesseract binarizes and deskews poorly on its own and spends its time on pixels that carry no text, so each page is:
+#   1. turned upright from its EXIF orientation and decoded straight to grayscale (JPEG luma only)
+#   2. cropped to the sheet of paper
+#   3. scaled down to OCR_TARGET_DPI (assuming the sheet is a letter/A4 page)
+#   4. deskewed (projection profile of the ink over candidate angles)
+#   5. binarized against the local mean (uneven lighting, shadows), for Tesseract's eyes only: the searchable PDF
+#      keeps the deskewed grayscale page as its image, so what the reader sees is not thresholded away
+# All of it is whole-array NumPy / Pillow C code. benchmark_ocr.py measures the time and accuracy effect.
+
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "1") != "0"
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+
+PAGE_LONG_INCHES = 11.7  # A4; letter is 11
+MAX_SKEW_DEGREES = 5.0
+SKEW_STEP_DEGREES = 0.25
+MIN_SKEW_DEGREES = 0.2  # below this, rotating costs more sharpness than it gains
+DESKEW_SAMPLE_WIDTH = 1000  # px, the skew is estimated on a copy this wide
+BINARIZE_K = 0.15  # a pixel is ink if it is this much darker than its neighbourhood
+MIN_PAPER_AREA = 0.5  # a crop that keeps less than this share of the frame is not trusted
+
+
+def crop_to_paper(gray: Image.Image) -> Image.Image:
+    """
+    Crops away the darker surroundings of the sheet (table, background). Rows and columns that are
+    mostly paper-bright are kept; the decision is made on a 1/4 scale copy.
+    """
+    scale = 4
+    small = np.asarray(gray.reduce(scale))
+    low, high = np.percentile(small, (5, 95))
+    if high - low < 60:
+        # No dark border to speak of
+        return gray
+    paper = small > (low + high) / 2
+    rows = np.flatnonzero(paper.mean(axis=1) > 0.5)
+    cols = np.flatnonzero(paper.mean(axis=0) > 0.5)
+    if rows.size == 0 or cols.size == 0:
+        return gray
+    top, bottom = rows[0] * scale, (rows[-1] + 1) * scale
+    left, right = cols[0] * scale, (cols[-1] + 1) * scale
+    if (bottom - top) * (right - left) < MIN_PAPER_AREA * gray.width * gray.height:
+        return gray
+    return gray.crop((left, top, min(right, gray.width), min(bottom, gray.height)))
+
+def scale_to_dpi(gray: Image.Image, dpi: int = OCR_TARGET_DPI) -> Tuple[Image.Image, int]:
+    """
+    Shrinks the page to `dpi` if it is finer than that. Returns (image, its dpi).
+    """
+    current = max(gray.size) / PAGE_LONG_INCHES
+    if current <= dpi:
+        return gray, int(round(current))
+    factor = dpi / current
+    size = (max(1, int(gray.width * factor)), max(1, int(gray.height * factor)))
+    return gray.resize(size, Image.LANCZOS, reducing_gap=2.0), dpi
+
+def binarize(gray: Image.Image, k: float = BINARIZE_K) -> np.ndarray:
+    """
+    Local-mean (Bradley) thresholding: True for paper, False for ink. The neighbourhood is a box
+    about 1/40 of the page wide, so shadows and lighting gradients don't turn into ink.
+    """
+    radius = max(8, gray.width // 80)
+    local_mean = np.asarray(gray.filter(ImageFilter.BoxBlur(radius)), dtype=np.float32)
+    return np.asarray(gray, dtype=np.float32) >= local_mean * (1 - k)
+
+def skew_angle(gray: Image.Image) -> float:
+    """
+    Degrees to rotate the page by (counter-clockwise) to level its text lines: the angle at which
+    the row projection of the ink is sharpest (text lines and gaps line up).
+    """
+    sample = gray
+    if gray.width > DESKEW_SAMPLE_WIDTH:
+        sample = gray.resize((DESKEW_SAMPLE_WIDTH, max(1, gray.height * DESKEW_SAMPLE_WIDTH // gray.width)), Image.BILINEAR)
+    ys, xs = np.nonzero(~binarize(sample))
+    if ys.size < 100:
+        return 0.0
+    if ys.size > 200_000:
+        step = ys.size // 200_000 + 1
+        ys, xs = ys[::step], xs[::step]
+
+    angles = np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + SKEW_STEP_DEGREES / 2, SKEW_STEP_DEGREES)
+    ys = ys.astype(np.float64)
+    xs = xs.astype(np.float64)
+    scores = []
+    for angle in angles:
+        # Row of every ink pixel once the page is turned by this angle (small-angle shear); one angle
+        # at a time keeps memory at a few arrays of the sample size
+        rows = np.rint(ys - xs * np.tan(np.radians(angle))).astype(np.int64)
+        rows -= rows.min()
+        scores.append(np.square(np.bincount(rows).astype(np.float64)).sum())
+    return float(angles[int(np.argmax(scores))])
+
+def deskew(gray: Image.Image) -> Image.Image:
+    angle = skew_angle(gray)
+    if abs(angle) < MIN_SKEW_DEGREES:
+        return gray
+    return gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+def preprocess(image: Image.Image, dpi: int = OCR_TARGET_DPI) -> Image.Image:
+    """
+    Steps 1-4 on a freshly opened image. Returns the upright, cropped, deskewed grayscale page with its dpi set,
+    which Tesseract also uses to size the page of the searchable PDF. ocr_input() makes Tesseract's copy.
+    """
+    if image.format == "JPEG":
+        # Decode only the luma channel, at the smallest DCT scale that still holds `dpi` for a full-frame page
+        target = int(dpi * PAGE_LONG_INCHES)
+        long_side = max(image.size)
+        image.draft("L", (image.width * target // long_side, image.height * target // long_side))
+    image = ImageOps.exif_transpose(image)
+    gray = image.convert("L")
+    gray = crop_to_paper(gray)
+    gray, page_dpi = scale_to_dpi(gray, dpi)
+    gray = deskew(gray)
+    gray.info["dpi"] = (page_dpi, page_dpi)
+    return gray
+
+def ocr_input(page: Image.Image) -> Image.Image:
+    """
+    The 1-bit copy of a preprocess()ed page that Tesseract reads: same size and dpi, so its text layer
+    lines up with the grayscale page.
+    """
+    binary = Image.fromarray(binarize(page))
+    binary.info["dpi"] = page.info["dpi"]
+    return binary
@@ -0,0 +1,352 @@
+import errno
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# --- Audit Job Queue (SQLite, WAL mode) ---
+# POST /jobs stores the upload here and returns 202 straight away; a bounded set of workers
+# (in every uvicorn process) claims jobs and runs the normal audit pipeline on them.
+# No broker: the queue is one SQLite file shared by all workers on the box. The uploads themselves
+# are files in JOB_UPLOAD_DIR (the database only holds their paths), kept until the job finishes.
+#
+# - Fairness: the next job goes to the client with the fewest jobs running, oldest job first.
+# - Backpressure: submits past the global or per-client queue depth are refused (HTTP 429).
+# - Crash safety: a claimed job holds a lease the worker keeps renewing. If the process dies,
+#   the lease runs out and the job goes back to the queue (up to JOB_MAX_ATTEMPTS times).
+#   Each claim gets its own lease id, so a worker that lost its lease can't renew the next holder's.
+
+BASE_DIR = Path(__file__).parent
+JOB_DB = os.getenv("JOB_DB", str(BASE_DIR / "jobs.db"))
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", str(BASE_DIR / "job_uploads"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_QUEUE_DEPTH = int(os.getenv("JOB_MAX_QUEUE_DEPTH", "100"))
+JOB_MAX_PER_CLIENT = int(os.getenv("JOB_MAX_PER_CLIENT", "10"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_HOURS", "24")) * 3600
+
+# Drop finished jobs past their TTL every N submits
+SWEEP_EVERY = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    client TEXT NOT NULL,
+    status TEXT NOT NULL,
+    is_pdf_mode INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    include_pdf INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error_status INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq);
+CREATE INDEX IF NOT EXISTS jobs_client ON jobs (client, status);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(Exception):
+    """
+    Raised by submit() when admitting the job would exceed a queue-depth limit.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    def __init__(self, path: str = JOB_DB, max_depth: int = JOB_MAX_QUEUE_DEPTH,
+                 max_per_client: int = JOB_MAX_PER_CLIENT, lease_seconds: int = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, ttl_seconds: int = JOB_TTL_SECONDS,
+                 upload_dir: str = JOB_UPLOAD_DIR):
+        self.path = path
+        self.upload_dir = upload_dir
+        self.max_depth = max_depth
+        self.max_per_client = max_per_client
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._submits = 0
+        self._lock = threading.Lock()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        if "worker" not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+            # Queues created before leases carried an owner
+            conn.execute("ALTER TABLE jobs ADD COLUMN worker TEXT")
+        os.makedirs(upload_dir, exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads: one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _take_upload(self, job_id: str, position: int, source: str) -> str:
+        # Moved, not copied: the spool file is already on disk. Another filesystem falls back to a copy.
+        path = os.path.join(self.upload_dir, f"{job_id}-{position}{os.path.splitext(source)[1][:10]}")
+        try:
+            os.replace(source, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.move(source, path)
+        return path
+
+    def submit(self, client: str, is_pdf_mode: bool, filename: str, uploads: List[Tuple[str, int, bytes]],
+               include_pdf: bool = False) -> str:
+        """
+        Queues a job. `uploads` are spooled files as (path, size, sha256); once the job is admitted they are
+        moved into JOB_UPLOAD_DIR, so the caller's paths are gone afterwards.
+        """
+        conn = self._connect()
+        job_id = uuid.uuid4().hex
+        stored: List[str] = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            depth, = conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchone()
+            if depth >= self.max_depth:
+                raise QueueFull("Audit queue is full. Try again shortly.", self._retry_after(conn, depth))
+            mine, = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE client = ? AND status IN (?, ?)", (client, QUEUED, RUNNING)
+            ).fetchone()
+            if mine >= self.max_per_client:
+                raise QueueFull(f"Too many audits in flight for this client (max {self.max_per_client}).",
+                                self._retry_after(conn, mine))
+
+            conn.execute(
+                "INSERT INTO jobs (id, client, status, is_pdf_mode, filename, include_pdf, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, client, QUEUED, int(is_pdf_mode), filename, int(include_pdf), time.time())
+            )
+            for i, (source, size, digest) in enumerate(uploads):
+                path = self._take_upload(job_id, i, source)
+                stored.append(path)
+                conn.execute("INSERT INTO job_files (job_id, position, path, size, digest) VALUES (?, ?, ?, ?, ?)",
+                             (job_id, i, path, size, digest))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            _unlink(stored)
+            raise
+
+        with self._lock:
+            self._submits += 1
+            should_sweep = self._submits % SWEEP_EVERY == 0
+        if should_sweep:
+            self.sweep()
+        return job_id
+
+    def _retry_after(self, conn: sqlite3.Connection, jobs_ahead: int) -> int:
+        # Rough ETA: average run time of recent jobs, spread over the workers
+        avg, = conn.execute(
+            "SELECT AVG(finished_at - started_at) FROM (SELECT finished_at, started_at FROM jobs "
+            "WHERE status = ? ORDER BY seq DESC LIMIT 50)", (DONE,)
+        ).fetchone()
+        return max(1, int((avg or 15) * jobs_ahead / max(1, JOB_WORKERS)))
+
+    def claim(self) -> Optional[Dict]:
+        """
+        Takes the next job (fair across clients) and leases it. Returns the job or None; read its files with
+        uploads(), and renew() with its "lease" id.
+        """
+        conn = self._connect()
+        now = time.time()
+        lease = uuid.uuid4().hex
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            given_up = self._requeue_expired(conn, now)
+            row = conn.execute(
+                "SELECT j.id FROM jobs j WHERE j.status = ? ORDER BY "
+                "(SELECT COUNT(*) FROM jobs r WHERE r.client = j.client AND r.status = ?), j.seq LIMIT 1",
+                (QUEUED, RUNNING)
+            ).fetchone()
+            job_id = None
+            if row is not None:
+                job_id = row[0]
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, worker = ?, started_at = ? "
+                    "WHERE id = ?",
+                    (RUNNING, now + self.lease_seconds, lease, now, job_id)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _unlink(given_up)
+        if job_id is None:
+            return None
+        job = self.get(job_id)
+        job["lease"] = lease
+        return job
+
+    def uploads(self, job_id: str) -> List[Tuple[str, int, bytes]]:
+        """
+        A job's files in upload order, as (path, size, sha256). They belong to the queue: don't delete them.
+        """
+        return self._connect().execute(
+            "SELECT path, size, digest FROM job_files WHERE job_id = ? ORDER BY position", (job_id,)
+        ).fetchall()
+
+    def _forget_files(self, conn: sqlite3.Connection, job_ids: List[str]) -> List[str]:
+        # Drops the rows of finished jobs' files; the caller unlinks the returned paths once committed
+        paths = []
+        for job_id in job_ids:
+            paths += [row[0] for row in conn.execute("SELECT path FROM job_files WHERE job_id = ?", (job_id,))]
+            conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+        return paths
+
+    def _requeue_expired(self, conn: sqlite3.Connection, now: float) -> List[str]:
+        # Jobs whose worker died mid-audit: retry them, or give up after max_attempts.
+        # Returns the files of the jobs given up on.
+        given_up = [row[0] for row in conn.execute(
+            "SELECT id FROM jobs WHERE status = ? AND lease_until < ? AND attempts >= ?",
+            (RUNNING, now, self.max_attempts)
+        )]
+        conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, lease_until = NULL, worker = NULL, error_status = 500, "
+            "error = 'Worker crashed while running this audit.' "
+            "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+            (FAILED, now, RUNNING, now, self.max_attempts)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ?, lease_until = NULL, worker = NULL WHERE status = ? AND lease_until < ?",
+            (QUEUED, RUNNING, now)
+        )
+        return self._forget_files(conn, given_up)
+
+    def renew(self, job_id: str, lease: str) -> bool:
+        """
+        Extends the lease taken by claim(). False if it has been lost (expired and requeued, or finished).
+        """
+        cursor = self._connect().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND worker = ?",
+            (time.time() + self.lease_seconds, job_id, RUNNING, lease)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, lease: str, result: Dict) -> bool:
+        return self._finish(job_id, lease, DONE, result=json.dumps(result))
+
+    def fail(self, job_id: str, lease: str, status_code: int, detail: str) -> bool:
+        return self._finish(job_id, lease, FAILED, error_status=status_code, error=detail)
+
+    def _finish(self, job_id: str, lease: str, status: str, result: Optional[str] = None,
+                error_status: Optional[int] = None, error: Optional[str] = None) -> bool:
+        """
+        Records the outcome if `lease` still holds the job. False (and nothing written) for a worker
+        whose lease ran out: the job is someone else's now, files included.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, lease_until = NULL, worker = NULL, result = ?, "
+                "error_status = ?, error = ? WHERE id = ? AND status = ? AND worker = ?",
+                (status, time.time(), result, error_status, error, job_id, RUNNING, lease)
+            )
+            finished = cursor.rowcount == 1
+            paths = self._forget_files(conn, [job_id]) if finished else []
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _unlink(paths)
+        return finished
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT seq, id, client, status, is_pdf_mode, filename, include_pdf, attempts, "
+            "created_at, started_at, finished_at, result, error_status, error FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        (seq, job_id, client, status, is_pdf_mode, filename, include_pdf, attempts,
+         created_at, started_at, finished_at, result, error_status, error) = row
+
+        job = {
+            "job_id": job_id,
+            "client": client,
+            "status": status,
+            "is_pdf_mode": bool(is_pdf_mode),
+            "filename": filename,
+            "include_pdf": bool(include_pdf),
+            "attempts": attempts,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+        }
+        if status == QUEUED:
+            job["position"], = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND seq < ?", (QUEUED, seq)
+            ).fetchone()
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = {"status": error_status, "detail": error}
+        return job
+
+    def depth(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+        ).fetchone()[0]
+
+    def sweep(self):
+        """
+        Forgets finished jobs older than the TTL.
+        """
+        self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - self.ttl_seconds)
+        )
+
+
+def _unlink(paths: List[str]):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+# --- LLM Record / Replay ---
+# A cassette is a JSON file of model responses keyed by (model, rendered prompt).
+# "record" calls the real model and stores each answer; "replay" answers from the file and never
+# touches the network, so evaluations are deterministic and run in seconds.
+# Anything that changes the prompt (system prompt, format instructions, model) misses the cassette:
+# re-record after prompt changes, replay for everything downstream of the model (parsing, scoring, grading).
+#
+#   set_llm_wrapper(Cassette("eval_cassette.json", "replay").wrap)
+
+BASE_DIR = Path(__file__).parent
+EVAL_CASSETTE = os.getenv("EVAL_CASSETTE", str(BASE_DIR / "eval_cassette.json"))
+
+CASSETTE_VERSION = 1
+RECORD, REPLAY = "record", "replay"
+
+
+class CassetteMiss(Exception):
+    """
+    Raised in replay mode for a prompt the cassette has no answer for.
+    """
+
+
+def prompt_key(model: str, prompt) -> str:
+    text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path: str = EVAL_CASSETTE, mode: str = REPLAY):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Cassette mode must be '{RECORD}' or '{REPLAY}', got '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.entries = data.get("entries", {})
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self.entries.get(key)
+
+    def _replay(self, key: str) -> AIMessage:
+        entry = self.entries.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            raise CassetteMiss(f"No recorded response for prompt {key[:12]} in {self.path}")
+        return AIMessage(content=entry["content"], usage_metadata=entry.get("usage") or None)
+
+    def _store(self, key: str, model: str, message, latency: float):
+        with self._lock:
+            self.entries[key] = {
+                "model": model,
+                "content": message.content,
+                "usage": dict(message.usage_metadata) if getattr(message, "usage_metadata", None) else None,
+                "latency_ms": round(latency * 1000, 1),
+            }
+            self.recorded += 1
+
+    def wrap(self, build, model: str):
+        """
+        llm_clients.set_llm_wrapper() hook: a runnable standing in for the chat model.
+        """
+        llm = build() if self.mode == RECORD else None
+
+        def invoke(prompt):
+            key = prompt_key(model, prompt)
+            if llm is None:
+                return self._replay(key)
+            started = time.perf_counter()
+            message = llm.invoke(prompt)
+            self._store(key, model, message, time.perf_counter() - started)
+            return message
+
+        async def ainvoke(prompt):
+            key = prompt_key(model, prompt)
+            if llm is None:
+                return self._replay(key)
+            started = time.perf_counter()
+            message = await llm.ainvoke(prompt)
+            self._store(key, model, message, time.perf_counter() - started)
+            return message
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"cassette:{model}")
+
+    def save(self):
+        if self.mode != RECORD:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            data = {"version": CASSETTE_VERSION, "entries": self.entries}
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+import httpx
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+# --- LLM Client Registry ---
+# One keep-alive connection pool per process instead of a new ChatOpenAI (and TLS handshake) per call.
+# Chains are built once by name and reused; they hold no per-request state, so concurrent threads
+# and async tasks can share them.
+# httpx.AsyncClient connections belong to the event loop that opened them, so async clients (and the
+# chains built on them) are kept per loop. The server runs a single loop; scripts that call
+# asyncio.run() repeatedly get a fresh set per run.
+# LangChain itself (~2s to import) is only loaded when the first model is built: warm_up() at startup,
+# or the first audit.
+
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.x.ai/v1")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "16"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+
+_lock = threading.Lock()
+_sync_client: Optional[httpx.Client] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_factories: Dict[str, Callable[[Callable[..., "ChatOpenAI"]], object]] = {}
+_sync_chains: Dict[str, object] = {}  # Built outside any event loop (scripts, worker threads)
+_loop_chains: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, object]]" = weakref.WeakKeyDictionary()
+_llm_wrapper: Optional[Callable[[Callable[[], "ChatOpenAI"], str], object]] = None
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                        keepalive_expiry=LLM_KEEPALIVE_SECONDS)
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def get_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(limits=_limits(), timeout=_timeout())
+    return _sync_client
+
+def get_async_client() -> Optional[httpx.AsyncClient]:
+    loop = _running_loop()
+    if loop is None:
+        return None
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+    return client
+
+def make_llm(model: str, temperature: float = 0, **kwargs) -> "ChatOpenAI":
+    """
+    ChatOpenAI wired to the shared connection pools (or whatever set_llm_wrapper() puts in front of it).
+    """
+    def build() -> "ChatOpenAI":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            model=model,
+            openai_api_key=os.getenv("XAI_API_KEY"),
+            openai_api_base=LLM_BASE_URL,
+            temperature=temperature,
+            http_client=get_sync_client(),
+            http_async_client=get_async_client(),
+            **kwargs
+        )
+    if _llm_wrapper is not None:
+        return _llm_wrapper(build, model)
+    return build()
+
+def set_llm_wrapper(wrapper: Optional[Callable[[Callable[[], "ChatOpenAI"], str], object]]):
+    """
+    Routes every model built by make_llm through wrapper(build, model_name), e.g. a record/replay cassette.
+    `build` makes the real ChatOpenAI, so a wrapper that never calls it needs no API key. Drops cached chains.
+    """
+    global _llm_wrapper
+    with _lock:
+        _llm_wrapper = wrapper
+        _sync_chains.clear()
+        _loop_chains.clear()
+
+def register_chain(name: str, factory: Callable[[Callable[..., "ChatOpenAI"]], object]):
+    """
+    Registers how to build a chain. The factory receives make_llm and returns the runnable.
+    """
+    _factories[name] = factory
+
+def _chains_for(loop: Optional[asyncio.AbstractEventLoop]) -> Dict[str, object]:
+    if loop is None:
+        return _sync_chains
+    with _lock:
+        chains = _loop_chains.get(loop)
+        if chains is None:
+            chains = _loop_chains[loop] = {}
+    return chains
+
+def get_chain(name: str):
+    chains = _chains_for(_running_loop())
+    chain = chains.get(name)
+    if chain is None:
+        # Built outside the lock (make_llm takes it to hand out clients); a racing duplicate is discarded
+        chain = _factories[name](make_llm)
+        with _lock:
+            chain = chains.setdefault(name, chain)
+    return chain
+
+def warm_up():
+    """
+    Builds the clients and every registered chain for the current loop (call from startup).
+    """
+    for name in list(_factories):
+        get_chain(name)
+
+async def close_clients():
+    global _sync_client
+    loop = _running_loop()
+    with _lock:
+        client = _async_clients.pop(loop, None) if loop else None
+        if loop:
+            _loop_chains.pop(loop, None)
+        sync_client, _sync_client = _sync_client, None
+        _sync_chains.clear()
+    if client is not None:
+        await client.aclose()
+    if sync_client is not None:
+        sync_client.close()
@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from generate_sample import photographed_pages, synthetic_contract, synthetic_sections
+from stub_llm import serve
+
+# End-to-end load test: boots the API (uvicorn, one process) against the stub LLM and fires synthetic
+# contracts at it. Reports requests/sec, latency percentiles, the per-stage breakdown from /metrics and
+# the server's peak RSS. Every run is appended to LOADTEST_RESULTS with the commit it ran on.
+#
+#   python loadtest.py --scenario pdf --requests 100 --concurrency 16 --pages 10
+#   python loadtest.py --scenario ocr --pages 2 --latency-ms 1500 --error-rate 0.05
+#   python loadtest.py --compare 10          # earlier runs, side by side
+
+BASE_DIR = Path(__file__).parent
+LOADTEST_RESULTS = os.getenv("LOADTEST_RESULTS", str(BASE_DIR / ".cache" / "loadtest_results.jsonl"))
+SCENARIOS = ("pdf", "ocr", "negotiate", "mixed")
+STAGE_LINE = re.compile(r'^gotchai_stage_seconds_(sum|count)\{stage="([^"]+)"\} ([0-9.e+-]+)$')
+SERVER_START_TIMEOUT = 60
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test the audit API against a stub LLM.")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="pdf")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=3, help="pages per synthetic contract")
+    parser.add_argument("--trap-density", type=float, default=0.2, help="share of sections that are traps")
+    parser.add_argument("--documents", type=int, default=0, help="distinct contracts to cycle through (default: one per request)")
+    parser.add_argument("--latency-ms", type=float, default=800, help="stub LLM latency")
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM calls failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of LLM calls answered with 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of audit answers that need a repair")
+    parser.add_argument("--url", default=None, help="test an already running server instead (no RSS, stub not wired)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--label", default="", help="free-form note stored with the run")
+    parser.add_argument("--compare", type=int, default=0, help="print the last N stored runs and exit")
+    return parser.parse_args()
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BASE_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def peak_rss_mb(pid: int):
+    # VmHWM is the process's high-water resident set (Linux)
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def build_inputs(args):
+    """
+    Request bodies, generated up front so the timed run measures the server only.
+    """
+    count = args.documents or args.requests
+    print(f"🧾 Generating {count} synthetic contract(s), {args.pages} page(s) each...")
+    inputs = []
+    for seed in range(count):
+        kind = args.scenario if args.scenario != "mixed" else ("pdf", "pdf", "ocr", "negotiate")[seed % 4]
+        if kind == "negotiate":
+            label, body = synthetic_sections(1, 1.0, seed)[0]
+            inputs.append(("negotiate", {"trap_text": body, "category": label, "explanation": "One-sided clause."}))
+            continue
+        pdf_bytes = synthetic_contract(args.pages, args.trap_density, seed)
+        if kind == "pdf":
+            inputs.append(("pdf", [("file", (f"contract-{seed}.pdf", pdf_bytes, "application/pdf"))]))
+        else:
+            inputs.append(("ocr", [("file", (f"page-{seed}-{i}.jpg", image, "image/jpeg"))
+                                   for i, image in enumerate(photographed_pages(pdf_bytes, seed=seed))]))
+    return inputs
+
+def start_server(args, stub_url: str, workdir: str):
+    env = dict(os.environ,
+               LLM_BASE_URL=stub_url,
+               XAI_API_KEY="stub",
+               AUDIT_CACHE_ENABLED="0",          # every request does the full pipeline
+               CLAUSE_INDEX_ENABLED="0",
+               RATE_LIMIT_DB=os.path.join(workdir, "ratelimit.db"),
+               LLM_RPM=os.getenv("LLM_RPM", "100000"),
+               LLM_TPM=os.getenv("LLM_TPM", "100000000"),
+               JOB_DB=os.path.join(workdir, "jobs.db"),
+               STATS_DB=os.path.join(workdir, "stats.db"),
+               DOCUMENT_DIR=os.path.join(workdir, "documents"),
+               OPIK_API_KEY="")
+    log = open(os.path.join(workdir, "server.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup; see {log.name}")
+        try:
+            if httpx.get(url + "/", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("Server did not come up in time")
+
+def stage_totals(metrics_text: str):
+    totals = {}
+    for line in metrics_text.splitlines():
+        match = STAGE_LINE.match(line)
+        if match:
+            kind, name, value = match.groups()
+            totals.setdefault(name, {"sum": 0.0, "count": 0.0})[kind] = float(value)
+    return totals
+
+async def fire(url: str, inputs, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies, statuses = [], {}
+
+    async with httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(600)) as client:
+        async def one(i: int):
+            kind, body = inputs[i % len(inputs)]
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    if kind == "negotiate":
+                        response = await client.post("/negotiate", json=body)
+                    else:
+                        response = await client.post("/analyze", files=body)
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        before = stage_totals((await client.get("/metrics")).text)
+        started = time.perf_counter()
+        await asyncio.gather(*[one(i) for i in range(total)])
+        wall = time.perf_counter() - started
+        after = stage_totals((await client.get("/metrics")).text)
+
+    stages = {}
+    for name, values in after.items():
+        count = values["count"] - before.get(name, {}).get("count", 0)
+        seconds = values["sum"] - before.get(name, {}).get("sum", 0)
+        if count > 0:
+            stages[name] = {"count": int(count), "total_s": round(seconds, 3), "mean_ms": round(1000 * seconds / count, 1)}
+    return latencies, statuses, wall, stages
+
+def report(run):
+    summary = run["summary"]
+    print(f"\n📈 {run['config']['scenario']} @ {run['commit']}: {summary['requests']} requests, "
+          f"concurrency {run['config']['concurrency']}, {run['config']['pages']} page(s)")
+    print(f"   throughput  {summary['rps']:.2f} req/s (wall {summary['wall_s']:.1f}s)")
+    print(f"   latency     p50 {summary['p50_ms']:.0f} ms | p90 {summary['p90_ms']:.0f} ms | "
+          f"p99 {summary['p99_ms']:.0f} ms | max {summary['max_ms']:.0f} ms")
+    print(f"   statuses    {summary['statuses']}")
+    if summary["peak_rss_mb"] is not None:
+        print(f"   peak RSS    {summary['peak_rss_mb']} MB")
+    if run["stub"]:
+        print(f"   stub LLM    {run['stub']}")
+    print(f"\n   {'STAGE':<22} {'COUNT':>7} {'MEAN':>10} {'TOTAL':>10}")
+    for name, values in sorted(run["stages"].items(), key=lambda item: -item[1]["total_s"]):
+        print(f"   {name:<22} {values['count']:>7} {values['mean_ms']:>8.1f}ms {values['total_s']:>9.2f}s")
+
+def compare(limit: int):
+    if not os.path.exists(LOADTEST_RESULTS):
+        print(f"No stored runs in {LOADTEST_RESULTS}")
+        return
+    with open(LOADTEST_RESULTS) as f:
+        runs = [json.loads(line) for line in f if line.strip()][-limit:]
+    print(f"{'WHEN':<17} {'COMMIT':<14} {'SCENARIO':<10} {'REQ':>5} {'CONC':>5} {'PAGES':>5} "
+          f"{'RPS':>7} {'P50':>8} {'P99':>8} {'RSS MB':>7}  LABEL")
+    for run in runs:
+        config, summary = run["config"], run["summary"]
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["timestamp"]))
+        rss = summary["peak_rss_mb"] if summary["peak_rss_mb"] is not None else "-"
+        print(f"{when:<17} {run['commit']:<14} {config['scenario']:<10} {summary['requests']:>5} {config['concurrency']:>5} "
+              f"{config['pages']:>5} {summary['rps']:>7.2f} {summary['p50_ms']:>6.0f}ms {summary['p99_ms']:>6.0f}ms "
+              f"{rss:>7}  {config.get('label', '')}")
+
+def main():
+    args = parse_args()
+    if args.compare:
+        compare(args.compare)
+        return
+
+    inputs = build_inputs(args)
+    process = None
+    stub = None
+    with tempfile.TemporaryDirectory(prefix="gotchai-loadtest-") as workdir:
+        try:
+            url = args.url
+            if url is None:
+                stub, stub_stats = serve(0, args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                                         args.malformed_rate)
+                process, url = start_server(args, f"http://127.0.0.1:{stub.server_port}/v1", workdir)
+                print(f"🚀 Server up at {url} (stub LLM on :{stub.server_port})")
+
+            print(f"🔥 {args.requests} requests, {args.concurrency} in flight...")
+            latencies, statuses, wall, stages = asyncio.run(fire(url, inputs, args.requests, args.concurrency))
+            rss = peak_rss_mb(process.pid) if process else None
+        finally:
+            if process:
+                process.terminate()
+                process.wait(timeout=30)
+            if stub:
+                stub.shutdown()
+
+    run = {
+        "timestamp": time.time(),
+        "commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "url", "port")},
+        "summary": {
+            "requests": args.requests,
+            "wall_s": round(wall, 2),
+            "rps": round(args.requests / wall, 3) if wall else 0.0,
+            "p50_ms": round(1000 * percentile(latencies, 0.50), 1),
+            "p90_ms": round(1000 * percentile(latencies, 0.90), 1),
+            "p99_ms": round(1000 * percentile(latencies, 0.99), 1),
+            "max_ms": round(1000 * max(latencies, default=0), 1),
+            "statuses": {str(status): count for status, count in statuses.items()},
+            "peak_rss_mb": rss,
+        },
+        "stages": stages,
+        "stub": ({"calls": stub_stats.calls, "errors": stub_stats.errors, "rate_limited": stub_stats.rate_limited,
+                  "malformed": stub_stats.malformed}
+                 if stub else None),
+    }
+    report(run)
+
+    os.makedirs(os.path.dirname(LOADTEST_RESULTS) or ".", exist_ok=True)
+    with open(LOADTEST_RESULTS, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"\n💾 Run appended to {LOADTEST_RESULTS}")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,42 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
-from typing import List
+from typing import List, Optional
 
 try:
-    from backend.pdf_engine import extract_text_from_pdf, get_coordinates_for_text
-    from backend.auditor import analyze_contract_text, AuditResult, generate_negotiation_email
-    from backend.ocr_engine import convert_images_to_searchable_pdf
+    from backend.pdf_engine import parse_pdf, get_coordinates_for_text, PDFWordIndex
+    from backend.auditor import iter_full_contract_audit, normalize_quote, audit_fingerprint, is_system_error, AuditResult, DetectionObject, merge_audit_results, generate_negotiation_email_async
+    from backend.auditor import RISK_RANK, analyze_contract_batch_async
+    from backend.ocr_engine import convert_images_to_searchable_pdf, shutdown_ocr_pool
+    from backend.audit_cache import AuditCache, CACHE_ENABLED, hash_digests, hash_text
+    from backend.stats_store import get_stats_store
+    from backend.document_store import DocumentStore, document_id_for_file
+    from backend.revisions import REVISIONS_ENABLED, RevisionStore, revision_report
+    from backend.job_queue import JOB_WORKERS, QueueFull, get_job_queue
+    from backend.llm_clients import close_clients
+    from backend.startup import warm_start
+    from backend.metrics import LOG_STAGE_TIMINGS, REQUESTS, current_trace, render_prometheus, record_stage, stage, start_trace
+    from backend.uploads import (MB, UPLOAD_MAX_FILES, UPLOAD_MAX_TOTAL_BYTES, MemoryBudget, SpooledUpload,
+                                 UploadLimitMiddleware, UploadTooLarge, delete_uploads, estimate_memory,
+                                 new_spool_path, spool_upload)
 except ModuleNotFoundError:
-    from pdf_engine import extract_text_from_pdf, get_coordinates_for_text
-    from auditor import analyze_contract_text, AuditResult, generate_negotiation_email
-    from ocr_engine import convert_images_to_searchable_pdf
+    from pdf_engine import parse_pdf, get_coordinates_for_text, PDFWordIndex
+    from auditor import iter_full_contract_audit, normalize_quote, audit_fingerprint, is_system_error, AuditResult, DetectionObject, merge_audit_results, generate_negotiation_email_async
+    from auditor import RISK_RANK, analyze_contract_batch_async
+    from ocr_engine import convert_images_to_searchable_pdf, shutdown_ocr_pool
+    from audit_cache import AuditCache, CACHE_ENABLED, hash_digests, hash_text
+    from stats_store import get_stats_store
+    from document_store import DocumentStore, document_id_for_file
+    from revisions import REVISIONS_ENABLED, RevisionStore, revision_report
+    from job_queue import JOB_WORKERS, QueueFull, get_job_queue
+    from llm_clients import close_clients
+    from startup import warm_start
+    from metrics import LOG_STAGE_TIMINGS, REQUESTS, current_trace, render_prometheus, record_stage, stage, start_trace
+    from uploads import (MB, UPLOAD_MAX_FILES, UPLOAD_MAX_TOTAL_BYTES, MemoryBudget, SpooledUpload,
+                         UploadLimitMiddleware, UploadTooLarge, delete_uploads, estimate_memory,
+                         new_spool_path, spool_upload)
 
 from pydantic import BaseModel
 
@@ -37,59 +62,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Oversized bodies are refused while they stream in, before the multipart form is parsed
+app.add_middleware(UploadLimitMiddleware)
+
 # --- Database / Stats Persistence ---
-import json
+# SQLite (WAL) store shared by all workers; see stats_store.py
 import time
 
-STATS_FILE = "database.json"
-
-def get_stats():
-    if not os.path.exists(STATS_FILE):
-        return {
-            "total_requests": 0,
-            "total_clauses": 0,
-            "total_traps": 0,
-            "total_predatory_score": 0,
-            "avg_latency": 0,
-            "accuracy_score": 0.0
-        }
-    try:
-        with open(STATS_FILE, "r") as f:
-            stats = json.load(f)
-            # Migration for existing files
-            if "total_predatory_score" not in stats:
-                stats["total_predatory_score"] = 0
-            if "accuracy_score" not in stats:
-                stats["accuracy_score"] = 0.0
-            return stats
-    except:
-        return {
-            "total_requests": 0,
-            "total_clauses": 0,
-            "total_traps": 0,
-            "total_predatory_score": 0,
-            "avg_latency": 0,
-            "accuracy_score": 0.0
-        }
-
 def update_stats(new_latency, new_clauses, new_traps, new_score):
-    stats = get_stats()
-    
-    # Update Totals
-    n = stats["total_requests"]
-    current_avg = stats["avg_latency"]
-    
-    # Running Average Formula: NewAvg = ((OldAvg * N) + NewVal) / (N+1)
-    new_avg = ((current_avg * n) + new_latency) / (n + 1)
-    
-    stats["total_requests"] += 1
-    stats["total_clauses"] += new_clauses
-    stats["total_traps"] += new_traps
-    stats["total_predatory_score"] += new_score
-    stats["avg_latency"] = round(new_avg, 2)
-    
-    with open(STATS_FILE, "w") as f:
-        json.dump(stats, f)
+    get_stats_store().record_request(new_latency, new_clauses, new_traps, new_score)
 
 # CORS Setup (Allow Frontend to talk to Backend)
 app.add_middleware(
@@ -107,109 +88,703 @@ async def root():
 
 
 import base64
+import json
+import asyncio
+import functools
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
 
-@app.post("/analyze", response_model=dict)
-async def analyze_files(file: List[UploadFile] = File(...)):
+# --- Audit Cache ---
+# Level 1: hash of the uploaded bytes -> full /analyze payload (skips OCR, LLM and coordinate mapping)
+# Level 2: hash of the normalized extracted text -> AuditResult (skips the LLM for re-exports of the same contract)
+audit_cache = AuditCache(audit_fingerprint()) if CACHE_ENABLED else None
+
+# --- Revision Store ---
+# Earlier versions of a client's contracts (clause fingerprints + findings): a revision only re-audits what changed
+revision_store = RevisionStore(audit_fingerprint()) if REVISIONS_ENABLED else None
+
+# --- Document Store ---
+# /analyze returns a reference (document_id / document_url) instead of the PDF itself
+document_store = DocumentStore()
+
+# --- Memory Budget ---
+# Each audit reserves its estimated peak memory before work starts (uploads.py); the rest wait their turn
+memory_budget = MemoryBudget()
+
+# --- Executors ---
+# Everything that burns CPU or blocks on IO runs on a bounded pool so the event loop stays free
+# for /, /stats and /negotiate while audits are in flight.
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 2)))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+
+cpu_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="gotchai-cpu")
+ocr_pool = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="gotchai-ocr")
+
+async def run_blocking(pool: ThreadPoolExecutor, fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(fn, *args))
+
+async def timed(stage_name: str, pool: ThreadPoolExecutor, fn, *args):
+    # Includes time spent queued for a pool thread: that is latency the user sees too
+    with stage(stage_name):
+        return await run_blocking(pool, fn, *args)
+
+# Background prewarm (startup.py): LangChain, PyMuPDF... load after the port is bound
+warm_start_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def init_llm_clients():
+    # Connection pools and chains are built once here (or just after, with LAZY_STARTUP), not on the first audit
+    global warm_start_task
+    warm_start_task = await warm_start()
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    await stop_job_workers()  # Before the pools go away: workers still use them
+    if warm_start_task:
+        warm_start_task.cancel()
+    cpu_pool.shutdown(wait=False, cancel_futures=True)
+    ocr_pool.shutdown(wait=False, cancel_futures=True)
+    shutdown_ocr_pool()
+    await close_clients()
+
+def map_trap_coordinates(document: PDFWordIndex, audit_result: AuditResult) -> List[dict]:
+    # 4. Map Coordinates (all quotes in one scan of the word index built during extraction)
+    trap_quotes = [trap.original_text for trap in audit_result.detected_traps]
+    coordinates_map = get_coordinates_for_text(document, trap_quotes)
+    
+    # 5. Merge Data
+    traps_with_coords = []
+    for trap in audit_result.detected_traps:
+        matches = [c for c in coordinates_map if c['text'] == trap.original_text]
+        rects = [m['rect'] for m in matches if 'rect' in m]
+        page_numbers = list(set([m['page'] for m in matches if 'page' in m]))
+        clause_numbers = sorted(set(m['clause'] for m in matches if m.get('clause') is not None))
+        
+        trap_data = trap.model_dump()
+        trap_data['coordinates'] = rects
+        trap_data['pages'] = page_numbers
+        trap_data['clauses'] = clause_numbers
+        traps_with_coords.append(trap_data)
+    return traps_with_coords
+
+def clause_outline(document: PDFWordIndex) -> List[dict]:
+    # Per-clause heading, pages and block boxes, so the viewer can outline or jump to a whole clause
+    return [
+        {"index": c.index, "heading": c.heading, "start": c.start, "end": c.end, "pages": c.pages,
+         "boxes": [{"page": page, "rect": rect} for page, rect in c.boxes]}
+        for c in document.clauses
+    ]
+
+def encode_pdf(pdf_path: str) -> str:
+    with open(pdf_path, "rb") as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+def progress(stage_name: str, **fields) -> dict:
+    return {"event": "progress", "stage": stage_name, **fields}
+
+def client_id(request: Request) -> str:
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "anonymous")
+
+async def fresh_trap_events(document: PDFWordIndex, result: AuditResult, streamed: set) -> List[dict]:
+    # Findings from this window that haven't been sent yet, with their highlights
+    fresh = [t for t in result.detected_traps if normalize_quote(t.original_text) not in streamed]
+    streamed.update(normalize_quote(t.original_text) for t in fresh)
+    partial = AuditResult(detected_traps=fresh, overall_predatory_score=0)
+    return [{"event": "trap", "trap": trap_data}
+            for trap_data in await timed("coordinate_mapping", cpu_pool, map_trap_coordinates, document, partial)]
+
+async def read_uploads(file: List[UploadFile]):
     """
-    The main Forensic Pipeline. 
-    Accepts PDFs or snapped images, extracts the 'DNA' of the contract, 
-    and returns a detailed audit of predatory traps.
+    Validates the upload mix and spools it to temp files. Returns (is_pdf_mode, filename, list of SpooledUpload).
+    The caller owns the files and must delete_uploads() them.
     """
-    try:
-        # Determine Mode
-        is_pdf_mode = len(file) == 1 and file[0].content_type == "application/pdf"
-        
-        file_bytes = b""
-        filename = "contract.pdf"
-        
-        if is_pdf_mode:
-            # ORIGINAL PATH
-            file_bytes = await file[0].read()
-            filename = file[0].filename
-        else:
-            # SNAP & AUDIT PATH (Images -> PDF)
-            # Read all images
-            image_bytes_list = []
+    # Determine Mode
+    is_pdf_mode = len(file) == 1 and file[0].content_type == "application/pdf"
+
+    if len(file) > UPLOAD_MAX_FILES:
+        raise UploadTooLarge(f"Too many files: upload at most {UPLOAD_MAX_FILES} pages.")
+    if not is_pdf_mode:
+        # SNAP & AUDIT PATH (Images -> PDF)
+        # Simplify: Only allow Images OR Single PDF.
+        for f in file:
+            if f.content_type == "application/pdf":
+                raise HTTPException(status_code=400, detail="Cannot mix PDF and Images. Upload one PDF or multiple Images.")
+
+    uploads = await spool_uploads(file)
+    filename = file[0].filename if is_pdf_mode else "scanned_contract.pdf"
+    return is_pdf_mode, filename, uploads
+
+async def spool_uploads(file: List[UploadFile]) -> List[SpooledUpload]:
+    uploads: List[SpooledUpload] = []
+    with stage("upload_read"):
+        try:
             for f in file:
-                if f.content_type not in ["image/jpeg", "image/png", "image/heic", "image/jpg"]:
-                     # If mixed or unknown, skip or error. For hackathon, strict check.
-                     # If it's a PDF in a list of images, we might have issues.
-                     # Simplify: Only allow Images OR Single PDF.
-                     if f.content_type == "application/pdf":
-                         raise HTTPException(status_code=400, detail="Cannot mix PDF and Images. Upload one PDF or multiple Images.")
-                
-                content = await f.read()
-                image_bytes_list.append(content)
-            
-            print(f"Processing {len(image_bytes_list)} images with OCR...")
-            # Convert to Searchable PDF
-            file_bytes = convert_images_to_searchable_pdf(image_bytes_list)
-            filename = "scanned_contract.pdf"
+                uploads.append(await spool_upload(f))
+                if sum(upload.size for upload in uploads) > UPLOAD_MAX_TOTAL_BYTES:
+                    raise UploadTooLarge(f"Upload is over the {UPLOAD_MAX_TOTAL_BYTES // MB} MB limit.")
+        except BaseException:
+            delete_uploads(uploads)
+            raise
+    return uploads
+
+async def ocr_with_progress(image_paths: List[str], output_path: str):
+    """
+    Runs OCR on the pool and yields ("progress", event) per finished page, then ("pdf", path of the searchable PDF).
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def on_page_done(page: int, total: int, ok: bool):
+        loop.call_soon_threadsafe(queue.put_nowait, progress("ocr_page", page=page, total=total, ok=ok))
+
+    ocr_task = asyncio.ensure_future(timed("ocr", ocr_pool, convert_images_to_searchable_pdf, image_paths, on_page_done, output_path))
+    while not ocr_task.done():
+        getter = asyncio.ensure_future(queue.get())
+        await asyncio.wait({getter, ocr_task}, return_when=asyncio.FIRST_COMPLETED)
+        if getter.done():
+            yield "progress", getter.result()
+        else:
+            getter.cancel()
+    while not queue.empty():
+        yield "progress", queue.get_nowait()
+    yield "pdf", ocr_task.result()
+
+async def audit_events(is_pdf_mode: bool, filename: str, uploads: List[SpooledUpload], include_pdf: bool = False,
+                       stream_traps: bool = False, start_time: Optional[float] = None, client: str = "anonymous"):
+    """
+    The Forensic Pipeline as a stream of events:
+    progress events, one "trap" event per finding as soon as its window is audited (if `stream_traps`),
+    and a final "result" event whose payload is exactly what /analyze returns.
+    The uploads are read by path; the caller deletes them afterwards.
+    `client` scopes revision matching: only that client's earlier documents are diffed against.
+    """
+    trace = current_trace() or start_trace()
+    start_time = start_time or time.time() # Monitor latency for transparency
+    outcome = "error"
+    reserved = 0
+    ocr_path = None
+    revision = None
+    try:
+        # The PDF is handled by path from here on (the upload itself, or the OCR output)
+        pdf_path = uploads[0].path if is_pdf_mode else None
+        pdf_id = uploads[0].digest.hex() if is_pdf_mode else None
+
+        # 1. Cache Lookup (Level 1: exact same upload seen before; digests were taken while spooling)
+        document_key = hash_digests(*(upload.digest for upload in uploads))
+        cached_document = await timed("cache_lookup", cpu_pool, audit_cache.get, "documents", document_key) if audit_cache else None
+        if cached_document and not is_pdf_mode and not document_store.path_for(cached_document["payload"]["document_id"]):
+            # The OCR output aged out of the document store: redo the scan rather than hand out a dead link
+            cached_document = None
+        if cached_document:
+            print(f"⚡ Cache hit for document {document_key[:12]}")
+            payload = dict(cached_document["payload"])
+            payload["filename"] = filename
+            if is_pdf_mode:
+                await timed("document_store", cpu_pool, document_store.put_file, pdf_path, payload["document_id"])
+            if include_pdf:
+                stored_path = pdf_path if is_pdf_mode else str(document_store.path_for(payload["document_id"]))
+                payload["pdf_base64"] = await timed("serialization", cpu_pool, encode_pdf, stored_path)
+            latency_ms = (time.time() - start_time) * 1000
+            await run_blocking(cpu_pool, update_stats, latency_ms, cached_document["num_clauses"], cached_document["num_traps"], payload["overall_predatory_score"])
+            outcome = "cache_hit"
+            if stream_traps:
+                for trap_data in payload["detected_traps"]:
+                    yield {"event": "trap", "trap": trap_data}
+            yield {"event": "result", "result": payload}
+            return
+
+        # Hold back until this audit's estimated peak memory fits in the process budget
+        needed = await run_blocking(cpu_pool, estimate_memory, uploads, is_pdf_mode, include_pdf)
+        with stage("memory_wait"):
+            reserved = await memory_budget.acquire(needed)
+
+        if not is_pdf_mode:
+            print(f"Processing {len(uploads)} images with OCR...")
+            # Convert to Searchable PDF (written to a spool file, never held whole in memory)
+            ocr_path = new_spool_path(".pdf")
+            async for kind, value in ocr_with_progress([upload.path for upload in uploads], ocr_path):
+                if kind == "pdf":
+                    pdf_path = value
+                else:
+                    yield value
+            pdf_id = await timed("hashing", cpu_pool, document_id_for_file, pdf_path)
         
         # --- THE AUDIT PIPELINE ---
-        start_time = time.time() # Monitor latency for transparency
 
-        # 2. Extract Text (PyMuPDF works on the PDF bytes, whether native or OCR'd)
-        full_text = extract_text_from_pdf(file_bytes)
+        # 2. Extract Text (PyMuPDF opens the PDF file in place, whether native or OCR'd, and closes it once indexed)
+        # One pass builds both the text and the word/bbox index used for highlighting
+        document = await timed("text_extraction", cpu_pool, parse_pdf, pdf_path)
+        full_text = document.text
         
         if not full_text or len(full_text) < 50:
              raise HTTPException(status_code=400, detail="No text found. If uploading images, ensure they are clear.")
+        yield progress("text_extracted", pages=len(document.page_texts), characters=len(full_text))
 
         # 3. Run AI Audit (LangChain)
-        # Reduced to 15k chars (approx 4k tokens) to safely allow 2-3 requests/min on Free Tier
-        truncated_text = full_text[:15000]
-        audit_result: AuditResult = analyze_contract_text(truncated_text)
-        
-        # 4. Map Coordinates
-        trap_quotes = [trap.original_text for trap in audit_result.detected_traps]
-        coordinates_map = get_coordinates_for_text(file_bytes, trap_quotes)
+        # Level 2 cache: same contract text, different file (re-export, re-scan)
+        text_key = await timed("hashing", cpu_pool, hash_text, full_text)
+        cached_audit = await timed("cache_lookup", cpu_pool, audit_cache.get, "audits", text_key) if audit_cache else None
+        if cached_audit:
+            print(f"⚡ Cache hit for contract text {text_key[:12]}")
+            audit_result = AuditResult.model_validate(cached_audit)
+        else:
+            # Map-reduce over clause-aligned windows so every page gets audited, not just the first ~5
+            streamed = set()
+            # Windows follow the clauses found from the PDF's headings and numbering
+            clauses = await timed("segmentation", cpu_pool, document.clause_texts)
+            audit_clauses = clauses
+            carried = None
+            if revision_store:
+                # A new version of a contract this client had audited: only added and changed clauses go to the model
+                revision = await timed("revision_lookup", cpu_pool, revision_store.find_revision, client, clauses,
+                                       document.running_headers)
+            if revision:
+                print(f"🔁 Revision of {revision.previous_document_id[:12]}: {revision.counts}, "
+                      f"re-auditing {len(revision.audit)}/{len(clauses)} clauses.")
+                yield progress("revision", previous_document_id=revision.previous_document_id, **revision.counts)
+                audit_clauses = [clauses[i] for i in revision.audit]
+                carried = AuditResult(detected_traps=[DetectionObject(**trap) for trap in revision.carried], overall_predatory_score=0)
+                if stream_traps:
+                    for event in await fresh_trap_events(document, carried, streamed):
+                        yield event
+            with stage("llm"):
+                async for kind, result in iter_full_contract_audit("".join(audit_clauses), clauses=audit_clauses):
+                    if kind == "final":
+                        audit_result: AuditResult = result
+                    elif stream_traps:
+                        for event in await fresh_trap_events(document, result, streamed):
+                            yield event
+            if carried and not is_system_error(audit_result):
+                audit_result = merge_audit_results([carried, audit_result])
+            if audit_cache and not is_system_error(audit_result):
+                await run_blocking(cpu_pool, audit_cache.set, "audits", text_key, audit_result.model_dump())
         
-        # 5. Merge Data
-        traps_with_coords = []
-        for trap in audit_result.detected_traps:
-            matches = [c for c in coordinates_map if c['text'] == trap.original_text]
-            rects = [m['rect'] for m in matches if 'rect' in m]
-            page_numbers = list(set([m['page'] for m in matches if 'page' in m]))
-            
-            trap_data = trap.model_dump()
-            trap_data['coordinates'] = rects
-            trap_data['pages'] = page_numbers
-            traps_with_coords.append(trap_data)
-
-        # 6. Encode PDF for Frontend (if needed)
-        # Always return it to be safe, or just for images.
-        # Frontend logic will prefer this if present.
-        pdf_base64 = base64.b64encode(file_bytes).decode('utf-8')
+        # 4 + 5. Map Coordinates and merge them into the traps
+        traps_with_coords = await timed("coordinate_mapping", cpu_pool, map_trap_coordinates, document, audit_result)
+        if stream_traps and cached_audit:
+            for trap_data in traps_with_coords:
+                yield {"event": "trap", "trap": trap_data}
+
+        # 6. Store the PDF for GET /documents/{id}; inline it only when the client asks
+        document_id = await timed("document_store", cpu_pool, document_store.put_file, pdf_path, pdf_id)
         
         # --- UPDATE STATS ---
         end_time = time.time()
         latency_ms = (end_time - start_time) * 1000
         
-        # Estimate clauses ~ 1 clause per 150 chars (standard forensic density)
-        num_clauses = max(1, len(truncated_text) // 150)
+        num_clauses = max(1, len(document.clauses))
         num_traps = len(audit_result.detected_traps)
         
         # Don't counting System Errors as traps
         if num_traps > 0 and audit_result.detected_traps[0].category == "System":
              num_traps = 0
              
-        update_stats(latency_ms, num_clauses, num_traps, audit_result.overall_predatory_score)
-            
-        return {
+        await run_blocking(cpu_pool, update_stats, latency_ms, num_clauses, num_traps, audit_result.overall_predatory_score)
+
+        payload = {
             "overall_predatory_score": audit_result.overall_predatory_score,
             "detected_traps": traps_with_coords,
+            "clauses": clause_outline(document),
             "filename": filename,
-            "pdf_base64": pdf_base64
+            "document_id": document_id,
+            "document_url": f"/documents/{document_id}"
         }
+
+        if audit_cache and not is_system_error(audit_result):
+            await run_blocking(cpu_pool, audit_cache.set, "documents", document_key, {
+                "payload": dict(payload),
+                "num_clauses": num_clauses,
+                "num_traps": num_traps
+            })
+
+        if revision_store and not is_system_error(audit_result):
+            await run_blocking(cpu_pool, revision_store.record, client, text_key, document_id,
+                               document.clause_texts(), traps_with_coords, document.running_headers)
+        if revision:
+            # Per-client view: kept out of the document cache above, so it never reaches another client
+            payload["detected_traps"] = [dict(trap) for trap in traps_with_coords]
+            payload["revision"] = revision_report(revision, payload["detected_traps"], normalize_quote)
+
+        if include_pdf:
+            payload["pdf_base64"] = await timed("serialization", cpu_pool, encode_pdf, pdf_path)
+
+        outcome = "system_error" if is_system_error(audit_result) else "ok"
+        yield {"event": "result", "result": payload}
         
+    except HTTPException as e:
+        outcome = f"http_{e.status_code}"
+        raise
     except Exception as e:
         print(f"Error processing files: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await memory_budget.release(reserved)
+        if ocr_path and os.path.exists(ocr_path):
+            os.unlink(ocr_path)
+        record_stage("total", time.time() - start_time)
+        REQUESTS.inc(1, outcome)
+        if LOG_STAGE_TIMINGS:
+            print(f"⏱️ /analyze {outcome}: {trace.summary()}")
+
+@app.post("/analyze", response_model=dict)
+async def analyze_files(request: Request, file: List[UploadFile] = File(...), include_pdf: bool = False):
+    """
+    The main Forensic Pipeline. 
+    Accepts PDFs or snapped images, extracts the 'DNA' of the contract, 
+    and returns a detailed audit of predatory traps.
+    The audited PDF is available at `document_url`; pass `?include_pdf=true` to also get it inline as base64.
+    """
+    start_trace()
+    start_time = time.time()
+    is_pdf_mode, filename, uploads = await read_uploads(file)
+    try:
+        # aclosing: returning mid-iteration must still run the generator's cleanup (reservations, stats) now
+        async with aclosing(audit_events(is_pdf_mode, filename, uploads, include_pdf, start_time=start_time,
+                                         client=client_id(request))) as events:
+            async for event in events:
+                if event["event"] == "result":
+                    return event["result"]
+    finally:
+        delete_uploads(uploads)
+
+@app.post("/analyze/stream")
+async def analyze_files_stream(request: Request, file: List[UploadFile] = File(...), include_pdf: bool = False):
+    """
+    Streaming variant of /analyze (NDJSON, one event per line):
+    {"event": "progress", ...} while OCR and extraction run, {"event": "trap", "trap": {...}} for each
+    finding as soon as its window is audited, then {"event": "result", "result": {...}} with the same
+    payload /analyze would return. Failures after the stream has started arrive as {"event": "error"}.
+    """
+    start_trace()
+    start_time = time.time()
+    # Read and validate before the 200 goes out, so bad uploads still get a proper status code
+    is_pdf_mode, filename, uploads = await read_uploads(file)
+
+    async def ndjson():
+        yield json.dumps(progress("upload_read", files=len(uploads))) + "\n"
+        try:
+            async with aclosing(audit_events(is_pdf_mode, filename, uploads, include_pdf, stream_traps=True,
+                                             start_time=start_time, client=client_id(request))) as events:
+                async for event in events:
+                    yield json.dumps(event) + "\n"
+        except HTTPException as e:
+            yield json.dumps({"event": "error", "status": e.status_code, "detail": e.detail}) + "\n"
+        finally:
+            delete_uploads(uploads)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- Batch Audits ---
+# A portfolio of PDFs in one call: extracted in parallel, exact repeats of a clause (whitespace and case aside)
+# deduplicated across the whole batch before any LLM call (auditor.analyze_contract_batch_async), and one payload
+# per document plus a portfolio summary. Near-duplicates are each audited, unless the clause index vouches for them.
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "50"))
+
+def portfolio_summary(documents: List[dict], dedupe: dict) -> dict:
+    audited = [d for d in documents if "error" not in d]
+    by_category: dict = {}
+    by_risk: dict = {}
+    recurring: dict = {}
+    for document in audited:
+        for trap in document["detected_traps"]:
+            by_category[trap["category"]] = by_category.get(trap["category"], 0) + 1
+            risk = trap["risk_level"].upper()
+            by_risk[risk] = by_risk.get(risk, 0) + 1
+            entry = recurring.setdefault(normalize_quote(trap["original_text"]), {
+                "original_text": trap["original_text"], "category": trap["category"],
+                "risk_level": trap["risk_level"], "documents": []})
+            if document["filename"] not in entry["documents"]:
+                entry["documents"].append(document["filename"])
+    scores = [d["overall_predatory_score"] for d in audited]
+    return {
+        "documents": len(documents),
+        "audited": len(audited),
+        "failed": len(documents) - len(audited),
+        "average_predatory_score": round(sum(scores) / len(scores), 1) if scores else 0,
+        "max_predatory_score": max(scores, default=0),
+        "riskiest": [{"filename": d["filename"], "document_id": d["document_id"], "overall_predatory_score": d["overall_predatory_score"]}
+                     for d in sorted(audited, key=lambda d: d["overall_predatory_score"], reverse=True)],
+        "traps_by_category": by_category,
+        "traps_by_risk": by_risk,
+        # The same trap quoted in more than one contract: usually one vendor template
+        "recurring_traps": sorted((e for e in recurring.values() if len(e["documents"]) > 1),
+                                  key=lambda e: (-RISK_RANK.get(e["risk_level"].upper(), 0), -len(e["documents"]))),
+        "deduplication": dedupe,
+    }
+
+@app.post("/analyze/batch")
+async def analyze_batch(file: List[UploadFile] = File(...)):
+    """
+    Audits a portfolio of contracts (one PDF per file) in a single call.
+    Returns `documents` (per file, the /analyze payload or an `error`) and a portfolio `summary`.
+    Clauses repeated word for word across the batch (whitespace and case aside) are audited once; near-duplicates
+    are reused only through the clause index's own vetted lookup, otherwise each is audited.
+    """
+    trace = start_trace()
+    start_time = time.time()
+    if len(file) > BATCH_MAX_DOCUMENTS:
+        raise UploadTooLarge(f"Too many documents: a batch takes at most {BATCH_MAX_DOCUMENTS}.")
+    for f in file:
+        if f.content_type != "application/pdf":
+            raise HTTPException(status_code=400, detail="A batch takes PDFs only. Audit snapped pages with /analyze.")
+    uploads = await spool_uploads(file)
+    filenames = [f.filename for f in file]
+
+    outcome = "error"
+    reserved = 0
+    try:
+        # Capped at the whole budget: a large batch runs alone rather than being refused
+        needed = sum(await asyncio.gather(*(run_blocking(cpu_pool, estimate_memory, [u], True) for u in uploads)))
+        with stage("memory_wait"):
+            reserved = await memory_budget.acquire(min(needed, memory_budget.capacity))
+
+        # 1. Extract every document in parallel
+        parsed = await asyncio.gather(*(timed("text_extraction", cpu_pool, parse_pdf, u.path) for u in uploads),
+                                      return_exceptions=True)
+
+        # 2. Per-document caches; what is left is audited as one pool of clauses
+        payloads: List[Optional[dict]] = [None] * len(uploads)
+        audits: List[Optional[AuditResult]] = [None] * len(uploads)
+        text_keys: List[Optional[str]] = [None] * len(uploads)
+        document_keys = [hash_digests(u.digest) for u in uploads]
+        pending: List[int] = []
+        for i, (upload, document) in enumerate(zip(uploads, parsed)):
+            if isinstance(document, Exception) or not document.text or len(document.text) < 50:
+                payloads[i] = {"filename": filenames[i], "error": "No text found in this PDF.", "status": 400}
+                continue
+            cached_document = await timed("cache_lookup", cpu_pool, audit_cache.get, "documents", document_keys[i]) if audit_cache else None
+            if cached_document:
+                payloads[i] = dict(cached_document["payload"], filename=filenames[i])
+                continue
+            text_keys[i] = await timed("hashing", cpu_pool, hash_text, document.text)
+            cached_audit = await timed("cache_lookup", cpu_pool, audit_cache.get, "audits", text_keys[i]) if audit_cache else None
+            if cached_audit:
+                audits[i] = AuditResult.model_validate(cached_audit)
+            else:
+                pending.append(i)
+
+        dedupe = {}
+        if pending:
+            clauses = await asyncio.gather(*(timed("segmentation", cpu_pool, parsed[i].clause_texts) for i in pending))
+            with stage("llm"):
+                results, dedupe = await analyze_contract_batch_async(clauses)
+            for i, result in zip(pending, results):
+                audits[i] = result
+                if audit_cache and not is_system_error(result):
+                    await run_blocking(cpu_pool, audit_cache.set, "audits", text_keys[i], result.model_dump())
+
+        # 3. Highlights, storage and stats per document
+        latency_ms = (time.time() - start_time) * 1000
+        for i, audit_result in enumerate(audits):
+            if payloads[i] is not None:
+                if "error" not in payloads[i]:
+                    await timed("document_store", cpu_pool, document_store.put_file, uploads[i].path, payloads[i]["document_id"])
+                continue
+            document = parsed[i]
+            traps_with_coords = await timed("coordinate_mapping", cpu_pool, map_trap_coordinates, document, audit_result)
+            document_id = await timed("document_store", cpu_pool, document_store.put_file, uploads[i].path, uploads[i].digest.hex())
+            num_clauses = max(1, len(document.clauses))
+            num_traps = 0 if is_system_error(audit_result) else len(audit_result.detected_traps)
+            await run_blocking(cpu_pool, update_stats, latency_ms, num_clauses, num_traps, audit_result.overall_predatory_score)
+            payloads[i] = {
+                "overall_predatory_score": audit_result.overall_predatory_score,
+                "detected_traps": traps_with_coords,
+                "clauses": clause_outline(document),
+                "filename": filenames[i],
+                "document_id": document_id,
+                "document_url": f"/documents/{document_id}"
+            }
+            if is_system_error(audit_result):
+                payloads[i] = {"filename": filenames[i], "error": "The AI service is currently overloaded. Please try again.", "status": 503}
+            elif audit_cache:
+                await run_blocking(cpu_pool, audit_cache.set, "documents", document_keys[i], {
+                    "payload": dict(payloads[i]), "num_clauses": num_clauses, "num_traps": num_traps})
+
+        outcome = "ok"
+        return {"documents": payloads, "summary": portfolio_summary(payloads, dedupe)}
+    except HTTPException as e:
+        outcome = f"http_{e.status_code}"
+        raise
+    except Exception as e:
+        print(f"Error processing batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await memory_budget.release(reserved)
+        delete_uploads(uploads)
+        record_stage("total", time.time() - start_time)
+        REQUESTS.inc(1, outcome)
+        if LOG_STAGE_TIMINGS:
+            print(f"⏱️ /analyze/batch {outcome}: {trace.summary()}")
+
+
+# --- Audit Jobs ---
+# POST /jobs answers 202 right away; JOB_WORKERS tasks per process drain the SQLite queue (job_queue.py)
+# through the same pipeline as /analyze. Clients poll GET /jobs/{id}, optionally long-polling with ?wait=.
+JOB_IDLE_POLL_SECONDS = 1.0  # Other processes can enqueue too, so idle workers re-check at least this often
+JOB_MAX_WAIT_SECONDS = 30
 
+job_wakeup = asyncio.Event()
+job_worker_tasks: List[asyncio.Task] = []
+
+def job_uploads(job_id: str) -> List[SpooledUpload]:
+    # The queue's own copies, read in place: they stay until the job finishes (a retry needs them)
+    return [SpooledUpload(path, size, digest) for path, size, digest in get_job_queue().uploads(job_id)]
+
+async def run_job(job: dict):
+    queue = get_job_queue()
+    job_id, lease = job["job_id"], job["lease"]
+    start_trace()
+
+    async def audit():
+        uploads = await run_blocking(cpu_pool, job_uploads, job_id)
+        async with aclosing(audit_events(job["is_pdf_mode"], job["filename"], uploads, job["include_pdf"],
+                                         client=job["client"])) as events:
+            async for event in events:
+                if event["event"] == "result":
+                    if not await run_blocking(cpu_pool, queue.complete, job_id, lease, event["result"]):
+                        print(f"⚠️ Job {job_id[:12]} changed hands before it finished here; result dropped")
+
+    audit_task = asyncio.create_task(audit())
+    lost_lease = False
+
+    async def keep_lease():
+        # Renew well before expiry; if this process dies the lease lapses and another worker retries the job.
+        # Once the lease is lost the job belongs to another worker: stop auditing it here.
+        nonlocal lost_lease
+        while True:
+            await asyncio.sleep(queue.lease_seconds / 3)
+            if not await run_blocking(cpu_pool, queue.renew, job_id, lease):
+                print(f"⚠️ Lost the lease on job {job_id[:12]}; stopping, another worker will run it")
+                lost_lease = True
+                audit_task.cancel()
+                return
+
+    heartbeat = asyncio.create_task(keep_lease())
+    try:
+        await audit_task
+    except asyncio.CancelledError:
+        if not lost_lease:
+            raise
+    except HTTPException as e:
+        await run_blocking(cpu_pool, queue.fail, job_id, lease, e.status_code, str(e.detail))
+    finally:
+        heartbeat.cancel()
+
+async def job_worker(worker_id: int):
+    queue = get_job_queue()
+    while True:
+        try:
+            claimed = await run_blocking(cpu_pool, queue.claim)
+        except Exception as e:
+            print(f"⚠️ Job worker {worker_id} could not claim a job: {e}")
+            claimed = None
+
+        if claimed is None:
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), JOB_IDLE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            job_wakeup.clear()
+            continue
+
+        job = claimed
+        print(f"📥 Worker {worker_id} picked up job {job['job_id'][:12]} (attempt {job['attempts']})")
+        try:
+            await run_job(job)
+        except Exception as e:
+            # Anything run_job did not turn into an HTTP error must not kill the worker or strand the job
+            print(f"⚠️ Job {job['job_id'][:12]} crashed in worker {worker_id}: {e}")
+            try:
+                await run_blocking(cpu_pool, queue.fail, job["job_id"], job["lease"], 500, str(e))
+            except Exception as fail_error:
+                print(f"⚠️ Could not mark job {job['job_id'][:12]} failed, its lease will expire: {fail_error}")
+
+@app.on_event("startup")
+async def start_job_workers():
+    for worker_id in range(JOB_WORKERS):
+        job_worker_tasks.append(asyncio.create_task(job_worker(worker_id)))
+
+async def stop_job_workers():
+    # Jobs cut off here keep their lease until it expires, then get picked up again
+    for task in job_worker_tasks:
+        task.cancel()
+    await asyncio.gather(*job_worker_tasks, return_exceptions=True)
+    job_worker_tasks.clear()
+
+def public_job(job: dict) -> dict:
+    view = {key: job[key] for key in ("job_id", "status", "attempts", "created_at", "started_at", "finished_at")}
+    for key in ("position", "result", "error"):
+        if key in job:
+            view[key] = job[key]
+    view["status_url"] = f"/jobs/{job['job_id']}"
+    return view
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: Request, file: List[UploadFile] = File(...), include_pdf: bool = False):
+    """
+    Queues an audit and returns 202 with a job id. Same uploads as /analyze; the result, once
+    ready, is exactly what /analyze would have returned. 429 (with Retry-After) when the queue is full.
+    """
+    client = client_id(request)
+    is_pdf_mode, filename, uploads = await read_uploads(file)
+    queue = get_job_queue()
+    try:
+        job_id = await run_blocking(cpu_pool, queue.submit, client, is_pdf_mode, filename,
+                                    [(upload.path, upload.size, upload.digest) for upload in uploads], include_pdf)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    finally:
+        delete_uploads(uploads)
+    job_wakeup.set()
+
+    job = await run_blocking(cpu_pool, queue.get, job_id)
+    return JSONResponse(public_job(job), status_code=202, headers={"Location": f"/jobs/{job_id}"})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """
+    Job status. With `?wait=N` (seconds, max 30) the call blocks until the job finishes or N runs out.
+    """
+    queue = get_job_queue()
+    deadline = time.time() + min(max(wait, 0), JOB_MAX_WAIT_SECONDS)
+    while True:
+        job = await run_blocking(cpu_pool, queue.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found or expired.")
+        if job["status"] in ("done", "failed") or time.time() >= deadline:
+            return public_job(job)
+        await asyncio.sleep(0.25)
+
+
+@app.get("/documents/{document_id}")
+async def get_document(document_id: str, request: Request):
+    """
+    Serves an audited PDF by content hash. Supports Range requests (PDF.js fetches pages lazily)
+    and, since the content behind an id can never change, long-lived caching.
+    """
+    path = document_store.path_for(document_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Document not found or expired.")
+
+    etag = f'"{document_id}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="application/pdf", headers=headers)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus text exposition of per-stage latency histograms, LLM retries and token usage.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
 @app.get("/stats")
 async def get_system_stats():
-    return get_stats()
+    return await run_blocking(cpu_pool, get_stats_store().get_stats)
 
 class NegotiateRequest(BaseModel):
     trap_text: str
@@ -219,7 +794,7 @@ class NegotiateRequest(BaseModel):
 @app.post("/negotiate", response_model=dict)
 async def negotiate_clause(request: NegotiateRequest):
     try:
-        result = generate_negotiation_email(request.trap_text, request.category, request.explanation)
+        result = await generate_negotiation_email_async(request.trap_text, request.category, request.explanation)
         return result.model_dump()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# --- Per-Stage Latency Instrumentation ---
+# Prometheus-style histograms and counters kept in process memory, rendered by GET /metrics.
+# A span costs two perf_counter() calls, a bisect and a short lock: cheap enough to leave on.
+# Each uvicorn worker exposes its own numbers; Prometheus sums them across scrape targets.
+
+LOG_STAGE_TIMINGS = os.getenv("LOG_STAGE_TIMINGS", "0") == "1"
+
+# Seconds. Spans from a cache hit (~1 ms) up to a slow multi-window LLM audit (~2 min)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+# Tokens. One audited window: a clause or two up to a full CHUNK_SIZE window with retries
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 32000)
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help_text, self.labelnames = name, help_text, labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=STAGE_BUCKETS):
+        self.name, self.help_text, self.labelnames = name, help_text, labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    le_label = f'le="{le}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le_label)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("gotchai_stage_seconds", "Wall time per pipeline stage.", ("stage",))
+REQUESTS = Counter("gotchai_requests_total", "Audit requests by outcome.", ("outcome",))
+LLM_CALLS = Counter("gotchai_llm_calls_total", "LLM calls by outcome.", ("outcome",))
+LLM_RETRIES = Counter("gotchai_llm_retries_total", "LLM calls retried after a failure.")
+LLM_TOKENS = Counter("gotchai_llm_tokens_total", "Tokens reported by the provider.", ("kind",))
+AUDIT_TOKENS = Histogram("gotchai_audit_tokens", "Tokens per audited window, retries and repairs included.",
+                         ("output_mode",), buckets=TOKEN_BUCKETS)
+
+REGISTRY = [STAGE_SECONDS, REQUESTS, LLM_CALLS, LLM_RETRIES, LLM_TOKENS, AUDIT_TOKENS]
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RequestTrace:
+    """
+    Per-request view of the same spans, for optional logging and for attaching to results.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.llm_retries = 0
+        self.llm_repairs = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def summary(self) -> str:
+        stages = " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.stages.items())
+        return f"{stages} llm_retries={self.llm_retries} llm_repairs={self.llm_repairs} tokens={self.prompt_tokens}+{self.completion_tokens}"
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("gotchai_trace", default=None)
+
+def start_trace() -> RequestTrace:
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+def record_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_stage(name, seconds)
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+def record_llm_retry():
+    LLM_RETRIES.inc()
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.llm_retries += 1
+
+def record_llm_usage(message):
+    """
+    Reads token usage off a LangChain AIMessage (absent for providers that don't report it).
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens", 0)
+    completion_tokens = usage.get("output_tokens", 0)
+    LLM_TOKENS.inc(prompt_tokens, "prompt")
+    LLM_TOKENS.inc(completion_tokens, "completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.prompt_tokens += prompt_tokens
+            trace.completion_tokens += completion_tokens
+
+def record_llm_repair():
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            trace.llm_repairs += 1
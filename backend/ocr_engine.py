@@ -1,48 +1,319 @@
-import pytesseract
-from PIL import Image
+import contextlib
+import functools
 import io
-from typing import List
+import os
+import re
+import threading
+import time
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
-def convert_images_to_searchable_pdf(image_bytes_list: List[bytes]) -> bytes:
+try:
+    from backend.prescreen import fold
+except ModuleNotFoundError:
+    from prescreen import fold
+
+# pytesseract, Pillow and NumPy (image_preprocess) are imported where they're used: the server imports
+# this module at startup, while the OCR itself runs in the pool workers
+if TYPE_CHECKING:
+    from PIL import Image
+
+# --- OCR Process Pool ---
+# Each page is an independent Tesseract run, so pages are spread over a process pool sized to the cores.
+# Tesseract's own OpenMP threading is switched off: N single-threaded pages beat 1 page on N threads.
+OCR_PROCESSES = int(os.getenv("OCR_PROCESSES", str(os.cpu_count() or 1)))
+OCR_PAGE_TIMEOUT = int(os.getenv("OCR_PAGE_TIMEOUT", "60"))  # seconds per page
+OCR_JPEG_QUALITY = 85  # the page image in the searchable PDF
+OCR_LANG = os.getenv("OCR_LANG", "ell+eng")  # Greek (ell) and English (eng): used when detection is off or inconclusive
+
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 'spawn' so workers never inherit locks held by the server's threads at fork time
+            _pool = ProcessPoolExecutor(max_workers=OCR_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def shutdown_ocr_pool():
+    _reset_pool()
+
+# --- Language Detection ---
+# Every extra language pack slows Tesseract down, and the wrong one garbles the text. So each page gets only the
+# packs it needs: Tesseract's script detection (OSD) on a downscaled copy says Greek / Cyrillic / Latin...,
+# and for Latin script a quick low-res OCR pass of the middle of the page is matched against common function words.
+# The first page is resolved before the others are fanned out; its answer is passed along, so later pages in the
+# same script only pay for the OSD check.
+OCR_DETECT_LANG = os.getenv("OCR_DETECT_LANG", "1") != "0"
+OCR_DETECT_MAX_SIDE = int(os.getenv("OCR_DETECT_MAX_SIDE", "1600"))  # px, long side of the detection copy
+OCR_DETECT_TIMEOUT = 10  # seconds per detection call
+MIN_STOPWORD_HITS = 5
+
+# OSD script -> packs. English rides along with non-Latin scripts (names, amounts, defined terms).
+SCRIPT_LANGS = {
+    "Greek": "ell+eng", "Cyrillic": "rus+eng", "Arabic": "ara+eng", "Hebrew": "heb+eng",
+    "Han": "chi_sim+eng", "Hangul": "kor+eng", "Japanese": "jpn+eng", "Devanagari": "hin+eng",
+}
+# Latin script: the commonest words of each language, case-folded and unaccented (see prescreen.fold)
+STOPWORDS = {
+    "eng": {"the", "and", "of", "to", "in", "shall", "be", "is", "by", "or", "any", "this", "with", "for", "will"},
+    "deu": {"der", "die", "das", "und", "ist", "mit", "von", "den", "des", "nicht", "oder", "auf", "im", "wird", "zur"},
+    "spa": {"el", "los", "las", "del", "y", "que", "por", "con", "para", "se", "una", "al", "su", "sera", "como"},
+    "fra": {"le", "les", "des", "et", "du", "est", "une", "par", "pour", "dans", "au", "sur", "aux", "sont", "ne"},
+    "ita": {"il", "di", "che", "e", "della", "per", "sono", "nel", "dei", "gli", "alla", "delle", "non", "essere", "sara"},
+    "por": {"os", "do", "da", "em", "com", "uma", "pelo", "nao", "dos", "das", "ao", "pela", "sera", "ou", "seu"},
+    "nld": {"het", "een", "van", "en", "dat", "op", "te", "met", "voor", "niet", "zijn", "door", "worden", "wordt", "aan"},
+}
+_WORD = re.compile(r"[a-z]+")
+
+@functools.lru_cache(maxsize=1)
+def installed_languages() -> frozenset:
+    import pytesseract
+    try:
+        return frozenset(pytesseract.get_languages(config=""))
+    except Exception:
+        return frozenset()
+
+def _installed(lang: str) -> Optional[str]:
     """
-    Converts a list of image bytes (JPG/PNG) into a single multi-page PDF.
+    `lang` without the extra packs this Tesseract doesn't have, or None if its main pack is missing.
+    """
+    packs = lang.split("+")
+    if packs[0] not in installed_languages():
+        return None
+    return "+".join(pack for pack in packs if pack in installed_languages())
+
+def _detection_copy(image: "Image.Image") -> "Image.Image":
+    small = image.convert("L")
+    small.thumbnail((OCR_DETECT_MAX_SIDE, OCR_DETECT_MAX_SIDE))
+    return small
+
+def detect_script(image: "Image.Image") -> Optional[str]:
+    if "osd" not in installed_languages():
+        return None
+    import pytesseract
+    try:
+        osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT, timeout=OCR_DETECT_TIMEOUT)
+    except Exception:
+        # Blank pages and photos with too little text make OSD give up
+        return None
+    return osd.get("script")
+
+def guess_latin_language(image: "Image.Image") -> Optional[str]:
+    """
+    Quick OCR of the middle half of the page with the English model (it reads any Latin script well enough
+    for function words), scored against STOPWORDS. None if too few words were recognised to tell.
+    """
+    import pytesseract
+    width, height = image.size
+    try:
+        text = pytesseract.image_to_string(image.crop((0, height // 4, width, 3 * height // 4)),
+                                           lang="eng", timeout=OCR_DETECT_TIMEOUT)
+    except Exception:
+        return None
+    words = _WORD.findall(fold(text))
+    hits = {lang: sum(word in stopwords for word in words) for lang, stopwords in STOPWORDS.items()}
+    best = max(hits, key=hits.get)
+    if hits[best] < MIN_STOPWORD_HITS:
+        return None
+    if best != "eng" and hits["eng"] * 3 >= hits[best]:
+        # A bilingual page (e.g. side-by-side translation)
+        return f"{best}+eng"
+    return best
+
+def choose_language(image: "Image.Image", known: Optional[Dict[str, str]] = None) -> Tuple[Optional[str], str]:
+    """
+    Picks the language packs for one page: (script, lang). `known` maps scripts already resolved
+    for this document to their packs, so only the OSD check is paid for them.
+    """
+    known = known or {}
+    if not OCR_DETECT_LANG:
+        return None, OCR_LANG
+    small = _detection_copy(image)
+    script = detect_script(small)
+    if script in known:
+        return script, known[script]
+    if script is None and len(known) == 1:
+        # OSD couldn't tell: assume the page is like the rest of the document
+        return None, next(iter(known.values()))
+    if script == "Latin":
+        lang = guess_latin_language(small)
+    else:
+        lang = SCRIPT_LANGS.get(script)
+    return script, (_installed(lang) if lang else None) or OCR_LANG
+
+@contextlib.contextmanager
+def _open_image(image_source: Union[bytes, str]) -> Iterator["Image.Image"]:
+    from PIL import Image
+    try:
+        from backend.image_preprocess import OCR_PREPROCESS, preprocess
+    except ModuleNotFoundError:
+        from image_preprocess import OCR_PREPROCESS, preprocess
+    # A path is opened by the worker itself, so the image bytes never cross the process boundary
+    with Image.open(image_source if isinstance(image_source, str) else io.BytesIO(image_source)) as image:
+        # Upright, cropped, deskewed grayscale at OCR_TARGET_DPI (see image_preprocess.py)
+        yield preprocess(image) if OCR_PREPROCESS else image
+
+def detect_page_language(image_source: Union[bytes, str]) -> Tuple[Optional[str], str]:
+    """
+    choose_language() for an image (bytes or path), run in a pool worker.
+    """
+    try:
+        with _open_image(image_source) as image:
+            return choose_language(image)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+def _under_text_layer(text_layer: bytes, page: "Image.Image") -> bytes:
+    """
+    Puts the page image beneath a text-only PDF page from Tesseract (textonly_pdf), filling the page:
+    both were sized from the same pixels and dpi. JPEG, as Tesseract itself embeds grayscale pages.
+    """
+    import fitz  # PyMuPDF
+    image = io.BytesIO()
+    page.save(image, "JPEG", quality=OCR_JPEG_QUALITY)
+    with fitz.open("pdf", text_layer) as doc:
+        doc[0].insert_image(doc[0].rect, stream=image.getvalue(), overlay=False)
+        return doc.tobytes(garbage=3, deflate=True)
+
+def ocr_page(image_source: Union[bytes, str], lang: Optional[str] = None, known: Optional[Dict[str, str]] = None,
+             timeout: int = OCR_PAGE_TIMEOUT) -> bytes:
+    """
+    OCRs a single image (bytes, or a file path) into a one-page searchable PDF (image + invisible text layer).
+    Without `lang` the page's language is detected first (see choose_language).
+    Runs inside a pool worker; Tesseract is killed if it overruns `timeout`.
+    """
+    import pytesseract
+    try:
+        from backend.image_preprocess import OCR_PREPROCESS, ocr_input
+    except ModuleNotFoundError:
+        from image_preprocess import OCR_PREPROCESS, ocr_input
+    try:
+        with _open_image(image_source) as image:
+            if lang is None:
+                _, lang = choose_language(image, known)
+            if OCR_PREPROCESS:
+                # Tesseract reads the binarized copy; the page image stays grayscale
+                text_layer = pytesseract.image_to_pdf_or_hocr(ocr_input(image), extension='pdf', lang=lang,
+                                                              timeout=timeout, config="-c textonly_pdf=1")
+                return _under_text_layer(text_layer, image)
+            # Convert to PDF with standard OCR (this returns a PDF byte string)
+            # 'pdf' config makes it a searchable PDF
+            return pytesseract.image_to_pdf_or_hocr(image, extension='pdf', lang=lang, timeout=timeout)
+    except Exception as e:
+        # pytesseract's exceptions don't survive pickling back to the parent (it would mark the pool broken)
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+def convert_images_to_searchable_pdf(image_bytes_list: List[Union[bytes, str]],
+                                     on_page_done: Optional[Callable[[int, int, bool], None]] = None,
+                                     output_path: Optional[str] = None) -> Union[bytes, str]:
+    """
+    Converts a list of images (JPG/PNG bytes or file paths) into a single multi-page PDF.
     Crucially, it uses Tesseract to add a TEXT LAYER (HOCR) so PyMuPDF can read it later.
+    Pages are OCR'd in parallel; a page that fails or times out is dropped without sinking the others.
+    The first page's language decides the packs for the rest (pages in another script detect their own).
+    `on_page_done(page_number, total_pages, ok)` is called as each page is collected.
+    With `output_path` the PDF is written there (and the path returned) instead of returned as bytes.
     """
     pdf_pages = []
-    
-    for img_bytes in image_bytes_list:
+    total_pages = len(image_bytes_list)
+
+    def page_done(index: int, ok: bool):
+        if on_page_done:
+            on_page_done(index + 1, total_pages, ok)
+
+    if len(image_bytes_list) == 1:
+        # Not worth a round trip through the pool
         try:
-            image = Image.open(io.BytesIO(img_bytes))
-            # Convert to PDF with standard OCR (this returns a PDF byte string)
-            # 'pdf' config makes it a searchable PDF
-            # Added Greek (ell) and English (eng) support
-            pdf_page = pytesseract.image_to_pdf_or_hocr(image, extension='pdf', lang='ell+eng')
-            pdf_pages.append(pdf_page)
+            pdf_pages.append(ocr_page(image_bytes_list[0]))
+            page_done(0, True)
         except Exception as e:
             print(f"Error processing image: {e}")
-            continue
+            page_done(0, False)
+    else:
+        pages = {}
+        pending = list(range(len(image_bytes_list)))
+        known: Dict[str, str] = {}
+        for round_num in range(2):
+            # A worker that dies takes the whole pool down with it: rebuild once and retry the unfinished pages
+            pool = _get_pool()
+            if OCR_DETECT_LANG and not known:
+                try:
+                    script, lang = pool.submit(detect_page_language, image_bytes_list[0]).result(timeout=OCR_PAGE_TIMEOUT)
+                    known[script] = lang
+                    print(f"🔤 OCR language: {lang} ({script or 'unknown'} script)")
+                except Exception as e:
+                    # Each page detects for itself instead
+                    print(f"Language detection failed: {e}")
+            futures = {pool.submit(ocr_page, image_bytes_list[i], None, known): i for i in pending}
+            pending = []
+
+            # Every Tesseract call in a worker is killed at its own timeout, so a page is bounded where it runs.
+            # The parent only keeps one deadline for the whole batch, as a backstop for a wedged worker, and
+            # collects pages as they finish (they are put back in order below).
+            waves = -(-len(futures) // max(1, OCR_PROCESSES))
+            deadline = time.monotonic() + waves * (OCR_PAGE_TIMEOUT + 2 * OCR_DETECT_TIMEOUT) + 10
+            not_done = set(futures)
+            while not_done:
+                done, not_done = wait(not_done, timeout=max(0.0, deadline - time.monotonic()),
+                                      return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    i = futures[future]
+                    try:
+                        pages[i] = future.result()
+                        page_done(i, True)
+                    except BrokenProcessPool as e:
+                        print(f"Error processing image {i + 1}: OCR worker crashed ({e})")
+                        pending.append(i)
+                        if round_num == 1:
+                            page_done(i, False)
+                    except Exception as e:
+                        print(f"Error processing image {i + 1}: {e}")
+                        page_done(i, False)
+
+            for future in not_done:
+                i = futures[future]
+                print(f"Error processing image {i + 1}: OCR did not finish in time")
+                future.cancel()
+                page_done(i, False)
+            if not_done or pending:
+                # A wedged worker would hold its slot for later requests, a crashed one broke the pool
+                _reset_pool()
+            if not pending:
+                break
+
+        pdf_pages = [pages.pop(i) for i in sorted(pages)]
 
     if not pdf_pages:
         raise ValueError("No valid images could be processed.")
 
     # Merge individual PDF pages into one
     # Note: pytesseract returns raw bytes for each page's PDF.
-    # We need to merge them. simpler approach: 
-    # Use PyMuPDF to merge them? Or just use Pillow to save as PDF?
-    # Pillow save as PDF doesn't do OCR.
-    
-    # Better approach for Hackathon:
-    # Just return the first page for now if multiple? 
-    # Or simple concatenation of bytes? (PDF doesn't work like that).
-    
     # Let's use PyMuPDF to merge the PDF bytes.
     import fitz # PyMuPDF
-    
-    merged_doc = fitz.open()
-    
-    for pdf_data in pdf_pages:
-        # Open the PDF data stream
-        page_doc = fitz.open("pdf", pdf_data)
-        merged_doc.insert_pdf(page_doc)
-    
-    return merged_doc.tobytes()
+
+    with fitz.open() as merged_doc:
+        while pdf_pages:
+            # Open the PDF data stream; each page's bytes are let go once merged
+            with fitz.open("pdf", pdf_pages.pop(0)) as page_doc:
+                merged_doc.insert_pdf(page_doc)
+
+        if output_path:
+            merged_doc.save(output_path)
+            return output_path
+        return merged_doc.tobytes()
@@ -1,54 +1,427 @@
-import fitz  # PyMuPDF
-from typing import List, Dict, Optional
+import re
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, NamedTuple, Optional, Set, Tuple, Union
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+# --- Fuzzy Anchoring ---
+# When the LLM rewords a quote, align its tokens against the document instead of re-searching pages:
+# shared 3-grams vote for a diagonal (document offset - quote offset), then a banded edit distance
+# around the best diagonals picks the exact span. Cost per quote is bounded by its own length.
+SEED_NGRAM = 3
+MAX_SEED_POSTINGS = 64      # n-grams more frequent than this ("the terms of") are useless as anchors
+CANDIDATE_DIAGONALS = 3
+FUZZY_MIN_SCORE = 0.6       # below this the span is probably a different clause
+HIGH_CONFIDENCE_SCORE = 0.9
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+def _clean_snippet(snippet: str) -> str:
+    # Clean snippet: remove surrounding quotes that LLMs love to add
+    return " ".join(snippet.split()).strip('"').strip("'")
+
+def _align_tokens(text: str) -> List[str]:
+    # Punctuation and case are where paraphrases and PDF extraction disagree most; drop both
+    return [t for t in (_NON_WORD.sub("", w.casefold()) for w in text.split()) if t]
+
+def _semi_global_alignment(query: List[str], target: List[str]) -> Tuple[int, int, int]:
+    """
+    Token edit distance of the whole query against its best-matching substring of target.
+    Returns (distance, start, end) with target[start:end] being that substring.
+    """
+    n = len(target)
+    previous = [0] * (n + 1)            # free start: the match may begin anywhere in target
+    previous_start = list(range(n + 1))
+    for i, token in enumerate(query, start=1):
+        current = [i] + [0] * n
+        current_start = [0] + [0] * n
+        for j in range(1, n + 1):
+            substitute = previous[j - 1] + (0 if target[j - 1] == token else 1)
+            delete = previous[j] + 1
+            insert = current[j - 1] + 1
+            if substitute <= delete and substitute <= insert:
+                current[j], current_start[j] = substitute, previous_start[j - 1]
+            elif delete <= insert:
+                current[j], current_start[j] = delete, previous_start[j]
+            else:
+                current[j], current_start[j] = insert, current_start[j - 1]
+        previous, previous_start = current, current_start
+
+    end = min(range(n + 1), key=lambda j: previous[j])
+    return previous[end], previous_start[end], end
+
+# --- Clause Segmentation ---
+# A line opens a new clause when it looks like a heading: "Section 3 : Rent", "Article IV", "4.2 ...",
+# "1) ...", "(a) ...", or a short ALL-CAPS title. Bare numbers need their "." / ")" so that a wrapped
+# line starting with "30 days" doesn't split a paragraph.
+HEADING = re.compile(
+    r"^\s*(?:"
+    r"(?:section|article|clause|schedule|annex|§|art\.|άρθρο|αρθρο|artikel|artículo|articulo)\s*[\dIVXivx]+"
+    r"|\d+[.)]\s+\S"
+    r"|\d+(?:\.\d+)+\.?\s+\S"
+    r"|\([a-zA-Z0-9]{1,3}\)\s"
+    r")",
+    re.IGNORECASE
+)
+MAX_TITLE_CHARS = 80
+
+def is_heading(line: str) -> bool:
+    return bool(HEADING.match(line)) or is_title(line)
+
+def is_title(line: str) -> bool:
+    stripped = line.strip()
+    letters = sum(ch.isalpha() for ch in stripped)
+    return 2 <= letters and len(stripped) <= MAX_TITLE_CHARS and stripped == stripped.upper()
+
+class Clause(NamedTuple):
+    index: int
+    heading: str                            # line that opened the clause ("" for text before the first heading)
+    start: int                              # PDFWordIndex.text[start:end] is the clause
+    end: int
+    pages: List[int]
+    boxes: List[Tuple[int, List[float]]]    # (page, [x, y, w, h]) per text block the clause touches
+    words: range                            # word ids, for highlighting without a search
+
+class PDFWordIndex:
+    """
+    Everything later stages need from a PDF, extracted in a single pass over its pages:
+    the plain text for the LLM, and every word with its bounding box for highlighting.
+
+    Words are also joined (case-folded, single-spaced) into `search_text`, so locating a quote
+    is a string scan over one buffer instead of a page.search_for() per page per quote.
+
+    `clauses` segments `text` at headings and numbering, with offsets, pages, block boxes and word ids.
+    """
+
+    def __init__(self, source: Union[bytes, str]):
+        self.page_texts: List[str] = []
+        # One entry per text block: (page_number, block_no, text, [x0, y0, x1, y1])
+        self.blocks: List[Tuple] = []
+        # One entry per word: (page_number, x0, y0, x1, y1, block_no, line_no)
+        self.words: List[Tuple] = []
+        self.word_starts: List[int] = []   # offset of each word in search_text
+
+        tokens = []
+        offset = 0
+        import fitz  # PyMuPDF (imported on first use: keeps it off the server's startup path)
+        # A path is opened in place: PyMuPDF reads the file as needed instead of holding a copy of it
+        doc = fitz.open(source, filetype="pdf") if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+        try:
+            for page_num, page in enumerate(doc, start=1):
+                # Both views come from the same text page, so the PDF is only decoded once
+                textpage = page.get_textpage()
+                self.page_texts.append(page.get_text("text", textpage=textpage))
+                for x0, y0, x1, y1, block_text, block_no, block_type in page.get_text("blocks", textpage=textpage):
+                    if block_type == 0:
+                        self.blocks.append((page_num, block_no, block_text, [x0, y0, x1, y1]))
+                for x0, y0, x1, y1, word, block_no, line_no, _ in page.get_text("words", textpage=textpage):
+                    token = word.casefold()
+                    self.words.append((page_num, x0, y0, x1, y1, block_no, line_no))
+                    self.word_starts.append(offset)
+                    tokens.append(token)
+                    offset += len(token) + 1
+        finally:
+            doc.close()
+
+        self.search_text = " ".join(tokens)
+        self.word_ends = [start + len(token) for start, token in zip(self.word_starts, tokens)]
+
+        # Built on the first fuzzy lookup only
+        self._align_tokens: List[str] = []
+        self._align_word_ids: List[int] = []
+        self._seed_index: Optional[Dict[Tuple[str, ...], List[int]]] = None
+        self._clauses: Optional[List[Clause]] = None
+        self._clause_first_words: List[int] = []
+        self._running_headers: Set[str] = set()
+
+    def _build_seed_index(self):
+        for word_id, token in enumerate(self.search_text.split(" ")):
+            token = _NON_WORD.sub("", token)
+            if token:
+                self._align_tokens.append(token)
+                self._align_word_ids.append(word_id)
+
+        self._seed_index = {}
+        tokens = self._align_tokens
+        for pos in range(len(tokens) - SEED_NGRAM + 1):
+            self._seed_index.setdefault(tuple(tokens[pos:pos + SEED_NGRAM]), []).append(pos)
+
+    def fuzzy_find(self, snippet: str):
+        """
+        Best approximate occurrence of a (possibly paraphrased) quote.
+        Returns (word ids, score in [0, 1]) or None when nothing scores above FUZZY_MIN_SCORE.
+        """
+        query = _align_tokens(snippet)
+        if len(query) < SEED_NGRAM:
+            return None
+        if self._seed_index is None:
+            self._build_seed_index()
+
+        # 1. Seeds vote for diagonals
+        votes: Dict[int, int] = {}
+        for i in range(len(query) - SEED_NGRAM + 1):
+            postings = self._seed_index.get(tuple(query[i:i + SEED_NGRAM]))
+            if not postings or len(postings) > MAX_SEED_POSTINGS:
+                continue
+            for pos in postings:
+                votes[pos - i] = votes.get(pos - i, 0) + 1
+        if not votes:
+            return None
+
+        # 2. Banded alignment around the strongest diagonals
+        band = max(4, len(query) // 4)
+        best = None
+        for diagonal in sorted(votes, key=votes.get, reverse=True)[:CANDIDATE_DIAGONALS]:
+            window_start = max(0, diagonal - band)
+            window = self._align_tokens[window_start:diagonal + len(query) + band]
+            distance, start, end = _semi_global_alignment(query, window)
+            score = 1 - distance / len(query)
+            if end > start and (best is None or score > best[0]):
+                best = (score, window_start + start, window_start + end)
+
+        if best is None or best[0] < FUZZY_MIN_SCORE:
+            return None
+        score, start, end = best
+        word_ids = range(self._align_word_ids[start], self._align_word_ids[end - 1] + 1)
+        return word_ids, score
+
+    @property
+    def text(self) -> str:
+        return "".join(page_text + "\n" for page_text in self.page_texts)
+
+    def _line_spans(self):
+        """
+        Yields (text offset, line text, page, block_no, line_no) for every line, in reading order.
+        Block texts are consecutive slices of the page text, so offsets come from a running sum.
+        """
+        page_offsets = {}
+        offset = 0
+        for page_num, page_text in enumerate(self.page_texts, start=1):
+            page_offsets[page_num] = offset
+            offset += len(page_text) + 1
+
+        cursor: Dict[int, int] = {}
+        for page_num, block_no, block_text, _ in self.blocks:
+            page_text = self.page_texts[page_num - 1]
+            start = cursor.get(page_num, 0)
+            if not page_text.startswith(block_text, start):
+                # Not laid out back to back (unusual text modes): find it instead
+                found = page_text.find(block_text, start)
+                if found == -1:
+                    continue
+                start = found
+            cursor[page_num] = start + len(block_text)
+
+            line_offset = page_offsets[page_num] + start
+            for line_no, line in enumerate(block_text.split("\n")):
+                yield line_offset, line, page_num, block_no, line_no
+                line_offset += len(line) + 1
+
+    def _segment(self) -> List[Clause]:
+        line_boxes: Dict[Tuple[int, int, int], List[float]] = {}
+        line_words: Dict[Tuple[int, int, int], List[int]] = {}
+        for word_id, (page_num, x0, y0, x1, y1, block_no, line_no) in enumerate(self.words):
+            key = (page_num, block_no, line_no)
+            box = line_boxes.get(key)
+            if box is None:
+                line_boxes[key] = [x0, y0, x1, y1]
+                line_words[key] = [word_id, word_id + 1]
+            else:
+                box[0], box[1] = min(box[0], x0), min(box[1], y0)
+                box[2], box[3] = max(box[2], x1), max(box[3], y1)
+                line_words[key][1] = word_id + 1
+
+        # Open clauses as (heading, start, {(page, block): box}, [first word, end word])
+        drafts = []
+        seen_titles = set()
+        for offset, line, page_num, block_no, line_no in self._line_spans():
+            stripped = line.strip()
+            if not stripped:
+                continue
+            heading = bool(HEADING.match(line))
+            if not heading and is_title(line):
+                # A title seen before is a running page header, not a new clause
+                heading = stripped not in seen_titles
+                if not heading:
+                    self._running_headers.add(stripped)
+                seen_titles.add(stripped)
+            if heading or not drafts:
+                drafts.append((stripped if heading else "", offset, {}, [None, None]))
+            _, _, boxes, word_span = drafts[-1]
+
+            key = (page_num, block_no, line_no)
+            if key in line_boxes:
+                x0, y0, x1, y1 = line_boxes[key]
+                box = boxes.get((page_num, block_no))
+                if box is None:
+                    boxes[(page_num, block_no)] = [x0, y0, x1, y1]
+                else:
+                    box[0], box[1] = min(box[0], x0), min(box[1], y0)
+                    box[2], box[3] = max(box[2], x1), max(box[3], y1)
+                first, end = line_words[key]
+                word_span[0] = first if word_span[0] is None else min(word_span[0], first)
+                word_span[1] = end if word_span[1] is None else max(word_span[1], end)
+
+        # Clauses tile the text: each one runs to the next one's start, the first starts at 0
+        text_length = sum(len(page_text) + 1 for page_text in self.page_texts)
+        clauses = []
+        for index, (heading, start, boxes, word_span) in enumerate(drafts):
+            end = drafts[index + 1][1] if index + 1 < len(drafts) else text_length
+            first_word, end_word = word_span if word_span[0] is not None else (0, 0)
+            clauses.append(Clause(
+                index=index,
+                heading=heading,
+                start=0 if index == 0 else start,
+                end=end,
+                pages=sorted({page for page, _ in boxes}),
+                boxes=[(page, [b[0], b[1], b[2] - b[0], b[3] - b[1]]) for (page, _), b in boxes.items()],
+                words=range(first_word, end_word)
+            ))
+        if not clauses and text_length:
+            clauses.append(Clause(0, "", 0, text_length, [], [], range(0)))
+        return clauses
+
+    @property
+    def clauses(self) -> List[Clause]:
+        if self._clauses is None:
+            self._clauses = self._segment()
+            self._clause_first_words = [clause.words.start for clause in self._clauses]
+        return self._clauses
+
+    @property
+    def running_headers(self) -> Set[str]:
+        """
+        Title lines repeated on later pages. They land inside whichever clause a page break falls in.
+        """
+        self.clauses
+        return self._running_headers
+
+    def clause_texts(self) -> List[str]:
+        """
+        The text split along `clauses`; "".join() of it is exactly `text`.
+        """
+        text = self.text
+        return [text[clause.start:clause.end] for clause in self.clauses]
+
+    def clause_for_word(self, word_id: int) -> Optional[Clause]:
+        clauses = self.clauses
+        position = bisect_right(self._clause_first_words, word_id) - 1
+        return clauses[position] if position >= 0 else None
+
+    def span_to_words(self, start: int, end: int) -> range:
+        """
+        Indices of the words overlapping search_text[start:end].
+        """
+        first = bisect_right(self.word_ends, start)
+        last = bisect_left(self.word_starts, end)
+        return range(first, last)
+
+    def rects_for_words(self, word_ids: range) -> List[Tuple[int, List[float]]]:
+        """
+        One rectangle per text line covered by the words, like page.search_for() returns.
+        """
+        lines: Dict[Tuple, List[float]] = {}
+        for word_id in word_ids:
+            page_num, x0, y0, x1, y1, block_no, line_no = self.words[word_id]
+            key = (page_num, block_no, line_no)
+            box = lines.get(key)
+            if box is None:
+                lines[key] = [x0, y0, x1, y1]
+            else:
+                box[0], box[1] = min(box[0], x0), min(box[1], y0)
+                box[2], box[3] = max(box[2], x1), max(box[3], y1)
+        return [(key[0], [b[0], b[1], b[2] - b[0], b[3] - b[1]]) for key, b in lines.items()]
+
+    def find_all(self, patterns: List[str]) -> Dict[str, List[Tuple[int, int]]]:
+        """
+        Locates every occurrence of every pattern in one regex scan of search_text.
+        The alternation sits inside a lookahead so overlapping quotes are all reported.
+        """
+        unique = sorted({p for p in patterns if p}, key=len, reverse=True)
+        hits: Dict[str, List[Tuple[int, int]]] = {p: [] for p in unique}
+        if not unique:
+            return hits
+
+        # A quote that is a prefix of a longer one would lose every offset the two share (the scan reports
+        # one match per offset, the longer), so those are located with str.find instead
+        ordered = sorted(unique)
+        prefixes = {p for p, following in zip(ordered, ordered[1:]) if following.startswith(p)}
+        scanned = [p for p in unique if p not in prefixes]
+
+        if scanned:
+            scanner = re.compile("(?=(" + "|".join(re.escape(p) for p in scanned) + "))")
+            for match in scanner.finditer(self.search_text):
+                found = match.group(1)
+                hits[found].append((match.start(), match.start() + len(found)))
+
+        for pattern in prefixes:
+            spans = hits[pattern]
+            start = self.search_text.find(pattern)
+            while start != -1:
+                spans.append((start, start + len(pattern)))
+                start = self.search_text.find(pattern, start + 1)
+        return hits
+
+    def locate(self, text_snippets: List[str]) -> List[Dict]:
+        """
+        Finds the trap quotes and returns records with 'text', 'page', 'rect' (x, y, w, h),
+        'confidence' ("high" / "partial"), 'score' (1.0 for a literal match) and 'clause' (index into `clauses`).
+        """
+        patterns = {snippet: _clean_snippet(snippet).casefold() for snippet in text_snippets}
+        hits = self.find_all(list(patterns.values()))
+
+        results = []
+        for snippet in text_snippets:
+            matched = []   # (word ids, score)
+            for start, end in hits.get(patterns[snippet], []):
+                matched.append((self.span_to_words(start, end), 1.0))
+
+            if not matched:
+                # Fallback: the LLM reworded the quote; align it instead
+                fuzzy = self.fuzzy_find(patterns[snippet])
+                if fuzzy:
+                    matched.append(fuzzy)
+
+            snippet_matches = []
+            for word_ids, score in matched:
+                clause = self.clause_for_word(word_ids.start) if word_ids else None
+                for page_num, rect in self.rects_for_words(word_ids):
+                    snippet_matches.append({
+                        "text": snippet,
+                        "page": page_num,
+                        "rect": rect,
+                        "confidence": "high" if score >= HIGH_CONFIDENCE_SCORE else "partial",
+                        "score": round(score, 3),
+                        "clause": clause.index if clause else None
+                    })
+
+            if not snippet_matches:
+                # Fallback: Tag as not found
+                results.append({
+                    "text": snippet,
+                    "found": False
+                })
+            else:
+                results.extend(snippet_matches)
+
+        return results
+
+def parse_pdf(source: Union[bytes, str]) -> PDFWordIndex:
+    """
+    Single pass over the PDF (bytes, or a file path); pass the result to extract_text_from_pdf / get_coordinates_for_text.
+    """
+    return PDFWordIndex(source)
+
+def _as_index(document: Union[bytes, PDFWordIndex]) -> PDFWordIndex:
+    return document if isinstance(document, PDFWordIndex) else PDFWordIndex(document)
+
+def extract_text_from_pdf(document: Union[bytes, PDFWordIndex]) -> str:
     """
     Extracts full text from a PDF file for the LLM to analyze.
     """
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
-    full_text = ""
-    for page in doc:
-        full_text += page.get_text() + "\n"
-    return full_text
+    return _as_index(document).text
 
-def get_coordinates_for_text(file_bytes: bytes, text_snippets: List[str]) -> List[Dict]:
+def get_coordinates_for_text(document: Union[bytes, PDFWordIndex], text_snippets: List[str]) -> List[Dict]:
     """
     Searches for specific text snippets in the PDF and returns their coordinates.
     Returns a list of objects with 'text', 'page', and 'rect' (x, y, w, h).
     """
-    doc = fitz.open(stream=file_bytes, filetype="pdf")
-    results = []
-
-    for snippet in text_snippets:
-        # Clean snippet: remove surrounding quotes that LLMs love to add
-        clean_snippet = " ".join(snippet.split()).strip('"').strip("'")
-        
-        snippet_matches = []
-        for page_num, page in enumerate(doc):
-            # Attempt 1: Exact search of the full cleaned snippet
-            rects = page.search_for(clean_snippet)
-            
-            # Attempt 2: Fallback - Search for just the first 60 characters
-            # This handles cases where the LLM paraphrased the end or there's a weird line break issue later on.
-            if not rects and len(clean_snippet) > 60:
-                short_snippet = clean_snippet[:60]
-                rects = page.search_for(short_snippet)
-            
-            for rect in rects:
-                snippet_matches.append({
-                    "text": snippet,
-                    "page": page_num + 1,
-                    "rect": [rect.x0, rect.y0, rect.width, rect.height],
-                    "confidence": "high" if len(clean_snippet) < 60 or rects == page.search_for(clean_snippet) else "partial"
-                })
-        
-        if not snippet_matches:
-            # Fallback: Tag as not found
-             results.append({
-                "text": snippet,
-                "found": False
-            })
-        else:
-            results.extend(snippet_matches)
-            
-    return results
+    return _as_index(document).locate(text_snippets)
@@ -0,0 +1,200 @@
+import os
+import re
+import unicodedata
+from typing import Dict, List, Tuple
+
+# --- Deterministic Pre-Screen ---
+# Most of the SYSTEM_PROMPT taxonomy has a lexical footprint ("sole discretion", "binding arbitration",
+# "auto-renew", "$", "%"...). Every clause is scored with one compiled alternation (one left-to-right
+# pass per clause, so linear in the document). Patterns match at word starts. Only clauses at or above PRESCREEN_MIN_SCORE, plus
+# PRESCREEN_CONTEXT neighbours on each side, are sent to the model.
+# Recall safety:
+#   - the threshold is low on purpose (one strong phrase, or weak hits in two categories)
+#   - short documents skip the pre-screen entirely
+#   - if most of the document is flagged anyway, it is sent whole
+# benchmark_prescreen.py measures the recall cost against gotchai_goldens.csv.
+#
+# Patterns are matched against case-folded, accent-stripped text, so they are written in plain lowercase
+# ASCII / unaccented Greek. Covered: English, Greek, German, Spanish, French.
+
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "1") != "0"
+PRESCREEN_MIN_SCORE = int(os.getenv("PRESCREEN_MIN_SCORE", "2"))
+PRESCREEN_CONTEXT = int(os.getenv("PRESCREEN_CONTEXT", "1"))          # neighbouring clauses kept on each side
+PRESCREEN_MIN_CHARS = int(os.getenv("PRESCREEN_MIN_CHARS", "6000"))   # shorter documents are sent whole
+PRESCREEN_MAX_KEEP = float(os.getenv("PRESCREEN_MAX_KEEP", "0.7"))    # above this kept fraction, send everything
+
+# Marks text the pre-screen left out, so the model doesn't read two distant clauses as one
+GAP_MARKER = "\n\n[...]\n\n"
+
+# Bump when the patterns change: audit caches key on it
+PATTERNS_VERSION = "1"
+
+# category -> [(pattern, weight)]. Weight 2: a phrase that is a trap signal on its own. Weight 1: a hint.
+PATTERNS: Dict[str, List[Tuple[str, int]]] = {
+    "unilateral_change": [
+        (r"(?:sole|absolute|own) discretion", 2),
+        (r"at any time", 2),
+        (r"without (?:prior |advance |any )?notice", 2),
+        (r"reserves? the right", 2),
+        (r"subject to change", 2),
+        (r"(?:may|can|will) (?:be )?(?:adjust|chang|modif|amend|updat|increas|revis)\w*", 2),
+        (r"continued use", 2),
+        (r"κατα την (?:απολυτη )?κριση", 2), (r"οποτεδηποτε", 2), (r"χωρις (?:προηγουμενη )?(?:ειδοποιηση|ενημερωση)", 2),
+        (r"επιφυλασσεται", 2), (r"δικαιουται να (?:τροποποιει|μεταβαλλει|αναπροσαρμοζει)", 2),
+        (r"jederzeit", 2), (r"ohne (?:vorherige )?(?:ankundigung|mitteilung)", 2), (r"(?:nach )?eigenem ermessen", 2),
+        (r"behalt sich", 2), (r"vorbehalten", 1),
+        (r"en cualquier momento", 2), (r"sin (?:previo )?aviso", 2), (r"a su (?:sola )?discrecion", 2), (r"se reserva el derecho", 2),
+        (r"a tout moment", 2), (r"sans preavis", 2), (r"a (?:sa|notre) (?:seule )?discretion", 2), (r"se reserve le droit", 2),
+    ],
+    "fees": [
+        (r"fees?\b", 1), (r"charges?\b", 1), (r"surcharge", 2), (r"penalt", 2), (r"interest", 1), (r"\brates?\b", 1),
+        (r"prices?\b", 1), (r"(?:\$|€|£|usd|eur)\s?\d", 1), (r"\d+(?:[.,]\d+)?\s?%", 1),
+        (r"(?:inactivity|dormant|convenience|processing|administrative|statement|junk|service|exit|termination|late|foreign transaction) fee", 2),
+        (r"χρεωσ", 1), (r"προμηθει", 1), (r"τελ(?:ος|η) ", 1), (r"ποιν", 2), (r"τοκ(?:ος|ου|οι)", 1), (r"τιμ(?:η|ες|ων)\b", 1),
+        (r"gebuhr", 1), (r"zinsen", 1), (r"preis", 1), (r"vertragsstrafe", 2),
+        (r"cargos?\b", 1), (r"comision", 1), (r"tarifa", 1), (r"penalizacion", 2), (r"intereses", 1),
+        (r"frais", 1), (r"penalite", 2), (r"interets", 1), (r"tarif", 1),
+    ],
+    "renewal": [
+        (r"auto(?:matic(?:ally)?)?[- ]?renew", 2), (r"renews? automatically", 2), (r"\brenew", 1),
+        (r"minimum (?:term|period|commitment)", 2), (r"\d+[- ](?:month|year|monat|jahr|μην|ετ|mes|ano|mois|an)", 1),
+        (r"then[- ]current", 2), (r"non[- ]promotional", 2),
+        (r"αυτοματη ανανεωση", 2), (r"ανανε", 1), (r"ελαχιστη διαρκεια", 2),
+        (r"automatisch\w* verlangerung", 2), (r"verlangerung", 1), (r"automatisch", 1), (r"mindestlaufzeit", 2),
+        (r"renovacion automatica", 2), (r"renovacion", 1), (r"permanencia", 2),
+        (r"reconduction", 2), (r"tacite", 1), (r"renouvel", 1),
+    ],
+    "cancellation": [
+        (r"cancel", 1), (r"terminat", 1), (r"notari[sz]", 2), (r"certified mail", 2), (r"registered (?:mail|letter)", 2),
+        (r"retention", 2), (r"phone call", 2), (r"(?:days?|months?) (?:in advance|prior|notice)", 2),
+        (r"notice period", 1), (r"in writing", 1), (r"suspend", 2), (r"for any reason", 2), (r"grounds for (?:a )?(?:ban|termination|suspension)", 2),
+        (r"strictly prohibited", 2), (r"prohibit", 1), (r"\bban\b", 1),
+        (r"καταγγελ", 1), (r"ακυρωσ", 1), (r"λυση της συμβασης", 1), (r"αναστολ", 2),
+        (r"kundigung", 1), (r"sperr", 1),
+        (r"cancelacion", 1), (r"rescision", 1), (r"baja", 1),
+        (r"resiliation", 1), (r"suspen", 1),
+    ],
+    "early_exit": [
+        (r"early (?:exit|termination|cancellation)", 2), (r"remaining (?:months|payments|balance|term)", 2),
+        (r"liquidated damages", 2), (r"accelerat", 2), (r"immediately (?:due|payable)", 2), (r"pay all", 1),
+        (r"προωρ", 2), (r"υπολοιπ(?:α|ες) (?:μηνιαι|δοσ)", 2),
+        (r"vorzeitig", 2), (r"anticipad", 2), (r"anticipee", 2),
+    ],
+    "data": [
+        (r"(?:share|sell|disclose|transfer|provide|monetiz)\w* (?:your |the )?(?:personal |transaction |browsing |location )?(?:data|information|history)", 2),
+        (r"third[- ]part", 2), (r"affiliate", 1), (r"partners?\b", 1), (r"\bsell\b", 2), (r"\btrack", 2),
+        (r"location data", 2), (r"cookies?", 1), (r"browsing", 2), (r"contact list", 2), (r"advertis|ad targeting", 1),
+        (r"jurisdiction", 1), (r"servers? (?:located|based)", 2), (r"personal (?:data|information)", 1), (r"privacy", 1),
+        (r"προσωπικα δεδομενα", 1), (r"τριτ(?:ους|ων|α μερη)", 2), (r"διαβιβασ", 2), (r"γεωεντοπισ", 2),
+        (r"(?:personenbezogene )?daten", 1), (r"dritte", 2), (r"weitergeb", 2),
+        (r"datos personales", 1), (r"terceros", 2), (r"ceder", 1),
+        (r"donnees", 1), (r"\btiers\b", 2),
+    ],
+    "liability": [
+        (r"as is\b", 2), (r"warrant", 1), (r"\bliab", 1), (r"not (?:be )?(?:liable|responsible)", 2),
+        (r"indemnif", 2), (r"hold (?:\w+ )?harmless", 2), (r"consequential", 2), (r"lost profits", 2),
+        (r"(?:own|its) negligence", 2), (r"at your own risk", 2),
+        (r"ευθυν", 1), (r"αποζημιω", 1), (r"δεν φερει (?:καμια )?ευθυνη", 2),
+        (r"haftung", 1), (r"haftet nicht", 2), (r"freistell", 2),
+        (r"responsabilidad", 1), (r"indemniz", 2),
+        (r"responsabilite", 1), (r"indemnis", 2), (r"garantie", 1),
+    ],
+    "disputes": [
+        (r"arbitrat", 2), (r"class action", 2), (r"jury", 2), (r"\bwaive", 2), (r"dispute", 1),
+        (r"within \d+ days", 1), (r"permanently (?:waived|barred)", 2), (r"exclusive (?:venue|jurisdiction)", 2),
+        (r"διαιτησ", 2), (r"συλλογικ\w* αγωγ", 2), (r"παραιτ", 2),
+        (r"schieds", 2), (r"sammelklage", 2), (r"verzicht", 2),
+        (r"arbitraje", 2), (r"demanda colectiva", 2), (r"renuncia", 2),
+        (r"arbitrage", 2), (r"action collective", 2), (r"renonce", 2),
+    ],
+    "ip": [
+        (r"perpetual", 2), (r"irrevocable", 2), (r"royalty[- ]free", 2), (r"worldwide", 1), (r"licen[cs]e", 1),
+        (r"ownership", 2), (r"intellectual property", 1), (r"(?:ideas|suggestions|feedback)\b", 1),
+        (r"αμετακλητ", 2), (r"πνευματικ\w* ιδιοκτησ", 1),
+        (r"unwiderruflich", 2), (r"nutzungsrecht", 1),
+        (r"irrevocabl", 2), (r"perpetu", 2),
+    ],
+}
+
+def _compile(patterns: Dict[str, List[Tuple[str, int]]]):
+    entries = []
+    for category, items in patterns.items():
+        for pattern, weight in items:
+            # Final sigma folds to σ
+            entries.append((re.compile(pattern.replace("ς", "σ")), category, weight))
+    # One non-capturing alternation, anchored at word starts (or a currency sign), finds the hits.
+    # Capture groups per alternative would tell us which one fired, but make every failed branch pay
+    # for ~200 marks (~25x slower); hits are rare, so they are attributed by re-matching at their position.
+    scanner = re.compile(r"(?:\b|(?=[$€£]))(?:" + "|".join(f"(?:{pattern.pattern})" for pattern, _, _ in entries) + ")")
+    return scanner, entries
+
+_SCANNER, _ENTRIES = _compile(PATTERNS)
+
+def fold(text: str) -> str:
+    """
+    Case-folds and strips accents ("Verlängerung" -> "verlangerung", "Ανανέωση" -> "ανανεωση").
+    """
+    decomposed = unicodedata.normalize("NFD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def score_clause(clause: str) -> Tuple[int, List[str]]:
+    """
+    Sums the strongest hit of each category. Returns (score, categories that fired).
+    """
+    text = fold(clause)
+    best: Dict[str, int] = {}
+    for match in _SCANNER.finditer(text):
+        for pattern, category, weight in _ENTRIES:
+            if weight > best.get(category, 0) and pattern.match(text, match.start()):
+                best[category] = weight
+    return sum(best.values()), sorted(best)
+
+def select_clauses(clauses: List[str], min_score: int = PRESCREEN_MIN_SCORE, context: int = PRESCREEN_CONTEXT) -> List[int]:
+    """
+    Indices of the clauses to audit: every clause scoring >= min_score, widened by `context` on each side.
+    """
+    keep = set()
+    for i, clause in enumerate(clauses):
+        if score_clause(clause)[0] >= min_score:
+            keep.update(range(max(0, i - context), min(len(clauses), i + context + 1)))
+    return sorted(keep)
+
+def prescreen_clauses(clauses: List[str], min_score: int = PRESCREEN_MIN_SCORE, context: int = PRESCREEN_CONTEXT,
+                      min_chars: int = PRESCREEN_MIN_CHARS, max_keep: float = PRESCREEN_MAX_KEEP) -> Tuple[List[str], int]:
+    """
+    The clauses to send to the model, in order, with GAP_MARKER entries where others were dropped,
+    and the number of clauses kept. Falls back to every clause when the document is short or mostly suspicious.
+    """
+    total_chars = sum(len(clause) for clause in clauses)
+    if total_chars < min_chars:
+        return list(clauses), len(clauses)
+
+    kept = select_clauses(clauses, min_score, context)
+    kept_chars = sum(len(clauses[i]) for i in kept)
+    if kept_chars > max_keep * total_chars:
+        return list(clauses), len(clauses)
+
+    parts = []
+    previous = -1
+    for i in kept:
+        if i != previous + 1:
+            parts.append(GAP_MARKER)
+        parts.append(clauses[i])
+        previous = i
+    if kept and previous != len(clauses) - 1:
+        parts.append(GAP_MARKER)
+    return parts, len(kept)
+
+def prescreen(clauses: List[str], min_score: int = PRESCREEN_MIN_SCORE, context: int = PRESCREEN_CONTEXT,
+              min_chars: int = PRESCREEN_MIN_CHARS, max_keep: float = PRESCREEN_MAX_KEEP) -> Tuple[str, int]:
+    """
+    prescreen_clauses() joined into the text to send to the model.
+    """
+    parts, kept = prescreen_clauses(clauses, min_score, context, min_chars, max_keep)
+    return "".join(parts), kept
+
+def prescreen_fingerprint() -> str:
+    # Everything that changes what the model gets to see
+    if not PRESCREEN_ENABLED:
+        return "off"
+    return f"{PATTERNS_VERSION}:{PRESCREEN_MIN_SCORE}:{PRESCREEN_CONTEXT}:{PRESCREEN_MIN_CHARS}:{PRESCREEN_MAX_KEEP}"
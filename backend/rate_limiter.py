@@ -0,0 +1,206 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+
+# --- LLM Rate Limiter (token bucket, SQLite-shared) ---
+# Two buckets: requests per minute and tokens per minute. They are stored in one SQLite row, so every
+# uvicorn worker, job worker and eval script on the box draws from the same budget.
+# Callers reserve up front: the bucket may go negative, and the caller sleeps until the debt is paid.
+# Waiters therefore queue in arrival order instead of hammering the provider and failing.
+# A 429 pushes a shared "blocked until" time (from Retry-After) and zeroes the buckets: our estimate of
+# the remaining quota was wrong.
+
+BASE_DIR = Path(__file__).parent
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", str(BASE_DIR / "ratelimit.db"))
+LLM_RPM = float(os.getenv("LLM_RPM", "60"))
+LLM_TPM = float(os.getenv("LLM_TPM", "200000"))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "300"))  # seconds a caller may queue before giving up
+
+# Completion tokens budgeted per call before the real usage is known (settled afterwards)
+COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "1500"))
+
+# 429 without a usable Retry-After header
+DEFAULT_BACKOFF_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap prompt-size estimate (~4 characters per token for English; Greek runs denser, so this errs high).
+    """
+    return len(text) // 4 + 1
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    Seconds to back off if `error` is a provider 429, else None. Reads Retry-After / retry-after-ms.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return DEFAULT_BACKOFF_SECONDS
+
+
+class RateLimitTimeout(Exception):
+    """
+    Raised when a caller would have to queue longer than RATE_LIMIT_MAX_WAIT.
+    """
+
+
+class RateLimiter:
+    def __init__(self, path: str = RATE_LIMIT_DB, rpm: float = LLM_RPM, tpm: float = LLM_TPM,
+                 max_wait: float = RATE_LIMIT_MAX_WAIT, name: str = "llm"):
+        self.path = path
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self.name = name
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.execute(
+            "INSERT OR IGNORE INTO buckets (name, requests, tokens, updated) VALUES (?, ?, ?, ?)",
+            (name, rpm, tpm, time.time())
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads: one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, fn):
+        # Refill both buckets to `now`, let fn adjust them, write back. One short write transaction.
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            requests, tokens, updated, blocked_until = conn.execute(
+                "SELECT requests, tokens, updated, blocked_until FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            elapsed = max(0.0, now - updated)
+            # Capacity is one minute of quota: an idle minute doesn't buy a burst bigger than that
+            requests = min(self.rpm, requests + elapsed * self.rpm / 60)
+            tokens = min(self.tpm, tokens + elapsed * self.tpm / 60)
+            requests, tokens, blocked_until, result = fn(now, requests, tokens, blocked_until)
+            conn.execute(
+                "UPDATE buckets SET requests = ?, tokens = ?, updated = ?, blocked_until = ? WHERE name = ?",
+                (requests, tokens, now, blocked_until, self.name)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Takes one request and `tokens` from the buckets. Returns how long to sleep before sending.
+        """
+        # A single call bigger than a minute's quota can still go through, once the bucket is full
+        tokens = min(tokens, self.tpm)
+
+        def take(now, requests, available, blocked_until):
+            wait = max(0.0, blocked_until - now)
+            if self.rpm > 0 and requests < 1:
+                wait = max(wait, (1 - requests) * 60 / self.rpm)
+            if self.tpm > 0 and available < tokens:
+                wait = max(wait, (tokens - available) * 60 / self.tpm)
+            if wait > self.max_wait:
+                return requests, available, blocked_until, None
+            return requests - 1, available - tokens, blocked_until, wait
+
+        wait = self._update(take)
+        if wait is None:
+            raise RateLimitTimeout(f"LLM rate limit: would have to wait more than {self.max_wait:.0f}s")
+        return wait
+
+    def acquire(self, tokens: int):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        wait = await asyncio.to_thread(self.reserve, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def settle(self, reserved: int, actual: int):
+        """
+        Corrects a reservation once the provider reports real usage (refunds or charges the difference).
+        """
+        if not actual:
+            return
+        delta = min(reserved, self.tpm) - actual
+        self._update(lambda now, requests, tokens, blocked_until: (requests, min(self.tpm, tokens + delta), blocked_until, None))
+
+    def backoff(self, seconds: float):
+        """
+        The provider said 429: nobody sends for `seconds`, and the buckets restart from empty.
+        """
+        def block(now, requests, tokens, blocked_until):
+            return min(requests, 0.0), min(tokens, 0.0), max(blocked_until, now + seconds), None
+        self._update(block)
+
+
+class _NoLimit(RateLimiter):
+    # RATE_LIMIT_ENABLED=0: no budget, but a 429's Retry-After is still honoured (in this process only)
+    def __init__(self):
+        self._blocked_until = 0.0
+
+    def reserve(self, tokens: int) -> float:
+        return max(0.0, self._blocked_until - time.time())
+
+    def settle(self, reserved: int, actual: int):
+        pass
+
+    def backoff(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.time() + seconds)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter() if RATE_LIMIT_ENABLED else _NoLimit()
+    return _limiter
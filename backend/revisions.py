@@ -0,0 +1,231 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# --- Revision Store (SQLite, WAL mode) ---
+# Users come back with version 2 of a contract after a negotiation round. Every audited document is filed
+# here as the ordered fingerprints of its clauses plus its findings (each with the clauses it was quoted from).
+# A new upload that shares most of its clause fingerprints with an earlier document from the same client
+# is treated as a revision of it: the two are diffed clause by clause, only added and changed clauses are
+# audited, and findings that sat entirely in unchanged clauses are carried forward (their coordinates are
+# mapped onto the new PDF like any other finding). Re-audit cost follows the size of the edit.
+#
+# Fingerprints ignore whitespace, case, the clause's own number and running page headers, so inserting a clause
+# (which renumbers everything after it and moves the page breaks) only counts as one change.
+# Nothing but hashes and findings is stored.
+
+BASE_DIR = Path(__file__).parent
+REVISIONS_ENABLED = os.getenv("REVISIONS_ENABLED", "1") != "0"
+REVISION_DB = os.getenv("REVISION_DB", str(BASE_DIR / "revisions.db"))
+REVISION_MIN_SHARED = float(os.getenv("REVISION_MIN_SHARED", "0.5"))  # share of clauses two versions must have in common
+REVISION_TTL_SECONDS = int(os.getenv("REVISION_TTL_HOURS", "720")) * 3600
+
+# Candidates considered per lookup, and how often old documents are pruned (every N records)
+MAX_CANDIDATES = 5
+PRUNE_EVERY = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    text_key TEXT NOT NULL,
+    client TEXT NOT NULL,
+    version TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    clauses TEXT NOT NULL,
+    traps TEXT NOT NULL,
+    PRIMARY KEY (client, text_key)
+);
+CREATE TABLE IF NOT EXISTS clause_postings (
+    client TEXT NOT NULL,
+    clause TEXT NOT NULL,
+    text_key TEXT NOT NULL,
+    PRIMARY KEY (client, clause, text_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS documents_created ON documents (created_at);
+"""
+
+# The clause's own enumeration: "Section 4 :", "Article IV", "4.2", "3.", "(b)"
+_ENUMERATION = re.compile(
+    r"^(?:(?:section|article|clause|schedule|annex|§|art\.|άρθρο|αρθρο|artikel|artículo|articulo)\s*(?:\d+(?:\.\d+)*|[ivxlc]+)\s*[.):]?"
+    r"|\d+(?:\.\d+)+\.?(?=\s)"
+    r"|\d+[.)](?=\s)"
+    r"|\([a-z0-9]{1,3}\))\s*"
+)
+
+def clause_fingerprint(clause: str, ignore: Iterable[str] = ()) -> str:
+    """
+    `ignore` are lines that don't belong to the clause (PDFWordIndex.running_headers).
+    """
+    if ignore:
+        clause = "\n".join(line for line in clause.split("\n") if line.strip() not in ignore)
+    normalized = _ENUMERATION.sub("", " ".join(clause.split()).casefold(), count=1)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class Revision(NamedTuple):
+    previous_document_id: str
+    audit: List[int]              # indices of the new document's clauses to audit (added or changed)
+    carried: List[Dict]           # earlier findings whose clauses are all unchanged
+    previous_traps: List[Dict]    # every earlier finding, to tell new / unchanged / removed apart
+    counts: Dict[str, int]        # clauses unchanged / changed / added / removed
+
+
+def diff_clauses(old: List[str], new: List[str]):
+    """
+    Clause-level diff of two fingerprint lists. Returns (indices of new clauses that are added or changed,
+    unchanged fingerprints, counts).
+    """
+    counts = {"unchanged": 0, "changed": 0, "added": 0, "removed": 0}
+    audit: List[int] = []
+    unchanged = set()
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    for op, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if op == "equal":
+            counts["unchanged"] += new_end - new_start
+            unchanged.update(new[new_start:new_end])
+            continue
+        if op == "replace":
+            paired = min(old_end - old_start, new_end - new_start)
+            counts["changed"] += paired
+            counts["added"] += new_end - new_start - paired
+            counts["removed"] += old_end - old_start - paired
+        elif op == "insert":
+            counts["added"] += new_end - new_start
+        else:
+            counts["removed"] += old_end - old_start
+        audit.extend(range(new_start, new_end))
+    return audit, unchanged, counts
+
+
+class RevisionStore:
+    def __init__(self, version: str, path: str = REVISION_DB, ttl_seconds: int = REVISION_TTL_SECONDS):
+        self.version = version
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads: one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        # Findings from an older prompt/model are never carried forward
+        self._delete_where(conn, "version != ?", (self.version,))
+
+    def _delete_where(self, conn: sqlite3.Connection, condition: str, params: tuple):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM clause_postings WHERE (client, text_key) IN "
+                f"(SELECT client, text_key FROM documents WHERE {condition})", params
+            )
+            conn.execute(f"DELETE FROM documents WHERE {condition}", params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def find_revision(self, client: str, clauses: List[str], ignore: Iterable[str] = ()) -> Optional[Revision]:
+        """
+        The earlier document from `client` that `clauses` most likely revises, diffed against them, or None.
+        """
+        fingerprints = [clause_fingerprint(clause, ignore) for clause in clauses]
+        distinct = set(fingerprints)
+        if not distinct:
+            return None
+        conn = self._connect()
+        candidates = conn.execute(
+            "SELECT d.document_id, d.clauses, d.traps, COUNT(*) AS shared "
+            "FROM clause_postings p JOIN documents d ON d.client = p.client AND d.text_key = p.text_key "
+            "WHERE p.client = ? AND p.clause IN (SELECT value FROM json_each(?)) AND d.created_at > ? "
+            "GROUP BY d.text_key ORDER BY shared DESC, d.created_at DESC LIMIT ?",
+            (client, json.dumps(sorted(distinct)), time.time() - self.ttl_seconds, MAX_CANDIDATES)
+        ).fetchall()
+
+        best, best_share = None, 0.0
+        for document_id, old_clauses, traps, shared in candidates:
+            old_clauses = json.loads(old_clauses)
+            share = shared / max(len(distinct), len(set(old_clauses)))
+            if share > best_share:
+                best, best_share = (document_id, old_clauses, traps), share
+        if best is None or best_share < REVISION_MIN_SHARED:
+            return None
+
+        document_id, old_clauses, traps = best
+        audit, unchanged, counts = diff_clauses(old_clauses, fingerprints)
+        previous = json.loads(traps)
+        carried = [entry["trap"] for entry in previous
+                   if entry["clauses"] and all(clause in unchanged for clause in entry["clauses"])]
+        return Revision(document_id, audit, carried, [entry["trap"] for entry in previous], counts)
+
+    def record(self, client: str, text_key: str, document_id: str, clauses: List[str], traps: List[Dict],
+               ignore: Iterable[str] = ()):
+        """
+        Files an audited document. `traps` are the response's findings; their "clauses" indices point into `clauses`.
+        """
+        fingerprints = [clause_fingerprint(clause, ignore) for clause in clauses]
+        entries = [{
+            "trap": {k: v for k, v in trap.items() if k not in ("coordinates", "pages", "clauses", "revision_status")},
+            "clauses": [fingerprints[i] for i in trap.get("clauses", []) if i < len(fingerprints)]
+        } for trap in traps]
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (text_key, client, version, document_id, created_at, clauses, traps) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (text_key, client, self.version, document_id, time.time(), json.dumps(fingerprints), json.dumps(entries))
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO clause_postings (client, clause, text_key) VALUES (?, ?, ?)",
+                [(client, fingerprint, text_key) for fingerprint in set(fingerprints)]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._lock:
+            self._writes += 1
+            should_prune = self._writes % PRUNE_EVERY == 0
+        if should_prune:
+            self._delete_where(conn, "created_at < ?", (time.time() - self.ttl_seconds,))
+
+
+def revision_report(revision: Revision, traps: List[Dict], quote_key) -> Dict:
+    """
+    Marks each finding of the new version "new" or "unchanged" (in place) and summarises the revision,
+    with the earlier findings that are gone. `quote_key` normalizes a quote for comparison.
+    """
+    previous = {quote_key(trap["original_text"]): trap for trap in revision.previous_traps}
+    current = set()
+    for trap in traps:
+        key = quote_key(trap["original_text"])
+        current.add(key)
+        trap["revision_status"] = "unchanged" if key in previous else "new"
+    return {
+        "previous_document_id": revision.previous_document_id,
+        "clauses": revision.counts,
+        "reaudited_clauses": len(revision.audit),
+        "removed_traps": [dict(trap, revision_status="removed") for key, trap in previous.items() if key not in current],
+    }
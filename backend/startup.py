@@ -0,0 +1,71 @@
+import asyncio
+import importlib
+import os
+import time
+from typing import List, Optional
+
+try:
+    from backend.llm_clients import warm_up
+    from backend.tracing import start_opik_setup, wait_for_opik
+except ModuleNotFoundError:
+    from llm_clients import warm_up
+    from tracing import start_opik_setup, wait_for_opik
+
+# --- Cold Start ---
+# Importing the app loads none of the heavy libraries (LangChain, Opik, PyMuPDF, Tesseract, Pillow, NumPy):
+# each is imported where it is first used. With LAZY_STARTUP the startup hook returns at once, so the port is
+# bound (and health checks pass) in well under a second, and the PREWARM components are then imported on a
+# background thread while the server is already answering. LAZY_STARTUP=0 does all of it before serving,
+# for always-on instances that would rather pay at boot than on the first request.
+# Opik setup always runs in the background (tracing.py). benchmark_startup.py measures both modes.
+
+LAZY_STARTUP = os.getenv("LAZY_STARTUP", "1") != "0"
+PREWARM = [name.strip() for name in os.getenv("PREWARM", "llm,pdf").split(",") if name.strip()]
+
+# What each component imports
+PREWARM_MODULES = {
+    "llm": ("langchain_openai", "langchain_core.prompts", "langchain_core.output_parsers"),
+    "pdf": ("fitz",),
+    "ocr": ("pytesseract", "PIL.Image", "numpy"),
+}
+
+
+def _import_component(name: str) -> float:
+    started = time.perf_counter()
+    for module in PREWARM_MODULES[name]:
+        importlib.import_module(module)
+    if name == "llm":
+        # Building the (thread-side) chains pulls in the rest of the OpenAI client and the parsers
+        warm_up()
+    return time.perf_counter() - started
+
+async def prewarm(components: List[str]):
+    """
+    Imports each component off the event loop; "llm" then builds the loop's own clients and chains.
+    A component that fails to load is reported and left to load (and fail) on first use.
+    """
+    for name in components:
+        if name not in PREWARM_MODULES:
+            print(f"⚠️ Unknown PREWARM component '{name}' (known: {', '.join(PREWARM_MODULES)})")
+            continue
+        try:
+            seconds = await asyncio.to_thread(_import_component, name)
+            if name == "llm":
+                warm_up()
+            print(f"🔥 Prewarmed {name} in {seconds:.2f}s")
+        except Exception as e:
+            print(f"⚠️ Prewarming {name} failed: {e}")
+
+async def _warm(components: List[str]):
+    await asyncio.gather(prewarm(components), asyncio.to_thread(wait_for_opik))
+
+async def warm_start() -> Optional[asyncio.Task]:
+    """
+    For the app's startup hook. With LAZY_STARTUP returns at once with the background task (keep a reference);
+    otherwise loads every component and waits for Opik (up to OPIK_SETUP_TIMEOUT) before returning None.
+    """
+    start_opik_setup()
+    if LAZY_STARTUP:
+        return asyncio.create_task(_warm(PREWARM))
+    await _warm(list(PREWARM_MODULES))
+    return None
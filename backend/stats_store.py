@@ -0,0 +1,187 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+# --- Stats Store (SQLite, WAL mode) ---
+# One row per request, plus running aggregates and a log-bucketed latency histogram that are
+# updated in the same transaction. Any number of uvicorn workers can write concurrently, and
+# /stats never scans the request log: totals, mean and p50/p95/p99 all come from the aggregates.
+
+BASE_DIR = Path(__file__).parent
+STATS_DB = os.getenv("STATS_DB", str(BASE_DIR / "stats.db"))
+LEGACY_STATS_FILE = BASE_DIR / "database.json"  # Pre-SQLite stats, imported once
+
+# Latency buckets grow by 5%: percentiles are accurate to ~5% and the histogram stays at a few hundred rows
+BUCKET_GROWTH = 1.05
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    latency_ms REAL NOT NULL,
+    clauses INTEGER NOT NULL,
+    traps INTEGER NOT NULL,
+    score INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aggregates (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_requests INTEGER NOT NULL DEFAULT 0,
+    total_clauses INTEGER NOT NULL DEFAULT 0,
+    total_traps INTEGER NOT NULL DEFAULT 0,
+    total_predatory_score INTEGER NOT NULL DEFAULT 0,
+    total_latency_ms REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS latency_histogram (
+    bucket INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def _bucket(latency_ms: float) -> int:
+    return int(math.floor(math.log(max(latency_ms, 1.0), BUCKET_GROWTH)))
+
+def _bucket_upper_bound(bucket: int) -> float:
+    return BUCKET_GROWTH ** (bucket + 1)
+
+
+class StatsStore:
+    def __init__(self, path: str = STATS_DB):
+        self.path = path
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads: one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO aggregates (id) VALUES (1)")
+            migrated = conn.execute("SELECT value FROM meta WHERE key = 'legacy_imported'").fetchone()
+            if not migrated:
+                self._import_legacy(conn)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_imported', '1')")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _import_legacy(self, conn: sqlite3.Connection):
+        # Carry over the totals from database.json (no per-request history exists for them)
+        if not LEGACY_STATS_FILE.exists():
+            return
+        try:
+            with open(LEGACY_STATS_FILE, "r") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not import legacy stats: {e}")
+            return
+
+        n = legacy.get("total_requests", 0)
+        conn.execute(
+            "UPDATE aggregates SET total_requests = ?, total_clauses = ?, total_traps = ?, "
+            "total_predatory_score = ?, total_latency_ms = ? WHERE id = 1",
+            (n, legacy.get("total_clauses", 0), legacy.get("total_traps", 0),
+             legacy.get("total_predatory_score", 0), legacy.get("avg_latency", 0) * n)
+        )
+        if "accuracy_score" in legacy:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('accuracy_score', ?)",
+                         (str(legacy["accuracy_score"]),))
+
+    def record_request(self, latency_ms: float, clauses: int, traps: int, score: int):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO requests (ts, latency_ms, clauses, traps, score) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), latency_ms, clauses, traps, score)
+            )
+            conn.execute(
+                "UPDATE aggregates SET total_requests = total_requests + 1, total_clauses = total_clauses + ?, "
+                "total_traps = total_traps + ?, total_predatory_score = total_predatory_score + ?, "
+                "total_latency_ms = total_latency_ms + ? WHERE id = 1",
+                (clauses, traps, score, latency_ms)
+            )
+            conn.execute(
+                "INSERT INTO latency_histogram (bucket, count) VALUES (?, 1) "
+                "ON CONFLICT(bucket) DO UPDATE SET count = count + 1",
+                (_bucket(latency_ms),)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def set_accuracy(self, accuracy: float):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('accuracy_score', ?)", (str(round(accuracy, 1)),)
+        )
+
+    def _percentiles(self, conn: sqlite3.Connection, quantiles) -> Dict[float, Optional[float]]:
+        rows = conn.execute("SELECT bucket, count FROM latency_histogram ORDER BY bucket").fetchall()
+        total = sum(count for _, count in rows)
+        result = {}
+        for q in quantiles:
+            if not total:
+                result[q] = None
+                continue
+            rank = q * total
+            seen = 0
+            for bucket, count in rows:
+                seen += count
+                if seen >= rank:
+                    result[q] = round(_bucket_upper_bound(bucket), 2)
+                    break
+        return result
+
+    def get_stats(self) -> Dict:
+        conn = self._connect()
+        total_requests, total_clauses, total_traps, total_score, total_latency = conn.execute(
+            "SELECT total_requests, total_clauses, total_traps, total_predatory_score, total_latency_ms "
+            "FROM aggregates WHERE id = 1"
+        ).fetchone()
+        accuracy = conn.execute("SELECT value FROM meta WHERE key = 'accuracy_score'").fetchone()
+        percentiles = self._percentiles(conn, (0.5, 0.95, 0.99))
+
+        return {
+            "total_requests": total_requests,
+            "total_clauses": total_clauses,
+            "total_traps": total_traps,
+            "total_predatory_score": total_score,
+            "avg_latency": round(total_latency / total_requests, 2) if total_requests else 0,
+            "p50_latency": percentiles[0.5],
+            "p95_latency": percentiles[0.95],
+            "p99_latency": percentiles[0.99],
+            "accuracy_score": float(accuracy[0]) if accuracy else 0.0
+        }
+
+
+_store: Optional[StatsStore] = None
+_store_lock = threading.Lock()
+
+def get_stats_store() -> StatsStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = StatsStore()
+    return _store
@@ -0,0 +1,160 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Stub LLM (OpenAI-compatible) ---
+# Stands in for the provider during load tests: POST /v1/chat/completions answers after a configurable
+# latency, fails or rate-limits a configurable share of calls, and reports token usage.
+# Audit prompts get a valid AuditResult quoting the sentences that look like traps (so coordinate
+# mapping does real work); negotiation prompts get a NegotiationResult.
+# A share of audit answers can come back malformed (a misnamed field, valid JSON otherwise); the repair
+# prompt (auditor.REPAIR_USER_PROMPT) gets the same answer back with the field fixed.
+#
+#   python stub_llm.py --port 8099 --latency-ms 800 --error-rate 0.02
+#   LLM_BASE_URL=http://127.0.0.1:8099/v1 XAI_API_KEY=stub uvicorn main:app
+
+TRAP_WORDS = re.compile(r"\b(fee|increase|indemnif\w*|arbitration|waive\w*|renews? automatically|third parties|without notice)\b",
+                        re.IGNORECASE)
+DOCUMENT = re.compile(r"-{10}\n(.*)\n-{10}", re.DOTALL)
+REPAIR_ANSWER = re.compile(r"ANSWER:\n-{10}\n(.*)\n-{10}", re.DOTALL)
+MALFORMED_FIELD = ('"risk_level"', '"risk"')
+MAX_TRAPS = 8
+
+
+class StubStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.malformed = 0
+        self._lock = threading.Lock()
+
+    def count(self, kind: str):
+        with self._lock:
+            self.calls += 1
+            if kind == "error":
+                self.errors += 1
+            elif kind == "rate_limited":
+                self.rate_limited += 1
+            elif kind == "malformed":
+                self.malformed += 1
+
+
+def audit_answer(document: str) -> dict:
+    traps = []
+    for sentence in re.split(r"(?<=[.!?])\s+", document):
+        sentence = " ".join(sentence.split())
+        match = TRAP_WORDS.search(sentence)
+        if match and len(traps) < MAX_TRAPS:
+            traps.append({
+                "original_text": sentence,
+                "risk_level": "CRITICAL" if match.group(1).lower().startswith(("waive", "arbitration", "indemnif")) else "CAUTION",
+                "category": "Hidden Fees" if "fee" in match.group(1).lower() else "Other",
+                "plain_english_explanation": f"This clause mentions '{match.group(1)}' in a way that favours the other side.",
+                "estimated_cost_impact": "High",
+                "remediation": "Ask for this clause to be removed or capped."
+            })
+    return {"detected_traps": traps, "overall_predatory_score": 0}
+
+
+def negotiation_answer() -> dict:
+    return {
+        "subject_line": "Notice of Objection: Materially Adverse Terms",
+        "email_body": "I object to the clause referenced above and reserve all rights. Please confirm in writing that it will not be enforced."
+    }
+
+
+def make_handler(latency_ms: float, jitter_ms: float, error_rate: float, rate_limit_rate: float, stats: StubStats,
+                 malformed_rate: float = 0.0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, payload: dict, headers=()):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+            messages = request.get("messages", [])
+            prompt = "\n".join(str(m.get("content", "")) for m in messages)
+            time.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+
+            roll = random.random()
+            if roll < rate_limit_rate:
+                stats.count("rate_limited")
+                return self._send(429, {"error": {"message": "Rate limit exceeded (stub)"}}, [("retry-after", "1")])
+            if roll < rate_limit_rate + error_rate:
+                stats.count("error")
+                return self._send(500, {"error": {"message": "Internal error (stub)"}})
+            repair = REPAIR_ANSWER.search(prompt)
+            document = DOCUMENT.search(prompt)
+            if repair:
+                stats.count("ok")
+                content = repair.group(1).replace(MALFORMED_FIELD[1], MALFORMED_FIELD[0])
+            elif document:
+                content = json.dumps(audit_answer(document.group(1)))
+                if '"original_text"' in content and random.random() < malformed_rate:
+                    stats.count("malformed")
+                    content = content.replace(*MALFORMED_FIELD)
+                else:
+                    stats.count("ok")
+            else:
+                stats.count("ok")
+                content = json.dumps(negotiation_answer())
+            # A native response_format schema is billed as prompt tokens too
+            prompt_tokens = (len(prompt) + len(json.dumps(request.get("response_format", "")))) // 4 + 1
+            completion_tokens = len(content) // 4 + 1
+            self._send(200, {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}
+            })
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int = 0, latency_ms: float = 800, jitter_ms: float = 200, error_rate: float = 0.0,
+          rate_limit_rate: float = 0.0, malformed_rate: float = 0.0):
+    """
+    Starts the stub on a background thread. Returns (server, stats); the base URL is http://127.0.0.1:<server.server_port>/v1.
+    """
+    stats = StubStats()
+    server = ThreadingHTTPServer(("127.0.0.1", port),
+                                 make_handler(latency_ms, jitter_ms, error_rate, rate_limit_rate, stats, malformed_rate))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM for load tests.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of calls answered with a 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of audit answers with a misnamed field")
+    args = parser.parse_args()
+    server, _ = serve(args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, args.malformed_rate)
+    print(f"🤖 Stub LLM listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,32 @@
+import os
+import time
+
+from audit_cache import AuditCache
+
+
+def test_disk_hit_and_file_deleted_under_the_reader(tmp_path):
+    writer = AuditCache("v1", cache_dir=str(tmp_path))
+    writer.set("clauses", "ab" * 32, {"traps": []})
+
+    reader = AuditCache("v1", cache_dir=str(tmp_path))  # another worker: nothing in memory
+    assert reader.get("clauses", "ab" * 32) == {"traps": []}
+
+    other = AuditCache("v1", cache_dir=str(tmp_path))
+    other._path("clauses", "ab" * 32).unlink()  # e.g. a concurrent sweep()
+    assert other.get("clauses", "ab" * 32) is None
+
+def test_other_versions_survive_startup_and_go_once_idle(tmp_path):
+    old = AuditCache("v1", cache_dir=str(tmp_path))
+    old.set("clauses", "ab" * 32, {"traps": []})
+    new = AuditCache("v2", cache_dir=str(tmp_path))  # e.g. the other half of a rolling deploy
+    assert AuditCache("v1", cache_dir=str(tmp_path)).get("clauses", "ab" * 32) == {"traps": []}
+
+    new.sweep()
+    assert old.dir.exists()
+
+    long_ago = time.time() - 2 * new.ttl_seconds
+    for path in [old.dir, *old.dir.rglob("*")]:
+        os.utime(path, (long_ago, long_ago))
+    new.sweep()
+    assert not old.dir.exists()
+    assert new.dir.exists()
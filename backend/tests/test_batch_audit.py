@@ -0,0 +1,56 @@
+import asyncio
+
+import auditor
+from auditor import AuditResult, DetectionObject
+from clause_index import ClauseIndex
+
+BOILERPLATE = ("The tenant agrees that the landlord may enter the unit for inspections after giving notice in writing "
+               "at least twenty four hours in advance, except in an emergency affecting the building.")
+TRAP = "The tenant waives any right to a jury trial and to join a class action."
+TRAPPED = BOILERPLATE + " " + TRAP
+
+
+def audit_with(monkeypatch, documents):
+    sent = []
+
+    async def fake_audit(text: str) -> AuditResult:
+        sent.append(text)
+        traps = []
+        if TRAP in text:
+            traps.append(DetectionObject(original_text=TRAP, risk_level="CRITICAL", category="Other",
+                                         plain_english_explanation="You give up your day in court.",
+                                         estimated_cost_impact="High", remediation="Strike the waiver."))
+        return AuditResult(detected_traps=traps, overall_predatory_score=80 if traps else 0)
+
+    monkeypatch.setattr(auditor, "analyze_contract_text_async", fake_audit)
+    monkeypatch.setattr(auditor, "INDEX_ENABLED", False)
+    monkeypatch.setattr(auditor, "PRESCREEN_ENABLED", False)
+    results, stats = asyncio.run(auditor.analyze_contract_batch_async(documents))
+    return results, stats, sent
+
+
+def test_exact_repeats_are_audited_once(monkeypatch):
+    results, stats, sent = audit_with(monkeypatch, [[BOILERPLATE], [" ".join(BOILERPLATE.upper().split())]])
+    assert stats["unique_clauses"] == 1
+    assert stats["audited_clauses"] == 1
+    assert len(results) == 2
+
+def test_trap_in_a_near_duplicate_is_not_lost(monkeypatch):
+    results, stats, sent = audit_with(monkeypatch, [[BOILERPLATE], [TRAPPED]])
+    assert stats["audited_clauses"] == 2
+    assert any(TRAP in text for text in sent)
+    assert results[0].detected_traps == []
+    assert [t.original_text for t in results[1].detected_traps] == [TRAP]
+
+def test_unquoted_suspicious_clause_is_not_learned_as_benign(monkeypatch):
+    index = ClauseIndex()
+    monkeypatch.setattr(auditor, "get_clause_index", lambda: index)
+    waiver = ("In any dispute arising under this agreement the tenant waives any right to a jury trial "
+              "and to join a class action against the landlord or its agents.")
+    paraphrased = AuditResult(detected_traps=[DetectionObject(
+        original_text="tenant gives up jury trial", risk_level="CRITICAL", category="Other",
+        plain_english_explanation="You give up your day in court.", estimated_cost_impact="High",
+        remediation="Strike the waiver.")], overall_predatory_score=80)
+    auditor._learn_from_window([BOILERPLATE, waiver], paraphrased)
+    assert index.lookup(BOILERPLATE) == []
+    assert index.lookup(waiver) is None
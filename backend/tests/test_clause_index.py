@@ -0,0 +1,49 @@
+from clause_index import ClauseIndex, minhash, normalize_clause
+
+CAPS_BENIGN = "THE LANDLORD SHALL MAINTAIN THE PREMISES IN GOOD REPAIR AND SHALL FIX ALL PLUMBING WITHIN A REASONABLE TIME."
+CAPS_TRAP = "THE COMPANY MAY SELL YOUR PERSONAL DATA TO ANY THIRD PARTY AND YOU WAIVE ALL CLAIMS AGAINST IT IN ANY COURT."
+FEE_SMALL = "A late fee of $5 is charged if rent is not paid within 30 days of the due date stated in this lease."
+FEE_LARGE = "A late fee of $500 is charged if rent is not paid within 3 days of the due date stated in this lease."
+FEE_SIMILAR = "A late fee of $7 is charged if rent is not paid within 45 days of the due date stated in this lease."
+NAMED_A = "The tenant agrees that Acme Property Group may enter the unit for inspections after giving notice in writing."
+NAMED_B = "The tenant agrees that Globex Realty may enter the unit for inspections after giving notice in writing."
+
+
+def test_all_caps_words_are_kept():
+    assert normalize_clause(CAPS_TRAP)[:6] == ["the", "company", "may", "sell", "your", "personal"]
+
+def test_titlecase_names_collapse():
+    assert normalize_clause(NAMED_A) == normalize_clause(NAMED_B)
+
+def test_numbers_keep_their_magnitude():
+    assert normalize_clause(FEE_SMALL) != normalize_clause(FEE_LARGE)
+    assert normalize_clause(FEE_SMALL) == normalize_clause(FEE_SIMILAR)
+
+def test_caps_trap_does_not_reuse_caps_benign_verdict():
+    index = ClauseIndex()
+    index.add(CAPS_BENIGN, [])
+    assert index.lookup(CAPS_TRAP) is None
+
+def test_fee_amounts_are_not_near_duplicates():
+    index = ClauseIndex()
+    index.add(FEE_SMALL, [])
+    assert index.lookup(FEE_LARGE) is None
+    assert index.lookup(FEE_SIMILAR) == []
+
+def test_too_little_wording_is_never_matched():
+    assert minhash("Late fee: $5 per day, $50 per week.") is None
+
+def test_index_evicts_past_its_cap_but_keeps_goldens_and_hot_families():
+    index = ClauseIndex(max_families=3)
+    golden, hot, cold, new = (f"{topic} The tenant must give notice in writing before the end of each rental "
+                              f"term or the agreement continues on the same conditions." for topic in
+                              ("Parking spaces are assigned by lot.", "Pets require a written deposit.",
+                               "Storage lockers are rented monthly.", "Bicycles stay in the basement room."))
+    assert index.add(golden, [], pinned=True)
+    assert index.add(hot, [])
+    assert index.add(cold, [])
+    assert index.lookup(hot) == []
+    assert index.add(new, [])
+    assert len(index) == 3
+    assert index.lookup(cold) is None
+    assert index.lookup(golden) == [] and index.lookup(hot) == [] and index.lookup(new) == []
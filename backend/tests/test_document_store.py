@@ -0,0 +1,10 @@
+import pytest
+
+from document_store import DocumentStore
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path):
+    store = DocumentStore(root=str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        store.put_file(str(tmp_path / "missing.pdf"), "ab" * 32)
+    assert [p for p in tmp_path.rglob("*") if p.is_file()] == []
@@ -0,0 +1,45 @@
+import io
+
+import fitz
+from PIL import Image, ImageDraw
+
+from image_preprocess import ocr_input, preprocess, skew_angle
+from ocr_engine import _under_text_layer
+
+
+def text_page(width: int = 1700, height: int = 2200) -> Image.Image:
+    # Lines of word-sized ink blocks on white paper
+    page = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    for top in range(150, height - 150, 60):
+        left = 150
+        while left < width - 250:
+            draw.rectangle((left, top, left + 90, top + 25), fill=30)
+            left += 130
+    return page
+
+
+def test_skew_angle_levels_a_tilted_page():
+    tilted = text_page().rotate(3, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    assert abs(skew_angle(tilted) + 3) <= 0.5
+    assert abs(skew_angle(text_page())) <= 0.25
+
+def test_preprocess_keeps_grayscale_for_the_pdf_and_binarizes_for_ocr():
+    source = io.BytesIO()
+    text_page().save(source, "PNG")
+    with Image.open(source) as image:
+        page = preprocess(image)
+    binary = ocr_input(page)
+    assert page.mode == "L"
+    assert binary.mode == "1"
+    assert binary.size == page.size
+    assert binary.info["dpi"] == page.info["dpi"]
+
+def test_page_image_goes_under_the_text_layer():
+    page = text_page(850, 1100)
+    with fitz.open() as doc:
+        doc.new_page(width=850 * 72 / 100, height=1100 * 72 / 100).insert_text((72, 72), "Late fee", render_mode=3)
+        text_layer = doc.tobytes()
+    with fitz.open("pdf", _under_text_layer(text_layer, page)) as merged:
+        assert "Late fee" in merged[0].get_text()
+        assert len(merged[0].get_images()) == 1
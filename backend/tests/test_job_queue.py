@@ -0,0 +1,63 @@
+import hashlib
+import os
+
+from job_queue import JobQueue
+
+
+def make_queue(tmp_path, **kwargs) -> JobQueue:
+    return JobQueue(path=str(tmp_path / "jobs.db"), upload_dir=str(tmp_path / "uploads"), **kwargs)
+
+def upload(tmp_path, data: bytes):
+    path = tmp_path / "contract.pdf"
+    path.write_bytes(data)
+    return str(path), len(data), hashlib.sha256(data).digest()
+
+
+def test_uploads_are_kept_as_files_until_the_job_finishes(tmp_path):
+    queue = make_queue(tmp_path)
+    data = b"%PDF-1.4 contract" * 1000
+    job_id = queue.submit("client", True, "contract.pdf", [upload(tmp_path, data)])
+    assert not os.path.exists(tmp_path / "contract.pdf")  # moved into the queue, not copied
+
+    job = queue.claim()
+    [(path, size, digest)] = queue.uploads(job_id)
+    with open(path, "rb") as f:
+        assert f.read() == data
+    assert (size, digest) == (len(data), hashlib.sha256(data).digest())
+
+    assert queue.complete(job["job_id"], job["lease"], {"ok": True})
+    assert not os.path.exists(path)
+    assert queue.uploads(job_id) == []
+
+def test_only_the_lease_holder_can_renew(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0)
+    job_id = queue.submit("client", True, "contract.pdf", [upload(tmp_path, b"%PDF")])
+    first = queue.claim()
+    second = queue.claim()  # the first lease has already run out
+    assert second["job_id"] == job_id and second["attempts"] == 2
+    assert not queue.renew(job_id, first["lease"])
+    assert queue.renew(job_id, second["lease"])
+
+def test_a_stale_holder_cannot_finish_the_job(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0)
+    job_id = queue.submit("client", True, "contract.pdf", [upload(tmp_path, b"%PDF")])
+    first = queue.claim()
+    second = queue.claim()
+    [(path, _, _)] = queue.uploads(job_id)
+
+    assert not queue.complete(job_id, first["lease"], {"from": "first"})
+    assert not queue.fail(job_id, first["lease"], 500, "first gave up")
+    assert queue.get(job_id)["status"] == "running"
+    assert os.path.exists(path)  # still the second worker's input
+
+    assert queue.complete(job_id, second["lease"], {"from": "second"})
+    assert queue.get(job_id)["result"] == {"from": "second"}
+
+def test_crashed_jobs_given_up_on_release_their_files(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0, max_attempts=1)
+    job_id = queue.submit("client", True, "contract.pdf", [upload(tmp_path, b"%PDF")])
+    queue.claim()
+    [(path, _, _)] = queue.uploads(job_id)
+    assert queue.claim() is None
+    assert queue.get(job_id)["status"] == "failed"
+    assert not os.path.exists(path)
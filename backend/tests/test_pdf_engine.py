@@ -0,0 +1,22 @@
+import fitz
+
+from pdf_engine import PDFWordIndex
+
+
+def index_of(text: str) -> PDFWordIndex:
+    with fitz.open() as doc:
+        doc.new_page().insert_text((72, 72), text)
+        return PDFWordIndex(doc.tobytes())
+
+
+def test_find_all_keeps_a_shorter_quote_that_shares_a_start():
+    index = index_of("late fee of ten dollars applies. a late fee is due.")
+    hits = index.find_all(["late fee of ten dollars", "late fee"])
+    assert hits["late fee of ten dollars"] == [(0, 23)]
+    assert hits["late fee"] == [(0, 8), (35, 43)]
+
+def test_find_all_reports_overlapping_quotes():
+    index = index_of("you waive the right to sue")
+    hits = index.find_all(["waive the right", "the right to sue"])
+    assert hits["waive the right"] == [(4, 19)]
+    assert hits["the right to sue"] == [(10, 26)]
@@ -0,0 +1,96 @@
+import asyncio
+import functools
+import os
+import threading
+from typing import Callable
+
+# --- Opik Tracing (off the import path) ---
+# `import opik` alone takes over a second and opik.configure() calls home, which used to happen at import
+# time: on a scale-to-zero instance the first request after a spin-up paid for both. Setup now runs once on
+# a background thread, started by the server's startup (or by the first traced call in a script), and
+# traced() applies opik.track once it has finished. Calls made while setup is still running, or after it
+# failed or overran OPIK_SETUP_TIMEOUT, are served untraced.
+
+OPIK_SETUP_TIMEOUT = float(os.getenv("OPIK_SETUP_TIMEOUT", "10"))  # seconds before tracing is given up on
+OPIK_PROJECT_NAME = "fine-print-xray"
+
+_lock = threading.Lock()
+_ready = threading.Event()
+_started = False
+_abandoned = False
+_opik = None  # the module, once set up
+
+
+def _setup():
+    global _opik
+    try:
+        import opik
+        if os.getenv("OPIK_API_KEY"):
+            os.environ["OPIK_PROJECT_NAME"] = OPIK_PROJECT_NAME
+            try:
+                opik.configure(use_local=False)
+            except Exception as e:
+                print(f"Failed to configure Opik Cloud: {e}")
+        else:
+            print("OPIK_API_KEY not found. Defaulting to local/disabled mode.")
+        with _lock:
+            if not _abandoned:
+                _opik = opik
+    except Exception as e:
+        print(f"⚠️ Opik unavailable, audits are not traced: {e}")
+    finally:
+        _ready.set()
+
+def start_opik_setup() -> bool:
+    """
+    Starts Opik setup on a daemon thread, once per process. True if this call started it.
+    """
+    global _started
+    with _lock:
+        if _started:
+            return False
+        _started = True
+    threading.Thread(target=_setup, name="gotchai-opik", daemon=True).start()
+    return True
+
+def wait_for_opik(timeout: float = OPIK_SETUP_TIMEOUT) -> bool:
+    """
+    Blocks until setup is done, up to `timeout`; after that tracing stays off for this process.
+    Returns whether tracing is on.
+    """
+    global _abandoned
+    _ready.wait(timeout)
+    with _lock:
+        if _opik is None and not _ready.is_set() and not _abandoned:
+            _abandoned = True
+            print(f"⚠️ Opik setup took over {timeout:.0f}s; audits are not traced")
+        return _opik is not None
+
+def traced(name: str):
+    """
+    opik.track(name=name), applied once Opik is set up. A script's first traced call starts setup and
+    waits for it; in the server setup is already under way, so requests never wait.
+    """
+    def decorate(fn: Callable):
+        tracked = []
+
+        def current() -> Callable:
+            if not tracked and _opik is not None:
+                tracked.append(_opik.track(name=name)(fn))
+            return tracked[0] if tracked else fn
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if start_opik_setup():
+                    await asyncio.to_thread(wait_for_opik)
+                return await current()(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if start_opik_setup():
+                wait_for_opik()
+            return current()(*args, **kwargs)
+        return wrapper
+    return decorate
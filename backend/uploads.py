@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from typing import List, Optional
+
+from fastapi import HTTPException, UploadFile
+
+try:
+    from backend.ocr_engine import OCR_PROCESSES
+except ModuleNotFoundError:
+    from ocr_engine import OCR_PROCESSES
+
+# --- Upload Spooling & Memory Budget ---
+# Uploads are copied to temp files in chunks (hashed on the way), so a request holds file paths, not bytes.
+# Size limits are enforced while the body arrives: UploadLimitMiddleware counts request bytes before
+# FastAPI parses the form, and spool_upload() checks each file as it is copied.
+# Before any work starts, a request reserves an estimate of the memory it will need from a per-process
+# budget; requests that don't fit wait their turn instead of pushing the instance into swap or the OOM killer.
+
+MB = 1024 * 1024
+UPLOAD_MAX_FILE_BYTES = int(float(os.getenv("UPLOAD_MAX_FILE_MB", "50")) * MB)
+UPLOAD_MAX_TOTAL_BYTES = int(float(os.getenv("UPLOAD_MAX_TOTAL_MB", "100")) * MB)
+UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "30"))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None  # None: the system temp dir
+MEMORY_BUDGET_BYTES = int(float(os.getenv("MEMORY_BUDGET_MB", "256")) * MB)
+MEMORY_BUDGET_WAIT = float(os.getenv("MEMORY_BUDGET_WAIT", "30"))  # seconds a request may queue for budget
+
+CHUNK_SIZE = MB
+# Multipart boundaries and headers on top of the file bytes
+MULTIPART_SLACK = MB
+
+# Rough peak memory per byte of input, measured on scanned and native contracts:
+# PyMuPDF's object tree plus the text / word index is a few times the file size.
+PDF_MEMORY_FACTOR = 4
+# A decoded image is width * height * 4 bytes (RGBA) in the OCR worker, and the searchable
+# PDF it becomes is about the size of the JPEG.
+IMAGE_BYTES_PER_PIXEL = 4
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, detail: str):
+        super().__init__(status_code=413, detail=detail)
+
+
+class SpooledUpload:
+    """
+    An upload copied to a temp file. `digest` is the sha256 of its content; delete() removes the file.
+    """
+
+    def __init__(self, path: str, size: int, digest: bytes, filename: str = "", content_type: str = ""):
+        self.path = path
+        self.size = size
+        self.digest = digest
+        self.filename = filename
+        self.content_type = content_type
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def delete(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _spool_file(suffix: str = ""):
+    fd, path = tempfile.mkstemp(prefix="gotchai-upload-", suffix=suffix, dir=UPLOAD_SPOOL_DIR)
+    return os.fdopen(fd, "wb"), path
+
+async def spool_upload(upload: UploadFile, max_bytes: int = UPLOAD_MAX_FILE_BYTES) -> SpooledUpload:
+    """
+    Copies an UploadFile to a temp file chunk by chunk, hashing it and enforcing `max_bytes` as it goes.
+    """
+    suffix = os.path.splitext(upload.filename or "")[1][:10]
+    f, path = _spool_file(suffix)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with f:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"{upload.filename or 'Upload'} is over the {max_bytes // MB} MB limit.")
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    finally:
+        await upload.close()
+    return SpooledUpload(path, size, digest.digest(), upload.filename or "", upload.content_type or "")
+
+def new_spool_path(suffix: str = "") -> str:
+    """
+    An empty temp file in the spool dir, for output written by someone else (e.g. the OCR'd PDF).
+    """
+    f, path = _spool_file(suffix)
+    f.close()
+    return path
+
+def delete_uploads(uploads: List[SpooledUpload]):
+    for upload in uploads:
+        upload.delete()
+
+def estimate_memory(uploads: List[SpooledUpload], is_pdf_mode: bool, include_pdf: bool = False) -> int:
+    """
+    Peak bytes an audit of these uploads is expected to hold (this process and its OCR workers).
+    """
+    if is_pdf_mode:
+        pdf_size = uploads[0].size
+        estimate = pdf_size * PDF_MEMORY_FACTOR
+    else:
+        from PIL import Image
+        pixels = 0
+        for upload in uploads:
+            try:
+                # Only the header is read: no decode
+                with Image.open(upload.path) as image:
+                    pixels = max(pixels, image.width * image.height)
+            except Exception:
+                pass
+        pdf_size = sum(upload.size for upload in uploads)
+        estimate = pixels * IMAGE_BYTES_PER_PIXEL * min(len(uploads), OCR_PROCESSES) + pdf_size * PDF_MEMORY_FACTOR
+    if include_pdf:
+        estimate += pdf_size * 4 // 3  # the base64 copy
+    return estimate
+
+
+class MemoryBudget:
+    """
+    Bytes of working memory shared by the requests of one process. acquire() waits until the estimate fits.
+    """
+
+    def __init__(self, capacity: int = MEMORY_BUDGET_BYTES, max_wait: float = MEMORY_BUDGET_WAIT):
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.in_use = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    async def acquire(self, nbytes: int) -> int:
+        """
+        Waits until `nbytes` fit, takes them and returns the amount to release().
+        """
+        if self.capacity <= 0:
+            return 0
+        if nbytes > self.capacity:
+            raise UploadTooLarge(f"This upload needs about {nbytes // MB} MB to process; "
+                                 f"the limit is {self.capacity // MB} MB. Try fewer or smaller pages.")
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            try:
+                await asyncio.wait_for(self._condition.wait_for(lambda: self.in_use + nbytes <= self.capacity),
+                                       self.max_wait)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=503, detail="Server is busy with large documents. Try again shortly.",
+                                    headers={"Retry-After": str(int(self.max_wait))})
+            self.in_use += nbytes
+        return nbytes
+
+    async def release(self, nbytes: int):
+        if not nbytes:
+            return
+        async with self._condition:
+            self.in_use -= nbytes
+            self._condition.notify_all()
+
+
+class UploadLimitMiddleware:
+    """
+    Refuses request bodies over `max_bytes` with 413, from Content-Length up front or by counting
+    bytes as they stream in (chunked uploads), before anything is parsed or written.
+    """
+
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_TOTAL_BYTES + MULTIPART_SLACK):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"Upload is over the {UPLOAD_MAX_TOTAL_BYTES // MB} MB limit."}).encode("utf-8")
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            return await self.app(scope, receive, send)
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            return await self._reject(send)
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise UploadTooLarge(f"Upload is over the {UPLOAD_MAX_TOTAL_BYTES // MB} MB limit.")
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except UploadTooLarge:
+            if started:
+                raise
+            await self._reject(send)
@@ -93,6 +93,12 @@ export default function DragDropUpload() {
                 const blob = base64ToBlob(data.pdf_base64, 'application/pdf');
                 const generatedFile = new File([blob], "scanned_contract.pdf", { type: "application/pdf" });
                 setFile(generatedFile);
+            } else if (!isPdf && data.document_url) {
+                // Images were OCR'd into a new PDF: fetch it from the document store
+                const pdfRes = await fetch(`${API_URL}${data.document_url}`);
+                if (!pdfRes.ok) throw new Error('Could not load the scanned document');
+                const blob = await pdfRes.blob();
+                setFile(new File([blob], "scanned_contract.pdf", { type: "application/pdf" }));
             } else {
                 // Otherwise use the original file (if it was a PDF)
                 setFile(files[0]);
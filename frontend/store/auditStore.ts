@@ -15,6 +15,9 @@ export interface AuditResult {
     overall_predatory_score: number;
     detected_traps: Trap[];
     filename: string;
+    document_id?: string;
+    document_url?: string; // GET this to download the audited PDF
+    pdf_base64?: string;   // Only present with ?include_pdf=true
 }
 
 interface AuditState {